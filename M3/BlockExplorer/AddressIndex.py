@@ -0,0 +1,93 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+"""
+
+import sqlite3
+import threading
+
+
+INDEX_PATH = "address_index.db"
+COMMIT_INTERVAL = 100
+SATOSHIS_PER_COIN = 100000000
+
+
+class AddressIndex:
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blocks ("
+                                "height INTEGER PRIMARY KEY, "
+                                "hash TEXT NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS outputs ("
+                                "address TEXT NOT NULL, "
+                                "height INTEGER NOT NULL, "
+                                "txid TEXT NOT NULL, "
+                                "vout INTEGER NOT NULL, "
+                                "value INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS outputs_by_address ON outputs (address, height)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS outputs_by_height ON outputs (height)")
+        self.connection.commit()
+
+    def indexed_height(self):
+        with self._lock:
+            row = self.connection.execute("SELECT MAX(height) FROM blocks").fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def get_blockhash(self, height: int):
+        with self._lock:
+            row = self.connection.execute("SELECT hash FROM blocks WHERE height = ?", (height,)).fetchone()
+        return None if row is None else row[0]
+
+    def _insert_block(self, block):
+        rows = []
+        for transaction in block.transactions:
+            for vout in transaction.vout:
+                if not vout.scriptPubKey.isNull:
+                    rows.append((vout.scriptPubKey.address, block.blocknumber, transaction.id, vout.n, vout.sats))
+        self.connection.executemany("INSERT INTO outputs VALUES (?, ?, ?, ?, ?)", rows)
+        self.connection.execute("INSERT INTO blocks VALUES (?, ?)", (block.blocknumber, block.blockhash))
+
+    def _insert_blocks(self, blocks):
+        with self._lock:
+            for block in blocks:
+                self._insert_block(block)
+            self.connection.commit()
+
+    def add_blocks(self, blocks, progress=None):
+        # blocks usually fetches from the node, so the lock is only taken to insert and commit a chunk of
+        # COMMIT_INTERVAL blocks and lookups are not held up for the whole sync. Blocks already pulled are
+        # inserted when the iterator fails, they are part of the chain it has walked.
+        chunk = []
+        try:
+            for block in blocks:
+                chunk.append(block)
+                if progress is not None:
+                    progress.next()
+                if len(chunk) >= COMMIT_INTERVAL:
+                    self._insert_blocks(chunk)
+                    chunk = []
+        finally:
+            if chunk:
+                self._insert_blocks(chunk)
+
+    def rollback(self, height: int):
+        # Drops everything indexed above height, used when those blocks left the active chain
+        with self._lock:
+            self.connection.execute("DELETE FROM outputs WHERE height > ?", (height,))
+            self.connection.execute("DELETE FROM blocks WHERE height > ?", (height,))
+            self.connection.commit()
+
+    def lookup(self, address: str):
+        with self._lock:
+            return self.connection.execute("SELECT height, txid, vout, value FROM outputs "
+                                           "WHERE address = ? ORDER BY height DESC, rowid",
+                                           (address,)).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
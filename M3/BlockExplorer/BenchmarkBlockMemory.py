@@ -0,0 +1,162 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Memory footprint of the Transaction object graph for one block.
+
+Record a block from the node once:
+    python BenchmarkBlockMemory.py record <blockhash> block.json
+and measure it (or a synthetic block when no file is given):
+    python BenchmarkBlockMemory.py measure [block.json] [--synthetic 3000]
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+import BlockExplorer
+
+
+# The dict based classes used before __slots__ and satoshi values were introduced
+class LegacyScriptPubKey:
+    def __init__(self, scp_in):
+        self.asm = scp_in["asm"]
+        self.hex = scp_in["hex"]
+        self.type = scp_in["type"]
+        self.isNull = self.type == "nulldata"
+        if not self.isNull:
+            self.reqSigs = scp_in["reqSigs"]
+            self.address = scp_in["addresses"][0]
+
+
+class LegacyVin:
+    def __init__(self, vin_in):
+        self.sequence = vin_in["sequence"]
+        self.coinbase = vin_in["coinbase"]
+
+
+class LegacyVinTx:
+    def __init__(self, vin_in):
+        self.id = vin_in["txid"]
+        self.vout = vin_in["vout"]
+        self.scriptSig = vin_in["scriptSig"]
+        self.sequence = vin_in["sequence"]
+        self.witnesses = list(vin_in.get("txinwitness", []))
+
+
+class LegacyVout:
+    def __init__(self, vout_in, number):
+        self.value = vout_in["value"]
+        self.number = number
+        self.n = vout_in["n"]
+        self.scriptPubKey = LegacyScriptPubKey(vout_in["scriptPubKey"])
+
+
+class LegacyTransaction:
+    def __init__(self, response_result):
+        for key in ("txid", "hash", "version", "size", "vsize", "weight", "locktime",
+                    "blockhash", "hex", "confirmations", "time", "blocktime"):
+            setattr(self, key, response_result[key])
+        self.vin = [LegacyVinTx(vin) if "txid" in vin else LegacyVin(vin) for vin in response_result["vin"]]
+        self.vout = []
+        self.addressDict = {}
+        for number, vout in enumerate(response_result["vout"]):
+            new_vout = LegacyVout(vout, number)
+            self.vout.append(new_vout)
+            if not new_vout.scriptPubKey.isNull:
+                self.addressDict.setdefault(new_vout.scriptPubKey.address, []).append(new_vout)
+
+
+def _record(blockhash: str, path: str):
+    block = BlockExplorer._get_block_by_hash(blockhash)
+    transactions = BlockExplorer._get_transactions(block["tx"])
+    with open(path, "w") as file:
+        json.dump({"block": block, "transactions": transactions}, file)
+    print(f"Recorded block {blockhash} with {len(transactions)} transactions to {path}")
+
+
+def _synthetic_transactions(count: int, seed: int = 200):
+    generator = random.Random(seed)
+    transactions = []
+    for number in range(count):
+        txid = "%064x" % generator.getrandbits(256)
+        vin = [{
+            "txid": "%064x" % generator.getrandbits(256),
+            "vout": generator.randrange(4),
+            "scriptSig": {"asm": "", "hex": ""},
+            "txinwitness": ["30" * 71, "02" + "11" * 32],
+            "sequence": 4294967293
+        } for _ in range(generator.randint(1, 3))]
+        vout = []
+        for n in range(generator.randint(1, 4)):
+            pubkey_hash = "%040x" % generator.getrandbits(160)
+            vout.append({
+                "value": generator.randrange(1, 10 ** 9) / 1e8,
+                "n": n,
+                "scriptPubKey": {
+                    "asm": f"0 {pubkey_hash}",
+                    "hex": f"0014{pubkey_hash}",
+                    "reqSigs": 1,
+                    "type": "witness_v0_keyhash",
+                    "addresses": [f"bc1q{pubkey_hash[:38]}"]
+                }
+            })
+        transactions.append({
+            "txid": txid, "hash": txid, "version": 2, "size": 225, "vsize": 144, "weight": 573,
+            "locktime": 0, "vin": vin, "vout": vout, "hex": "00" * 225,
+            "blockhash": "00" * 32, "confirmations": 1, "time": 0, "blocktime": 0
+        })
+    return transactions
+
+
+def _measure(transactions, build):
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(transaction) for transaction in transactions]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current, peak
+
+
+def _print_results(transactions):
+    outputs = sum(len(transaction["vout"]) for transaction in transactions)
+    print(f"Block with {len(transactions)} transactions and {outputs} outputs")
+    print(f"{'Representation':<28}{'Retained KB':>14}{'Peak KB':>12}{'Bytes/output':>14}")
+    modes = [
+        ("dict attributes (before)", LegacyTransaction),
+        ("__slots__", lambda transaction: BlockExplorer.Transaction(transaction, compact=False)),
+        ("__slots__ + compact", lambda transaction: BlockExplorer.Transaction(transaction, compact=True)),
+    ]
+    for name, build in modes:
+        current, peak = _measure(transactions, build)
+        print(f"{name:<28}{current / 1000:>14.1f}{peak / 1000:>12.1f}{current / max(outputs, 1):>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per block memory footprint of the explorer objects")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="Record a block and its transactions from the node")
+    record.add_argument("blockhash")
+    record.add_argument("path")
+    measure = subparsers.add_parser("measure", help="Measure a recorded or synthetic block")
+    measure.add_argument("path", nargs="?")
+    measure.add_argument("--synthetic", type=int, default=3000, help="Transactions in the synthetic block")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        _record(args.blockhash, args.path)
+        return
+    if args.path:
+        with open(args.path) as file:
+            transactions = json.load(file)["transactions"]
+    else:
+        transactions = _synthetic_transactions(args.synthetic)
+    _print_results(transactions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+End to end benchmarks of the explorer and the wallet: block display,
+transaction display, the address search over 2000 blocks and sending a batch
+payout. Every scenario starts from empty caches and reports the RPC requests
+and calls it made, wall time, p50/p99 latency per operation and the peak
+traced memory (measured in a second run, tracemalloc slows the first down).
+
+Record fixtures from a node once, then replay them with a chosen latency:
+    python BenchmarkSuite.py --record fixtures.jsonl
+    python BenchmarkSuite.py --replay fixtures.jsonl --latency 0.002 [--json results.json]
+
+The payout scenario needs --payouts and --change, and --allow-send unless
+it is replayed since it really sends the transactions.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import BlockExplorer
+import RpcClient
+from RpcReplay import RecordingProxy, ReplayServer, serve_in_background
+
+
+BLOCKS = 20
+TRANSACTIONS = 200
+SEARCH_LENGTH = 2000
+REPEAT = 3
+
+
+class CountingClient(RpcClient.RpcClient):
+    # Counts HTTP requests and the calls in them on the client side, so it works against any node
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.requests = 0
+        self.calls = 0
+
+    def _post(self, payload):
+        with self._id_lock:
+            self.requests += 1
+            self.calls += len(payload) if isinstance(payload, list) else 1
+        return super()._post(payload)
+
+
+def _clear_caches():
+    cache = BlockExplorer._explorer_cache
+    cache.blocks.clear()
+    cache.transactions.clear()
+    cache.heights.clear()
+
+
+def _percentile(values, fraction: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _run(client, operations):
+    # operations is a list of callables, returns (wall, latencies, requests, calls)
+    _clear_caches()
+    requests, calls = client.requests, client.calls
+    latencies = []
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for operation in operations:
+            operation_started = time.perf_counter()
+            operation()
+            latencies.append(time.perf_counter() - operation_started)
+    return time.perf_counter() - started, latencies, client.requests - requests, client.calls - calls
+
+
+def _peak_memory(operations):
+    _clear_caches()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for operation in operations:
+            operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _block_display(heights):
+    return [lambda height=height: str(BlockExplorer._get_blockobject_by_number(height)) for height in heights]
+
+
+def _transaction_display(txids):
+    return [lambda txid=txid: str(BlockExplorer._get_transaction_object_by_hash(txid)) for txid in txids]
+
+
+def _address_search(address: str, tip: int, search_length: int, repeat: int):
+    def search():
+        _clear_caches()
+        BlockExplorer._print_transactions_from_address(address, tip, search_length)
+    return [search] * repeat
+
+
+def _payout(args, repeat: int):
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "M5", "Transactions"))
+    from BatchPayout import pay_out
+
+    def send():
+        pay_out(args.payouts, args.change, args.utxos, args.keys, args.fee_rate, confirm=lambda: True)
+    return [send] * repeat
+
+
+def _scenarios(args, client):
+    tip = client.call("getblockchaininfo")["result"]["blocks"]
+    step = max(1, args.search_length // max(args.blocks, 1))
+    heights = [tip - number * step for number in range(args.blocks) if tip - number * step >= 0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        top = BlockExplorer._get_loaded_blockobject_by_hash(client.call("getblockhash", tip)["result"], tip)
+    txids = top.txids[:args.transactions]
+    address = next((vout.scriptPubKey.address for transaction in top.transactions for vout in transaction.vout
+                    if not vout.scriptPubKey.isNull), None)
+    scenarios = [("block display", _block_display(heights)),
+                 ("transaction display", _transaction_display(txids))]
+    if address is not None:
+        scenarios.append((f"address search {args.search_length}",
+                          _address_search(address, tip, min(args.search_length, tip), args.repeat)))
+    if args.payouts:
+        if args.replay or args.allow_send:
+            scenarios.append(("payout", _payout(args, args.repeat)))
+        else:
+            print("Skipping the payout scenario, it sends real transactions without --allow-send", file=sys.stderr)
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the explorer and the wallet against recorded RPC")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="FIXTURES", help="Run against the node and record the calls")
+    source.add_argument("--replay", metavar="FIXTURES", help="Run against a stand-in answering from fixtures")
+    parser.add_argument("--node", default=RpcClient.URL)
+    parser.add_argument("--latency", type=float, default=0.0, help="Replay seconds per HTTP request")
+    parser.add_argument("--call-latency", type=float, default=0.0, help="Replay seconds per call")
+    parser.add_argument("--blocks", type=int, default=BLOCKS)
+    parser.add_argument("--transactions", type=int, default=TRANSACTIONS)
+    parser.add_argument("--search-length", type=int, default=SEARCH_LENGTH)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--payouts", help="CSV of address,amount for the payout scenario")
+    parser.add_argument("--change")
+    parser.add_argument("--utxos")
+    parser.add_argument("--keys")
+    parser.add_argument("--fee-rate", type=int)
+    parser.add_argument("--allow-send", action="store_true")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced memory runs")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    server = None
+    url = args.node
+    if args.record:
+        server = RecordingProxy(args.record, args.node, port=0)
+        url = serve_in_background(server)
+    elif args.replay:
+        server = ReplayServer(args.replay, args.latency, args.call_latency, port=0)
+        url = serve_in_background(server)
+    client = CountingClient(url)
+    RpcClient.set_client(client)
+
+    results = []
+    try:
+        print(f"{'Scenario':<24}{'ops':>5}{'wall s':>9}{'p50 ms':>9}{'p99 ms':>9}{'requests':>10}{'calls':>8}"
+              f"{'peak KB':>10}")
+        for name, operations in _scenarios(args, client):
+            try:
+                wall, latencies, requests, calls = _run(client, operations)
+                peak = None if args.no_memory else _peak_memory(operations)
+            except ValueError as error:
+                print(f"{name:<24}failed: {error}")
+                continue
+            result = {"scenario": name, "operations": len(operations), "wall": wall,
+                      "p50": _percentile(latencies, 0.5), "p99": _percentile(latencies, 0.99),
+                      "requests": requests, "calls": calls, "peak_bytes": peak}
+            results.append(result)
+            print(f"{name:<24}{len(operations):>5}{wall:>9.2f}{result['p50'] * 1000:>9.1f}{result['p99'] * 1000:>9.1f}"
+                  f"{requests:>10}{calls:>8}{'-' if peak is None else f'{peak / 1000:.1f}':>10}")
+        if args.replay and server.stats()["misses"]:
+            print(f"Calls without a recording, answered with an error: {server.stats()['misses']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+"""
+
+import threading
+from collections import OrderedDict
+
+
+# Sizes are estimated bytes of the Python object graphs. The transactions of a cached block are also counted
+# in the transaction cache, so the two limits together bound the memory from above
+MAX_BLOCK_BYTES = 256 * 1000000
+MAX_TRANSACTION_BYTES = 64 * 1000000
+MAX_HEIGHTS = 100000
+
+# Per object sizes of compact objects, fitted with tracemalloc on decoded getrawtransaction results
+BLOCK_BYTES = 2000
+TXID_BYTES = 120
+TRANSACTION_BYTES = 900
+INPUT_BYTES = 220
+OUTPUT_BYTES = 400
+# Full objects also keep the hex, scripts and witnesses, a few times the serialized size
+FULL_OBJECT_FACTOR = 4
+
+
+def transaction_bytes(transaction):
+    size = TRANSACTION_BYTES + INPUT_BYTES * len(transaction.vin) + OUTPUT_BYTES * len(transaction.vout)
+    if transaction.hex is not None:
+        size += FULL_OBJECT_FACTOR * transaction.size
+    return size
+
+
+def block_bytes(block):
+    size = BLOCK_BYTES + TXID_BYTES * len(getattr(block, "txids", ()))
+    if block.is_loaded():
+        size += sum(transaction_bytes(transaction) for transaction in block.transactions)
+    return size
+
+
+class LruCache:
+    def __init__(self, max_size: int, sizeof=None):
+        self.max_size = max_size
+        self.sizeof = sizeof if sizeof is not None else (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        entry_size = self.sizeof(value)
+        if entry_size > self.max_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, entry_size)
+            self.size += entry_size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def resize(self, key):
+        # Measures an entry again after it grew in place, it is dropped if it no longer fits at all
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self.size -= entry[1]
+        self.put(key, entry[0])
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self.size -= entry[1]
+            return entry[0]
+
+    def items(self):
+        # Snapshot without touching the recency order or the statistics
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups else 0
+        return f"{len(self)} entries, {self.size}/{self.max_size} size, " \
+               f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), {self.evictions} evictions"
+
+
+class ExplorerCache:
+    def __init__(self, max_block_bytes: int = MAX_BLOCK_BYTES,
+                 max_transaction_bytes: int = MAX_TRANSACTION_BYTES,
+                 max_heights: int = MAX_HEIGHTS):
+        self.blocks = LruCache(max_block_bytes, block_bytes)
+        # Transactions are stored together with the height of their block
+        self.transactions = LruCache(max_transaction_bytes, lambda entry: transaction_bytes(entry[0]))
+        self.heights = LruCache(max_heights)
+        self.tip_height = None
+        self.tip_hash = None
+
+    def _confirmations(self, height: int):
+        return self.tip_height - height + 1
+
+    def get_block(self, blockhash: str):
+        block = self.blocks.get(blockhash)
+        # Stale blocks keep -1, the others are confirmed once more by every new block
+        if block is not None and self.tip_height is not None and getattr(block, "confirmations", -1) >= 0:
+            block.confirmations = self._confirmations(block.blocknumber)
+        return block
+
+    def put_block(self, block):
+        self.blocks.put(block.blockhash, block)
+        # A stale block shares its height with the block of the active chain, only that one is mapped
+        if getattr(block, "confirmations", -1) >= 0:
+            self.heights.put(block.blocknumber, block.blockhash)
+
+    def block_loaded(self, block):
+        # The transactions of a cached block were materialized, it takes more room now
+        self.blocks.resize(block.blockhash)
+
+    def get_transaction(self, transaction_hash: str):
+        entry = self.transactions.get(transaction_hash)
+        if entry is None:
+            return None
+        transaction, height = entry
+        if height is not None and self.tip_height is not None:
+            transaction.confirmations = self._confirmations(height)
+        return transaction
+
+    def put_transaction(self, transaction, height: int = None):
+        # Unconfirmed transactions change once mined and those of stale blocks are not on the chain,
+        # only cache the confirmed ones
+        if getattr(transaction, "blockhash", None) is None or getattr(transaction, "confirmations", -1) < 0:
+            return
+        if height is None and self.tip_height is not None:
+            height = self.tip_height - transaction.confirmations + 1
+        self.transactions.put(transaction.id, (transaction, height))
+
+    def get_blockhash(self, height: int):
+        return self.heights.get(height)
+
+    def put_blockhash(self, height: int, blockhash: str):
+        self.heights.put(height, blockhash)
+
+    def set_tip(self, height: int, blockhash: str):
+        self.tip_height = height
+        self.tip_hash = blockhash
+
+    def invalidate_above(self, height: int):
+        for cached_height, _ in self.heights.items():
+            if cached_height > height:
+                self.heights.pop(cached_height)
+        for blockhash, block in self.blocks.items():
+            if block.blocknumber > height:
+                self.blocks.pop(blockhash)
+        for transaction_hash, (_, transaction_height) in self.transactions.items():
+            if transaction_height is None or transaction_height > height:
+                self.transactions.pop(transaction_hash)
+
+    def __str__(self):
+        return f"Block cache: {self.blocks}\n" \
+               f"Transaction cache: {self.transactions}\n" \
+               f"Height cache: {self.heights}"
@@ -0,0 +1,218 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Offline access to the blocks stored in a node's blocks/blk*.dat files.
+The chain order is rebuilt from the previous block hash links, the LevelDB
+block index is not read.
+
+    python BlockFile.py <blocksdir> address <address>
+    python BlockFile.py <blocksdir> export outputs.csv
+    python BlockFile.py <blocksdir> index
+"""
+
+import argparse
+import csv
+import glob
+import mmap
+import os
+import struct
+import sys
+
+from AddressIndex import AddressIndex
+from BlockExplorer import Block
+from RawBlock import double_sha256, parse_block
+
+
+MAGIC = {
+    "main": bytes.fromhex("f9beb4d9"),
+    "test": bytes.fromhex("0b110907"),
+    "testnet4": bytes.fromhex("1c163f28"),
+    "signet": bytes.fromhex("0a03cf40"),
+    "regtest": bytes.fromhex("fabfb5da"),
+}
+NULL_HASH = "00" * 32
+
+
+def _block_work(bits: int):
+    exponent = bits >> 24
+    target = (bits & 0xffffff) << (8 * (exponent - 3)) if exponent >= 3 else (bits & 0xffffff) >> (8 * (3 - exponent))
+    return (1 << 256) // (target + 1)
+
+
+class BlockFileReader:
+    def __init__(self, blocks_dir: str, chain: str = "main"):
+        self.blocks_dir = blocks_dir
+        self.chain = chain
+        self.magic = MAGIC[chain]
+        self.paths = sorted(glob.glob(os.path.join(blocks_dir, "blk[0-9]*.dat")))
+        self.xor_key = self._read_xor_key()
+        # blockhash -> (file number, offset of the block data, size)
+        self.locations = {}
+        self.previous = {}
+        self.bits = {}
+        self._best_chain = None
+        self._open_number = None
+        self._open_file = None
+        self._open_map = None
+
+    def _read_xor_key(self):
+        # Bitcoin Core 28+ obfuscates the block files with the key stored in xor.dat
+        path = os.path.join(self.blocks_dir, "xor.dat")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            key = file.read()
+        return key if any(key) else None
+
+    def _map(self, number: int):
+        if self._open_number != number:
+            self.close()
+            self._open_file = open(self.paths[number], "rb")
+            self._open_map = mmap.mmap(self._open_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._open_number = number
+        return self._open_map
+
+    def _read(self, number: int, offset: int, size: int):
+        view = memoryview(self._map(number))[offset:offset + size]
+        if self.xor_key is None:
+            return view
+        key_length = len(self.xor_key)
+        shift = offset % key_length
+        key = self.xor_key[shift:] + self.xor_key[:shift]
+        repeated = (key * (size // key_length + 1))[:size]
+        value = int.from_bytes(view, "big") ^ int.from_bytes(repeated, "big")
+        view.release()
+        return memoryview(value.to_bytes(size, "big"))
+
+    def iter_locations(self):
+        # Walks the magic + size framing of every file, yields (file number, offset, size)
+        for number, path in enumerate(self.paths):
+            file_size = os.path.getsize(path)
+            offset = 0
+            while offset + 8 <= file_size:
+                frame = bytes(self._read(number, offset, 8))
+                if frame[:4] != self.magic:
+                    # The rest of the file is preallocated zero space
+                    break
+                size = struct.unpack("<I", frame[4:])[0]
+                yield number, offset + 8, size
+                offset += 8 + size
+
+    def scan(self):
+        for number, offset, size in self.iter_locations():
+            header = bytes(self._read(number, offset, 80))
+            blockhash = double_sha256(header)[::-1].hex()
+            self.locations[blockhash] = (number, offset, size)
+            self.previous[blockhash] = bytes(header[4:36][::-1]).hex()
+            self.bits[blockhash] = struct.unpack_from("<I", header, 72)[0]
+        self._best_chain = None
+        return len(self.locations)
+
+    def best_chain(self):
+        # List of block hashes by height for the chain with the most work
+        if self._best_chain is not None:
+            return self._best_chain
+        if not self.locations:
+            self.scan()
+        children = {}
+        for blockhash, previous in self.previous.items():
+            children.setdefault(previous, []).append(blockhash)
+        work = {}
+        stack = []
+        for blockhash in children.get(NULL_HASH, []):
+            work[blockhash] = _block_work(self.bits[blockhash])
+            stack.append(blockhash)
+        best = None
+        while stack:
+            blockhash = stack.pop()
+            if best is None or work[blockhash] > work[best]:
+                best = blockhash
+            for child in children.get(blockhash, []):
+                work[child] = work[blockhash] + _block_work(self.bits[child])
+                stack.append(child)
+        chain = []
+        while best is not None and best in self.locations:
+            chain.append(best)
+            best = self.previous[best]
+        chain.reverse()
+        self._best_chain = chain
+        return chain
+
+    def read_block(self, blockhash: str):
+        return self._read(*self.locations[blockhash])
+
+    def iter_blocks(self, startblock: int = 0, endblock: int = None, compact: bool = True):
+        chain = self.best_chain()
+        tip = len(chain) - 1
+        endblock = tip if endblock is None else min(endblock, tip)
+        for height in range(startblock, endblock + 1):
+            data = self.read_block(chain[height])
+            result = parse_block(data, height, self.chain, not compact)
+            data.release()
+            result["confirmations"] = tip - height + 1
+            if height < tip:
+                result["nextblockhash"] = chain[height + 1]
+            yield Block(result, compact)
+
+    def close(self):
+        if self._open_map is not None:
+            self._open_map.close()
+            self._open_file.close()
+        self._open_number = None
+        self._open_file = None
+        self._open_map = None
+
+
+def print_transactions_from_address(reader: BlockFileReader, address: str):
+    found = 0
+    for block in reader.iter_blocks():
+        if block.has_address(address):
+            print(block.get_transactions_from_address(address), end="")
+            found += 1
+    if found == 0:
+        print(f"No transactions found for address <{address}>!")
+    return found
+
+
+def export_outputs(reader: BlockFileReader, path: str):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["height", "txid", "vout", "address", "value"])
+        for block in reader.iter_blocks():
+            for transaction in block.transactions:
+                for vout in transaction.vout:
+                    address = None if vout.scriptPubKey.isNull else vout.scriptPubKey.address
+                    writer.writerow([block.blocknumber, transaction.id, vout.n, address, vout.sats])
+
+
+def update_address_index(reader: BlockFileReader, address_index: AddressIndex):
+    address_index.add_blocks(reader.iter_blocks(address_index.indexed_height() + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scans over blk*.dat files")
+    parser.add_argument("blocks_dir")
+    parser.add_argument("--chain", default="main", choices=sorted(MAGIC))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    address = subparsers.add_parser("address", help="Show outputs for an address")
+    address.add_argument("address")
+    export = subparsers.add_parser("export", help="Export all outputs as CSV")
+    export.add_argument("path")
+    subparsers.add_parser("index", help="Update the address index from the block files")
+    args = parser.parse_args()
+
+    reader = BlockFileReader(args.blocks_dir, args.chain)
+    print(f"Found {reader.scan()} blocks, best chain height {len(reader.best_chain()) - 1}", file=sys.stderr)
+    if args.command == "address":
+        print_transactions_from_address(reader, args.address)
+    elif args.command == "export":
+        export_outputs(reader, args.path)
+    else:
+        update_address_index(reader, AddressIndex())
+    reader.close()
+
+
+if __name__ == '__main__':
+    main()
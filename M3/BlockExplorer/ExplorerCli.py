@@ -0,0 +1,171 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Non-interactive front end of the explorer. Every command writes JSON lines to
+stdout, one record per block, transaction or found output, and messages go to
+stderr. The batch command reads one command per line from stdin and runs them
+all in this process, so the RPC client and the block and transaction caches
+stay warm across the queries.
+
+    python ExplorerCli.py block --height 170
+    python ExplorerCli.py tx --id <txid>
+    python ExplorerCli.py address <address> --from 900 --to 1000 --workers 8
+    python ExplorerCli.py batch --workers 8 < queries.txt
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import shlex
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import BlockExplorer
+from BlockExplorer import (SEARCH_WORKERS, BlockchainInfo, _check_cache_tip, _get_blockobject_by_hash,
+                           _get_blockobject_by_number, _get_transaction_object_by_hash, iter_blocks)
+
+
+BATCH_WORKERS = 1
+
+
+def _block(args):
+    if args.hash is not None:
+        block = _get_blockobject_by_hash(args.hash)
+    else:
+        block = _get_blockobject_by_number(args.height)
+    if block is None:
+        raise ValueError(f"Block {args.hash or args.height} not found!")
+    yield block.to_dict(args.transactions)
+
+
+def _tx(args):
+    transaction = _get_transaction_object_by_hash(args.id)
+    if transaction is None:
+        raise ValueError(f"Transaction {args.id} not found!")
+    yield transaction.to_dict()
+
+
+def _address(args):
+    tip = BlockExplorer._explorer_cache.tip_height
+    end = args.to if args.to is not None else args.start + 999
+    if args.to is None and tip is not None:
+        end = max(args.start, min(end, tip))
+    if args.start < 0 or end < args.start:
+        raise ValueError(f"Block range {args.start} to {end} is invalid, --from can not be above --to!")
+    if tip is not None and end > tip:
+        raise ValueError(f"Block range {args.start} to {end} reaches above the tip {tip}!")
+    for block in iter_blocks(args.start, end, args.workers):
+        for transaction in block.addresDict.get(args.address, ()):
+            for vout in transaction.addressDict[args.address]:
+                yield {"address": args.address, "height": block.blocknumber, "blockhash": block.blockhash,
+                       "txid": transaction.id, "vout": vout.n, "value": vout.value, "sats": vout.sats}
+
+
+def _info(args):
+    yield BlockchainInfo().to_dict()
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="Query the block explorer, output is JSON lines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    block = subparsers.add_parser("block", help="Block by height or hash")
+    selector = block.add_mutually_exclusive_group(required=True)
+    selector.add_argument("--height", type=int)
+    selector.add_argument("--hash")
+    block.add_argument("--transactions", action="store_true", help="Include the decoded transactions")
+    block.set_defaults(run=_block)
+
+    tx = subparsers.add_parser("tx", help="Transaction by id")
+    tx.add_argument("--id", required=True)
+    tx.set_defaults(run=_tx)
+
+    address = subparsers.add_parser("address", help="Outputs paying to an address in a range of blocks")
+    address.add_argument("address")
+    address.add_argument("--from", dest="start", type=int, required=True, help="First block searched")
+    address.add_argument("--to", type=int, help="Last block searched, default 1000 blocks from --from or the tip")
+    address.add_argument("--workers", type=int, default=SEARCH_WORKERS)
+    address.set_defaults(run=_address)
+
+    info = subparsers.add_parser("info", help="Chain, mempool and network summary")
+    info.set_defaults(run=_info)
+
+    batch = subparsers.add_parser("batch", help="Run one command per line from stdin")
+    batch.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                       help="Queries run at the same time, the output keeps the input order")
+    return parser
+
+
+def _run_query(parser, line: str):
+    # All records of one query, failures become an error record so the stream keeps going
+    try:
+        args = parser.parse_args(shlex.split(line))
+    except SystemExit:
+        return [{"query": line, "error": "Invalid command!"}]
+    if args.command == "batch":
+        return [{"query": line, "error": "Batch can not be nested!"}]
+    try:
+        return [dict(record, query=line) for record in args.run(args)]
+    except ValueError as error:
+        return [{"query": line, "error": str(error)}]
+    except Exception as error:
+        # Node failures and unexpected answers end this query only
+        return [{"query": line, "error": f"Query failed! Error: {error!r}"}]
+
+
+def _write(records, output):
+    for record in records:
+        output.write(json.dumps(record) + "\n")
+    output.flush()
+
+
+def _run_batch(parser, workers: int, lines, output):
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line and not line.startswith("#"))
+    if workers <= 1:
+        for line in lines:
+            _write(_run_query(parser, line), output)
+        return
+    # Like iter_blocks, at most 2 * workers queries are in flight and stdin is read as they finish
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(_run_query, parser, line) for line in itertools.islice(lines, 2 * workers))
+        while pending:
+            records = pending.popleft().result()
+            for line in itertools.islice(lines, 1):
+                pending.append(executor.submit(_run_query, parser, line))
+            _write(records, output)
+
+
+def main():
+    parser = _build_parser()
+    args = parser.parse_args()
+    output = sys.stdout
+    # The explorer reports problems with print, they must not end up in the JSON stream
+    with contextlib.redirect_stdout(sys.stderr):
+        _check_cache_tip(BlockchainInfo())
+        if args.command == "batch":
+            _run_batch(parser, args.workers, sys.stdin, output)
+        else:
+            try:
+                for record in args.run(args):
+                    _write([record], output)
+            except ValueError as error:
+                print(error)
+                sys.exit(1)
+            except Exception as error:
+                print(f"Query failed! Error: {error!r}")
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except BrokenPipeError:
+        # The reader stopped early (head and the like), the rest of the stream has nowhere to go
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
@@ -0,0 +1,302 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Read-only HTTP service over the explorer for dashboards, JSON in the same
+shape as ExplorerCli. The blocking explorer calls run on a small thread
+pool, concurrent requests for the same object share one fetch and finished
+responses are kept in a cache. When more fetches are waiting than the node
+should get, new ones are answered with 503 and Retry-After instead of being
+queued behind them.
+
+    GET /info
+    GET /block/<height or hash>[?transactions=1]
+    GET /tx/<txid>
+    GET /address/<address>?from=<height>[&to=<height>]  (from the lower height, to at most the tip)
+    GET /stats
+    GET /metrics (Prometheus text, with INSTRUMENTATION set)
+
+    python ExplorerService.py [--port 8080] [--rpc-workers 4] [--max-pending 64]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from BlockExplorer import (BlockchainInfo, _check_cache_tip, _explorer_cache, _get_blockhashes_by_numbers,
+                           _get_blockobject_by_hash, _get_blockobject_by_number, _get_loaded_blockobject_by_hash,
+                           _get_transaction_object_by_hash)
+from Instrumentation import ENABLED as INSTRUMENTED, prometheus_text
+
+
+HOST = "127.0.0.1"
+PORT = 8080
+# Explorer calls running against the node at the same time
+RPC_WORKERS = 4
+# Fetches allowed to wait for a worker before requests are turned away
+MAX_PENDING = 64
+RETRY_AFTER = 1
+MAX_ADDRESS_RANGE = 1000
+RESPONSE_CACHE_SIZE = 4096
+# Seconds a response is served from the cache, by endpoint
+RESPONSE_TTL = {"info": 5, "block": 60, "tx": 30, "address": 30}
+TIP_INTERVAL = 5
+IDLE_TIMEOUT = 30
+MAX_HEADER_LINES = 100
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _info():
+    blockchaininfo = BlockchainInfo()
+    # Every info refresh also moves the explorer caches to the current tip and drops reorganized blocks
+    _check_cache_tip(blockchaininfo)
+    return blockchaininfo.to_dict()
+
+
+def _block(selector: str, transactions: bool):
+    if selector.isdigit():
+        block = _get_blockobject_by_number(int(selector))
+    else:
+        block = _get_blockobject_by_hash(selector)
+    if block is None:
+        raise HttpError(404, f"Block {selector} not found!")
+    return block.to_dict(transactions)
+
+
+def _tx(txid: str):
+    transaction = _get_transaction_object_by_hash(txid)
+    if transaction is None:
+        raise HttpError(404, f"Transaction {txid} not found!")
+    return transaction.to_dict()
+
+
+def _address(address: str, start: int, end: int):
+    # One block at a time on the worker thread, so the RPC workers bound the requests to the node
+    outputs = []
+    for blocknumber, blockhash in _get_blockhashes_by_numbers(range(start, end + 1)):
+        block = _get_loaded_blockobject_by_hash(blockhash, blocknumber)
+        if block is None:
+            raise HttpError(404, f"Block {blocknumber} not found!")
+        for transaction in block.addresDict.get(address, ()):
+            for vout in transaction.addressDict[address]:
+                outputs.append({"height": block.blocknumber, "blockhash": block.blockhash, "txid": transaction.id,
+                                "vout": vout.n, "value": vout.value, "sats": vout.sats})
+    return {"address": address, "from": start, "to": end, "outputs": outputs}
+
+
+class ExplorerService:
+    def __init__(self, rpc_workers: int = RPC_WORKERS, max_pending: int = MAX_PENDING,
+                 cache_size: int = RESPONSE_CACHE_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=rpc_workers)
+        self.rpc_workers = rpc_workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        # key -> (expires, body)
+        self.responses = OrderedDict()
+        # key -> the future every request for that key waits on
+        self.in_flight = {}
+        self.fetches = 0
+        self.hits = 0
+        self.collapsed = 0
+        self.rejected = 0
+
+    def _cached(self, key):
+        entry = self.responses.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.responses[key]
+            return None
+        self.responses.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, kind: str, body: bytes):
+        self.responses[key] = (time.monotonic() + RESPONSE_TTL[kind], body)
+        self.responses.move_to_end(key)
+        while len(self.responses) > self.cache_size:
+            self.responses.popitem(last=False)
+
+    async def fetch(self, key, kind: str, function, *args):
+        # Cached body, or the running fetch for the same key, or a new fetch if there is room for it
+        body = self._cached(key)
+        if body is not None:
+            self.hits += 1
+            return body
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.collapsed += 1
+            return await asyncio.shield(future)
+        if len(self.in_flight) >= self.rpc_workers + self.max_pending:
+            self.rejected += 1
+            raise HttpError(503, "Too many requests waiting for the node!")
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        self.fetches += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+            body = json.dumps(result).encode()
+            self._store(key, kind, body)
+            future.set_result(body)
+        except Exception as error:
+            future.set_exception(error)
+            # Retrieved here so a fetch without other waiters does not log an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+        return body
+
+    async def route(self, target: str):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["info"]:
+            return await self.fetch(("info",), "info", _info)
+        if len(parts) == 2 and parts[0] == "block":
+            transactions = query.get("transactions", ["0"])[0] not in ("0", "false", "")
+            return await self.fetch(("block", parts[1], transactions), "block", _block, parts[1], transactions)
+        if len(parts) == 2 and parts[0] == "tx":
+            return await self.fetch(("tx", parts[1]), "tx", _tx, parts[1])
+        if len(parts) == 2 and parts[0] == "address":
+            try:
+                start = int(query["from"][0])
+                end = int(query["to"][0]) if "to" in query else start + MAX_ADDRESS_RANGE - 1
+            except (KeyError, ValueError):
+                raise HttpError(400, "Address search needs an integer from and optionally to!")
+            tip = _explorer_cache.tip_height
+            if "to" not in query and tip is not None:
+                end = max(start, min(end, tip))
+            if start < 0 or end < start:
+                raise HttpError(400, f"Block range {start} to {end} is invalid, from can not be above to!")
+            if tip is not None and end > tip:
+                raise HttpError(400, f"Block range {start} to {end} reaches above the tip {tip}!")
+            if end - start >= MAX_ADDRESS_RANGE:
+                raise HttpError(400, f"Address search covers at most {MAX_ADDRESS_RANGE} blocks!")
+            return await self.fetch(("address", parts[1], start, end), "address", _address, parts[1], start, end)
+        if parts == ["stats"]:
+            return json.dumps(self.stats()).encode()
+        if parts == ["metrics"]:
+            if not INSTRUMENTED:
+                raise HttpError(404, "Instrumentation is off, start the service with INSTRUMENTATION set!")
+            return prometheus_text().encode()
+        raise HttpError(404, f"No endpoint for {url.path}!")
+
+    def stats(self):
+        return {"fetches": self.fetches, "cache_hits": self.hits, "collapsed": self.collapsed,
+                "rejected": self.rejected, "in_flight": len(self.in_flight), "cached": len(self.responses)}
+
+    async def _respond(self, writer, status: int, body: bytes, keep_alive: bool, head: bool = False,
+                       content_type: str = "application/json"):
+        headers = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(body)}",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            headers.append(f"Retry-After: {RETRY_AFTER}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + (b"" if head else body))
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return
+                if not request_line:
+                    return
+                headers = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, b'{"error": "Malformed request line!"}', False)
+                    return
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                try:
+                    if method not in ("GET", "HEAD"):
+                        raise HttpError(405, "Only GET is supported!")
+                    status, body = 200, await self.route(target)
+                except HttpError as error:
+                    status, body = error.status, json.dumps({"error": str(error)}).encode()
+                except ValueError as error:
+                    # The explorer raises ValueError for what the node does not have
+                    status, body = 404, json.dumps({"error": str(error)}).encode()
+                except Exception as error:
+                    print(f"Error serving {target}: {error!r}")
+                    status, body = 503, json.dumps({"error": "The node request failed!"}).encode()
+                content_type = METRICS_CONTENT_TYPE if status == 200 and urlsplit(target).path == "/metrics" \
+                    else "application/json"
+                await self._respond(writer, status, body, keep_alive, method == "HEAD", content_type)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+    async def _follow_tip(self):
+        # Keeps the cached info and the explorer caches on the current tip without waiting for a request
+        tip = None
+        while True:
+            self.responses.pop(("info",), None)
+            try:
+                info = json.loads(await self.fetch(("info",), "info", _info))
+                # Confirmations and the block at a height change with the tip, the explorer caches keep the objects
+                if tip is not None and info["bestblockhash"] != tip:
+                    body = self.responses.get(("info",))
+                    self.responses.clear()
+                    if body is not None:
+                        self.responses[("info",)] = body
+                tip = info["bestblockhash"]
+            except Exception as error:
+                print(f"Error refreshing chain info: {error!r}")
+            await asyncio.sleep(TIP_INTERVAL)
+
+    async def serve(self, host: str = HOST, port: int = PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        tip_task = asyncio.create_task(self._follow_tip())
+        print(f"Serving explorer on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            tip_task.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only HTTP service over the block explorer")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--rpc-workers", type=int, default=RPC_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    args = parser.parse_args()
+    service = ExplorerService(args.rpc_workers, args.max_pending)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == '__main__':
+    main()
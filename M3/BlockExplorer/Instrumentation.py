@@ -0,0 +1,207 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Optional instrumentation of the RPC traffic and the hot code paths of the
+explorer and the wallet. Turned on with the environment variable
+INSTRUMENTATION, read once at import:
+
+    INSTRUMENTATION=summary python BlockExplorer.py       table on stderr at exit
+    INSTRUMENTATION=prometheus python ExplorerCli.py ...  Prometheus text at exit
+    INSTRUMENTATION_FILE=metrics.txt                      write the output there instead
+
+Per RPC method it records requests, calls, bytes sent and received and
+histograms of the time waiting for the node (until the response headers,
+bitcoind sends them once the JSON body is encoded), the time reading the
+body and the time decoding it. Functions decorated with timed get a
+histogram of their own. When it is off timed returns the function as it is
+and the RPC client skips the bookkeeping, so the cost is one flag test per
+request.
+"""
+
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+MODE = os.environ.get("INSTRUMENTATION", "").lower()
+ENABLED = MODE in ("1", "summary", "prometheus")
+OUTPUT_PATH = os.environ.get("INSTRUMENTATION_FILE")
+
+# Upper bounds in seconds, the last bucket is +Inf
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float):
+        # Upper bound of the bucket holding the rank, the largest observation for the last bucket
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return 0.0
+
+
+class RpcMetrics:
+    __slots__ = ("requests", "calls", "sent", "received", "wait", "transfer", "decode")
+
+    def __init__(self):
+        self.requests = 0
+        self.calls = 0
+        self.sent = 0
+        self.received = 0
+        self.wait = Histogram()
+        self.transfer = Histogram()
+        self.decode = Histogram()
+
+
+_lock = threading.Lock()
+# Method -> RpcMetrics, a batch mixing methods is kept under its methods joined with +
+_rpc = {}
+# Name of the timed function -> Histogram
+_sections = {}
+
+
+def _method_key(payload):
+    if isinstance(payload, dict):
+        return payload["method"], 1
+    methods = Counter(call["method"] for call in payload)
+    return "+".join(sorted(methods)), len(payload)
+
+
+def record_rpc(payload, sent: int, received: int, wait: float, total: float, decode: float):
+    key, calls = _method_key(payload)
+    with _lock:
+        metrics = _rpc.get(key)
+        if metrics is None:
+            metrics = _rpc[key] = RpcMetrics()
+        metrics.requests += 1
+        metrics.calls += calls
+        metrics.sent += sent
+        metrics.received += received
+        metrics.wait.observe(wait)
+        metrics.transfer.observe(max(0.0, total - wait))
+        metrics.decode.observe(decode)
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        histogram = _sections.get(name)
+        if histogram is None:
+            histogram = _sections[name] = Histogram()
+        histogram.observe(seconds)
+
+
+def timed(name: str):
+    # Decorator recording the time of every call, a no-op unless instrumentation is on
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _rpc.clear()
+        _sections.clear()
+
+
+def summary_text():
+    with _lock:
+        lines = [f"{'RPC method':<36}{'requests':>9}{'calls':>8}{'sent KB':>10}{'recv KB':>10}"
+                 f"{'wait s':>9}{'read s':>9}{'decode s':>9}{'p50 ms':>9}{'p99 ms':>9}"]
+        for key, metrics in sorted(_rpc.items(), key=lambda item: -item[1].wait.sum):
+            lines.append(f"{key[:35]:<36}{metrics.requests:>9}{metrics.calls:>8}{metrics.sent / 1000:>10.1f}"
+                         f"{metrics.received / 1000:>10.1f}{metrics.wait.sum:>9.3f}{metrics.transfer.sum:>9.3f}"
+                         f"{metrics.decode.sum:>9.3f}{metrics.wait.percentile(0.5) * 1000:>9.2f}"
+                         f"{metrics.wait.percentile(0.99) * 1000:>9.2f}")
+        lines.append("")
+        lines.append(f"{'Section':<36}{'calls':>9}{'total s':>10}{'mean ms':>10}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, histogram in sorted(_sections.items(), key=lambda item: -item[1].sum):
+            lines.append(f"{name[:35]:<36}{histogram.count:>9}{histogram.sum:>10.3f}"
+                         f"{histogram.sum / histogram.count * 1000:>10.3f}{histogram.percentile(0.5) * 1000:>9.3f}"
+                         f"{histogram.percentile(0.99) * 1000:>9.3f}")
+    return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram):
+    cumulative = 0
+    lines = []
+    for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def prometheus_text():
+    with _lock:
+        rpc = sorted(_rpc.items())
+        sections = sorted(_sections.items())
+        lines = []
+        for name, kind, value in (("rpc_requests_total", "counter", lambda metrics: metrics.requests),
+                                  ("rpc_calls_total", "counter", lambda metrics: metrics.calls),
+                                  ("rpc_sent_bytes_total", "counter", lambda metrics: metrics.sent),
+                                  ("rpc_received_bytes_total", "counter", lambda metrics: metrics.received)):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{method="{key}"}} {value(metrics)}' for key, metrics in rpc)
+        for name, histogram_of in (("rpc_wait_seconds", lambda metrics: metrics.wait),
+                                   ("rpc_read_seconds", lambda metrics: metrics.transfer),
+                                   ("rpc_decode_seconds", lambda metrics: metrics.decode)):
+            lines.append(f"# TYPE {name} histogram")
+            for key, metrics in rpc:
+                lines.extend(_histogram_lines(name, f'method="{key}"', histogram_of(metrics)))
+        lines.append("# TYPE section_seconds histogram")
+        for name, histogram in sections:
+            lines.extend(_histogram_lines("section_seconds", f'section="{name}"', histogram))
+    return "\n".join(lines) + "\n"
+
+
+def _write_at_exit():
+    text = prometheus_text() if MODE == "prometheus" else summary_text()
+    if OUTPUT_PATH:
+        with open(OUTPUT_PATH, "w") as file:
+            file.write(text)
+    else:
+        # stderr keeps the JSON of ExplorerCli on stdout clean
+        sys.stderr.write(text)
+
+
+if ENABLED:
+    atexit.register(_write_at_exit)
@@ -0,0 +1,239 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+In-memory index of the mempool that follows the node incrementally. Each
+sync fetches only the txid list, diffs it against the index, asks for the
+new entries in batches and drops the ones that left. Fee rate histogram,
+ancestor packages and address lookups are kept up to date during the sync
+so the queries afterwards do not touch the node.
+"""
+
+import bisect
+
+from RawBlock import parse_raw_transaction
+from RpcClient import get_client
+
+
+SATOSHIS_PER_COIN = 100000000
+ENTRY_BATCH_SIZE = 500
+# Lower bounds of the fee rate buckets in sat/vbyte
+FEE_RATE_BUCKETS = [0, 1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 30, 40, 50, 60, 70, 80, 90, 100,
+                    125, 150, 175, 200, 250, 300, 350, 400, 500, 600, 700, 800, 900, 1000, 2000]
+
+
+class MempoolEntry:
+    __slots__ = ("txid", "vsize", "fee", "time", "parents", "children", "addresses",
+                 "ancestors", "ancestor_fee", "ancestor_vsize", "bucket")
+
+    def __init__(self, txid: str, entry, transaction):
+        self.txid = txid
+        self.vsize = entry["vsize"]
+        fee = entry["fees"]["base"] if "fees" in entry else entry["fee"]
+        self.fee = round(fee * SATOSHIS_PER_COIN)
+        self.time = entry["time"]
+        self.parents = set(entry["depends"])
+        self.children = set()
+        self.addresses = {vout["scriptPubKey"]["addresses"][0] for vout in transaction["vout"]
+                          if "addresses" in vout["scriptPubKey"]}
+        self.ancestors = frozenset()
+        self.ancestor_fee = self.fee
+        self.ancestor_vsize = self.vsize
+        self.bucket = bisect.bisect_right(FEE_RATE_BUCKETS, self.fee_rate) - 1
+
+    @property
+    def fee_rate(self):
+        return self.fee / self.vsize
+
+    @property
+    def package_fee_rate(self):
+        # What a miner gets per vbyte for including the entry together with its unconfirmed ancestors
+        return self.ancestor_fee / self.ancestor_vsize
+
+    def __str__(self):
+        return f"Tx: {self.txid}\n" \
+               f"   Fee: {self.fee} sats, {self.fee_rate:.2f} sat/vbyte\n" \
+               f"   Virtual size: {self.vsize} vbytes\n" \
+               f"   Unconfirmed ancestors: {len(self.ancestors)}, package {self.package_fee_rate:.2f} sat/vbyte"
+
+
+class MempoolDiff:
+    def __init__(self, added, removed, watched):
+        self.added = added
+        self.removed = removed
+        # Watched address -> txids paying to it that entered the mempool in this sync
+        self.watched = watched
+
+    def __str__(self):
+        return f"{len(self.added)} transactions added, {len(self.removed)} removed"
+
+
+class MempoolTracker:
+    def __init__(self, client=None, chain: str = "main", batch_size: int = ENTRY_BATCH_SIZE):
+        self.client = client
+        self.chain = chain
+        self.batch_size = batch_size
+        self.entries = {}
+        self.by_address = {}
+        self.watches = set()
+        self.bucket_counts = [0] * len(FEE_RATE_BUCKETS)
+        self.bucket_vsizes = [0] * len(FEE_RATE_BUCKETS)
+        self.total_vsize = 0
+        self.total_fee = 0
+
+    def _client(self):
+        return self.client or get_client()
+
+    def sync(self):
+        response = self._client().call("getrawmempool", False)
+        error = response["error"]
+        if error:
+            raise ValueError(f"Error reading mempool! Code: {error['code']} with message {error['message']}")
+        current = set(response["result"])
+        removed = [txid for txid in self.entries if txid not in current]
+        dirty = set()
+        for txid in removed:
+            dirty.update(self._remove(txid))
+        added = self._fetch([txid for txid in current if txid not in self.entries])
+        for entry in added:
+            self._add(entry)
+        # Linked after all are added, a child can come before its parent in the batch
+        for entry in added:
+            self._link(entry)
+        dirty.update(entry.txid for entry in added)
+        self._update_ancestors(dirty)
+        watched = {}
+        for entry in added:
+            for address in entry.addresses & self.watches:
+                watched.setdefault(address, []).append(entry.txid)
+        return MempoolDiff([entry.txid for entry in added], removed, watched)
+
+    def _fetch(self, txids):
+        # Entry and raw transaction of every new txid in one batch, raw hex is decoded locally like raw blocks
+        calls = []
+        for txid in txids:
+            calls.append(("getmempoolentry", [txid]))
+            calls.append(("getrawtransaction", [txid, False]))
+        responses = self._client().batch(calls, self.batch_size * 2)
+        entries = []
+        for number, txid in enumerate(txids):
+            entry_response = responses[2 * number]
+            raw_response = responses[2 * number + 1]
+            # Mined or evicted between the txid list and this batch, the next sync no longer lists it
+            if entry_response["error"] or raw_response["error"]:
+                continue
+            transaction = parse_raw_transaction(bytes.fromhex(raw_response["result"]), self.chain, False)
+            entries.append(MempoolEntry(txid, entry_response["result"], transaction))
+        return entries
+
+    def _add(self, entry: MempoolEntry):
+        self.entries[entry.txid] = entry
+        for address in entry.addresses:
+            self.by_address.setdefault(address, set()).add(entry.txid)
+        self.bucket_counts[entry.bucket] += 1
+        self.bucket_vsizes[entry.bucket] += entry.vsize
+        self.total_vsize += entry.vsize
+        self.total_fee += entry.fee
+
+    def _link(self, entry: MempoolEntry):
+        entry.parents = {parent for parent in entry.parents if parent in self.entries}
+        for parent in entry.parents:
+            self.entries[parent].children.add(entry.txid)
+
+    def _remove(self, txid: str):
+        # Returns the descendants whose ancestor package changed
+        entry = self.entries.pop(txid)
+        for parent in entry.parents:
+            if parent in self.entries:
+                self.entries[parent].children.discard(txid)
+        for child in entry.children:
+            if child in self.entries:
+                self.entries[child].parents.discard(txid)
+        for address in entry.addresses:
+            txids = self.by_address[address]
+            txids.discard(txid)
+            if not txids:
+                del self.by_address[address]
+        self.bucket_counts[entry.bucket] -= 1
+        self.bucket_vsizes[entry.bucket] -= entry.vsize
+        self.total_vsize -= entry.vsize
+        self.total_fee -= entry.fee
+        return self.descendants(txid, entry.children)
+
+    def descendants(self, txid: str, children=None):
+        found = set()
+        stack = list(self.entries[txid].children if children is None else children)
+        while stack:
+            child = stack.pop()
+            if child in found or child not in self.entries:
+                continue
+            found.add(child)
+            stack.extend(self.entries[child].children)
+        return found
+
+    def _update_ancestors(self, dirty):
+        # Parents are resolved before children so every entry builds on finished ancestor sets
+        dirty = {txid for txid in dirty if txid in self.entries}
+        for txid in list(dirty):
+            dirty.update(self.descendants(txid))
+        done = set()
+
+        def resolve(txid):
+            stack = [txid]
+            while stack:
+                current = stack[-1]
+                pending = [parent for parent in self.entries[current].parents
+                           if parent in dirty and parent not in done]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                if current in done:
+                    continue
+                entry = self.entries[current]
+                ancestors = set(entry.parents)
+                for parent in entry.parents:
+                    ancestors.update(self.entries[parent].ancestors)
+                entry.ancestors = frozenset(ancestors)
+                entry.ancestor_fee = entry.fee + sum(self.entries[ancestor].fee for ancestor in ancestors)
+                entry.ancestor_vsize = entry.vsize + sum(self.entries[ancestor].vsize for ancestor in ancestors)
+                done.add(current)
+
+        for txid in dirty:
+            resolve(txid)
+
+    def watch(self, address: str):
+        self.watches.add(address)
+        return self.transactions_for(address)
+
+    def unwatch(self, address: str):
+        self.watches.discard(address)
+
+    def transactions_for(self, address: str):
+        return [self.entries[txid] for txid in self.by_address.get(address, ())]
+
+    def get(self, txid: str):
+        return self.entries.get(txid)
+
+    def package(self, txid: str):
+        # The entry and its unconfirmed ancestors, the set a miner has to include together
+        entry = self.entries[txid]
+        return [self.entries[ancestor] for ancestor in entry.ancestors] + [entry]
+
+    def histogram(self):
+        # (lowest fee rate, transactions, vbytes) per bucket, highest fee rate first
+        return [(FEE_RATE_BUCKETS[bucket], self.bucket_counts[bucket], self.bucket_vsizes[bucket])
+                for bucket in reversed(range(len(FEE_RATE_BUCKETS))) if self.bucket_counts[bucket]]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        retstr = f"Transactions: {len(self.entries)}\n" \
+                 f"Virtual size: {self.total_vsize / 1000000:.2f} MvB\n" \
+                 f"Total fees: {self.total_fee / SATOSHIS_PER_COIN:.8f} BTE\n" \
+                 f"Fee rate histogram (sat/vbyte):"
+        for fee_rate, count, vsize in self.histogram():
+            retstr += f"\n   {fee_rate:>5}+ {count:>8} tx {vsize / 1000000:>8.3f} MvB"
+        return retstr
@@ -0,0 +1,322 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Decoding of serialized blocks into the same dictionaries that bitcoind returns for
+getblock <hash> 2, so they can be handed straight to Block and Transaction.
+Scripts are not disassembled, the asm fields are left empty.
+"""
+
+import hashlib
+import struct
+
+from Instrumentation import timed
+
+
+SATOSHIS_PER_COIN = 100000000
+
+NETWORKS = {
+    "main": {"p2pkh": b"\x00", "p2sh": b"\x05", "hrp": "bc"},
+    "test": {"p2pkh": b"\x6f", "p2sh": b"\xc4", "hrp": "tb"},
+    "testnet4": {"p2pkh": b"\x6f", "p2sh": b"\xc4", "hrp": "tb"},
+    "signet": {"p2pkh": b"\x6f", "p2sh": b"\xc4", "hrp": "tb"},
+    "regtest": {"p2pkh": b"\x6f", "p2sh": b"\xc4", "hrp": "bcrt"},
+}
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BECH32_ALPHABET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_CONSTANT = 1
+BECH32M_CONSTANT = 0x2bc830a3
+
+MAX_TARGET = 0xffff << 208
+
+_UINT32 = struct.Struct("<I")
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+
+
+def double_sha256(*parts):
+    first = hashlib.sha256()
+    for part in parts:
+        first.update(part)
+    return hashlib.sha256(first.digest()).digest()
+
+
+def hash160(data):
+    return hashlib.new("ripemd160", hashlib.sha256(data).digest()).digest()
+
+
+def base58check(payload: bytes):
+    data = payload + double_sha256(payload)[:4]
+    value = int.from_bytes(data, "big")
+    encoded = ""
+    while value:
+        value, remainder = divmod(value, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(data) - len(data.lstrip(b"\x00"))
+    return "1" * leading_zeros + encoded
+
+
+_BECH32_GENERATOR = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+# The generator terms for every value of the five top bits, XORed together ahead of time
+_BECH32_TABLE = [0] * 32
+for _top in range(32):
+    for _bit in range(5):
+        if (_top >> _bit) & 1:
+            _BECH32_TABLE[_top] ^= _BECH32_GENERATOR[_bit]
+
+
+def _bech32_polymod(values):
+    checksum = 1
+    for value in values:
+        checksum = (checksum & 0x1ffffff) << 5 ^ value ^ _BECH32_TABLE[checksum >> 25]
+    return checksum
+
+
+def _convert_bits(data, from_bits: int, to_bits: int):
+    accumulator = 0
+    bits = 0
+    result = []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        accumulator = (accumulator << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((accumulator >> bits) & max_value)
+    if bits:
+        result.append((accumulator << (to_bits - bits)) & max_value)
+    return result
+
+
+def segwit_address(hrp: str, witness_version: int, program: bytes):
+    data = [witness_version] + _convert_bits(program, 8, 5)
+    constant = BECH32_CONSTANT if witness_version == 0 else BECH32M_CONSTANT
+    expanded_hrp = [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+    polymod = _bech32_polymod(expanded_hrp + data + [0] * 6) ^ constant
+    checksum = [(polymod >> 5 * (5 - number)) & 31 for number in range(6)]
+    return hrp + "1" + "".join(BECH32_ALPHABET[value] for value in data + checksum)
+
+
+def classify_script(script: bytes, chain: str = "main"):
+    # Returns (type, address) using the type names of bitcoind, address is None when there is none
+    network = NETWORKS[chain]
+    length = len(script)
+    if length == 25 and script[0] == 0x76 and script[1] == 0xa9 and script[2] == 0x14 \
+            and script[23] == 0x88 and script[24] == 0xac:
+        return "pubkeyhash", base58check(network["p2pkh"] + script[3:23])
+    if length == 23 and script[0] == 0xa9 and script[1] == 0x14 and script[22] == 0x87:
+        return "scripthash", base58check(network["p2sh"] + script[2:22])
+    if length == 22 and script[0] == 0x00 and script[1] == 0x14:
+        return "witness_v0_keyhash", segwit_address(network["hrp"], 0, script[2:])
+    if length == 34 and script[0] == 0x00 and script[1] == 0x20:
+        return "witness_v0_scripthash", segwit_address(network["hrp"], 0, script[2:])
+    if length == 34 and script[0] == 0x51 and script[1] == 0x20:
+        return "witness_v1_taproot", segwit_address(network["hrp"], 1, script[2:])
+    if (length == 35 and script[0] == 0x21 and script[34] == 0xac) or \
+            (length == 67 and script[0] == 0x41 and script[66] == 0xac):
+        # Older nodes report pay to pubkey outputs with the address of the key hash
+        return "pubkey", base58check(network["p2pkh"] + hash160(script[1:-1]))
+    if length and script[0] == 0x6a:
+        return "nulldata", None
+    return "nonstandard", None
+
+
+def bits_to_difficulty(bits: int):
+    exponent = bits >> 24
+    mantissa = bits & 0xffffff
+    target = mantissa << (8 * (exponent - 3)) if exponent >= 3 else mantissa >> (8 * (3 - exponent))
+    return MAX_TARGET / target if target else 0.0
+
+
+class _Reader:
+    __slots__ = ("view", "position")
+
+    def __init__(self, view: memoryview, position: int = 0):
+        self.view = view
+        self.position = position
+
+    def read(self, length: int):
+        start = self.position
+        self.position += length
+        return self.view[start:self.position]
+
+    def uint8(self):
+        value = self.view[self.position]
+        self.position += 1
+        return value
+
+    def uint32(self):
+        value = _UINT32.unpack_from(self.view, self.position)[0]
+        self.position += 4
+        return value
+
+    def int32(self):
+        value = _INT32.unpack_from(self.view, self.position)[0]
+        self.position += 4
+        return value
+
+    def int64(self):
+        value = _INT64.unpack_from(self.view, self.position)[0]
+        self.position += 8
+        return value
+
+    def varint(self):
+        prefix = self.uint8()
+        if prefix < 0xfd:
+            return prefix
+        if prefix == 0xfd:
+            value = self.view[self.position] | self.view[self.position + 1] << 8
+            self.position += 2
+            return value
+        if prefix == 0xfe:
+            return self.uint32()
+        value = struct.unpack_from("<Q", self.view, self.position)[0]
+        self.position += 8
+        return value
+
+
+def parse_transaction(reader: _Reader, chain: str = "main", include_hex: bool = True):
+    view = reader.view
+    start = reader.position
+    version = reader.int32()
+    segwit = view[reader.position] == 0 and view[reader.position + 1] != 0
+    if segwit:
+        reader.position += 2
+    body_start = reader.position
+
+    vin = []
+    for _ in range(reader.varint()):
+        prev_hash = reader.read(32)
+        prev_index = reader.uint32()
+        script = reader.read(reader.varint())
+        sequence = reader.uint32()
+        if prev_index == 0xffffffff and not any(prev_hash):
+            vin.append({"coinbase": script.hex(), "sequence": sequence})
+        else:
+            vin.append({
+                "txid": bytes(prev_hash[::-1]).hex(),
+                "vout": prev_index,
+                "scriptSig": {"asm": "", "hex": script.hex()},
+                "sequence": sequence
+            })
+
+    vout = []
+    for number in range(reader.varint()):
+        value = reader.int64()
+        script = bytes(reader.read(reader.varint()))
+        script_type, address = classify_script(script, chain)
+        script_pub_key = {"asm": "", "hex": script.hex(), "type": script_type}
+        if address is not None:
+            script_pub_key["reqSigs"] = 1
+            script_pub_key["addresses"] = [address]
+        vout.append({"value": value / SATOSHIS_PER_COIN, "n": number, "scriptPubKey": script_pub_key})
+    body_end = reader.position
+
+    if segwit:
+        for vin_entry in vin:
+            witnesses = [reader.read(reader.varint()).hex() for _ in range(reader.varint())]
+            if witnesses and "txid" in vin_entry:
+                vin_entry["txinwitness"] = witnesses
+    locktime_start = reader.position
+    locktime = reader.uint32()
+    end = reader.position
+
+    # The txid covers everything except the marker, flag and witnesses
+    if segwit:
+        txid = double_sha256(view[start:start + 4], view[body_start:body_end], view[locktime_start:end])
+    else:
+        txid = double_sha256(view[start:end])
+    wtxid = double_sha256(view[start:end]) if segwit else txid
+    size = end - start
+    stripped_size = 4 + (body_end - body_start) + 4
+    weight = stripped_size * 3 + size
+
+    transaction = {
+        "txid": txid[::-1].hex(),
+        "hash": wtxid[::-1].hex(),
+        "version": version,
+        "size": size,
+        "vsize": (weight + 3) // 4,
+        "weight": weight,
+        "locktime": locktime,
+        "vin": vin,
+        "vout": vout,
+        "hex": view[start:end].hex() if include_hex else None
+    }
+    return transaction, stripped_size
+
+
+@timed("parse_raw_transaction")
+def parse_raw_transaction(data, chain: str = "main", include_hex: bool = True):
+    # A single serialized transaction, as getrawtransaction <txid> true shapes it
+    transaction, _ = parse_transaction(_Reader(memoryview(data)), chain, include_hex)
+    return transaction
+
+
+def _coinbase_height(coinbase_hex: str, version: int):
+    # BIP34 puts the height as the first push of the coinbase script of version 2+ blocks, serialized like
+    # CScript() << height: OP_1..OP_16 or a minimal non-negative number. Anything else is not a height.
+    if version < 2:
+        return None
+    script = bytes.fromhex(coinbase_hex)
+    if not script:
+        return None
+    if 0x51 <= script[0] <= 0x60:
+        return script[0] - 0x50
+    length = script[0]
+    if not 1 <= length <= 5 or len(script) < 1 + length:
+        return None
+    number = script[1:1 + length]
+    if number[-1] & 0x80:
+        return None
+    if number[-1] == 0 and (length == 1 or not number[-2] & 0x80):
+        return None
+    return int.from_bytes(number, "little")
+
+
+@timed("parse_block")
+def parse_block(data, height: int = None, chain: str = "main", include_hex: bool = True):
+    view = memoryview(data)
+    header = view[:80]
+    reader = _Reader(view, 80)
+    version = _INT32.unpack_from(header, 0)[0]
+    time, bits, nonce = struct.unpack_from("<III", header, 68)
+    blockhash = double_sha256(header)[::-1].hex()
+
+    transactions = []
+    stripped_size = 80
+    count = reader.varint()
+    stripped_size += reader.position - 80
+    for _ in range(count):
+        transaction, transaction_stripped_size = parse_transaction(reader, chain, include_hex)
+        transaction["blockhash"] = blockhash
+        transaction["time"] = time
+        transaction["blocktime"] = time
+        transactions.append(transaction)
+        stripped_size += transaction_stripped_size
+
+    if height is None and transactions and "coinbase" in transactions[0]["vin"][0]:
+        height = _coinbase_height(transactions[0]["vin"][0]["coinbase"], version)
+    size = reader.position
+    return {
+        "hash": blockhash,
+        "height": height,
+        "confirmations": None,
+        "strippedsize": stripped_size,
+        "size": size,
+        "weight": stripped_size * 3 + size,
+        "version": version,
+        "versionHex": "%08x" % (version & 0xffffffff),
+        "merkleroot": bytes(header[36:68][::-1]).hex(),
+        "tx": transactions,
+        "time": time,
+        "mediantime": None,
+        "nonce": nonce,
+        "bits": "%08x" % bits,
+        "difficulty": bits_to_difficulty(bits),
+        "chainwork": None,
+        "nTx": count,
+        "previousblockhash": bytes(header[4:36][::-1]).hex()
+    }
@@ -0,0 +1,137 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+"""
+
+import base64
+import itertools
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Instrumentation import ENABLED as INSTRUMENTED, record_rpc
+
+
+RPC_USER = "admin"
+RPC_PASSWORD = "admin"
+RPC_HOST = "localhost"
+RPC_PORT = 8332
+
+URL = f"http://{RPC_HOST}:{RPC_PORT}"
+HEADERS = {"content-type": "application/json"}
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 120)
+RETRIES = 3
+BACKOFF = 0.25
+POOL_SIZE = 16
+BATCH_SIZE = 500
+
+# 503 is what bitcoind answers when its RPC work queue is full
+TRANSIENT_STATUS_CODES = {502, 503, 504}
+
+
+class RpcTransientError(Exception):
+    pass
+
+
+class RpcClient:
+    def __init__(self, url: str = URL, user: str = RPC_USER, password: str = RPC_PASSWORD,
+                 timeout=TIMEOUT, retries: int = RETRIES, backoff: float = BACKOFF,
+                 pool_size: int = POOL_SIZE):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        # Encode the credentials once instead of letting requests redo it for every call
+        credentials = base64.b64encode(f"{user}:{password}".encode()).decode()
+        self.session.headers["Authorization"] = f"Basic {credentials}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._ids = itertools.count()
+        self._id_lock = threading.Lock()
+
+    def _next_id(self):
+        with self._id_lock:
+            return next(self._ids)
+
+    def _post(self, payload):
+        data = json.dumps(payload)
+        attempt = 0
+        while True:
+            try:
+                sent = time.perf_counter()
+                response = self.session.post(self.url, data=data, timeout=self.timeout)
+                if response.status_code in TRANSIENT_STATUS_CODES:
+                    raise RpcTransientError(f"HTTP {response.status_code}: {response.text.strip()}")
+                if response.status_code == 401:
+                    response.raise_for_status()
+                if not INSTRUMENTED:
+                    return response.json()
+                received = time.perf_counter()
+                result = response.json()
+                # elapsed ends at the response headers, the rest of the round trip is reading the body
+                record_rpc(payload, len(data), len(response.content), response.elapsed.total_seconds(),
+                           received - sent, time.perf_counter() - received)
+                return result
+            except (requests.ConnectionError, requests.Timeout, RpcTransientError):
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+
+    def call(self, method: str, *params):
+        payload = {
+            "jsonrpc": "1.0",
+            "id": self._next_id(),
+            "method": method,
+            "params": list(params)
+        }
+        return self._post(payload)
+
+    def batch(self, calls, chunk_size: int = BATCH_SIZE):
+        calls = list(calls)
+        responses = []
+        for start in range(0, len(calls), chunk_size):
+            chunk = calls[start:start + chunk_size]
+            ids = [self._next_id() for _ in chunk]
+            payload = [{
+                "jsonrpc": "1.0",
+                "id": request_id,
+                "method": method,
+                "params": list(params)
+            } for request_id, (method, params) in zip(ids, chunk)]
+            answer = self._post(payload)
+            if not isinstance(answer, list):
+                # The node answers a batch it can not run (parse error, internal error) with one error object
+                error = answer.get("error") if isinstance(answer, dict) else answer
+                raise ValueError(f"Error in batch request of {len(chunk)} calls! Error: {error}")
+            by_id = {response["id"]: response for response in answer}
+            responses.extend(by_id[request_id] for request_id in ids)
+        return responses
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = RpcClient()
+        return _default_client
+
+
+def set_client(client):
+    # Later get_client() calls return this client, for pointing the programs at another node or a stand-in
+    global _default_client
+    with _default_lock:
+        _default_client = client
@@ -0,0 +1,228 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Recording and replay of JSON-RPC traffic, so the explorer and the wallet can
+run and be measured without a live node. The recording proxy forwards every
+request to the node and appends each call with its response and HTTP status to a
+fixture file, one JSON object per line. The replay server answers from such
+a file with the recorded status and a configurable latency per HTTP request
+and per call. A call that was never recorded with exactly those params gets
+a JSON-RPC error and is counted as a miss.
+
+    python RpcReplay.py record fixtures.jsonl [--node http://localhost:8332] [--port 8333]
+    python RpcReplay.py replay fixtures.jsonl [--port 8333] [--latency 0.002] [--call-latency 0.0005]
+
+Point a program at the proxy or the stand-in with RpcClient.set_client or by
+changing RPC_PORT. GET /stats on the replay server returns the calls served.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from RpcClient import TIMEOUT, URL
+
+
+HOST = "127.0.0.1"
+PORT = 8333
+# JSON-RPC internal error, answered for calls without a recording
+RPC_NO_RECORDING = -32603
+
+
+def fixture_key(method: str, params):
+    return json.dumps([method, params], sort_keys=True, separators=(",", ":"))
+
+
+def _requests_of(body):
+    return body if isinstance(body, list) else [body]
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, with Nagle every keep-alive request waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def _send(self, data: bytes, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RecordingProxy(ThreadingHTTPServer):
+    def __init__(self, path: str, node_url: str = URL, host: str = HOST, port: int = PORT):
+        super().__init__((host, port), _RecordingHandler)
+        self.node_url = node_url
+        self.session = requests.Session()
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, body, status: int, content: bytes):
+        # bitcoind answers a failed single call with 404 or 500 and a JSON error, a wrong password or a full
+        # work queue with no JSON-RPC response at all. Calls without one keep the raw body instead.
+        try:
+            responses = _requests_of(json.loads(content))
+        except ValueError:
+            responses = []
+        by_id = {response.get("id"): response for response in responses if isinstance(response, dict)}
+        with self.lock:
+            for request in _requests_of(body):
+                entry = {"method": request["method"], "params": request.get("params", []), "status": status}
+                response = by_id.get(request.get("id"))
+                if response is None:
+                    entry["body"] = content.decode("utf-8", "replace")
+                else:
+                    entry["result"] = response.get("result")
+                    entry["error"] = response.get("error")
+                self.file.write(json.dumps(entry) + "\n")
+                self.recorded += 1
+            self.file.flush()
+
+    def server_close(self):
+        super().server_close()
+        self.file.close()
+
+
+class _RecordingHandler(_JsonHandler):
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+        # The credentials of the client are passed on, the proxy itself knows none
+        headers = {"Content-Type": "application/json"}
+        if "Authorization" in self.headers:
+            headers["Authorization"] = self.headers["Authorization"]
+        response = self.server.session.post(self.server.node_url, data=data, headers=headers, timeout=TIMEOUT)
+        self.server.record(json.loads(data), response.status_code, response.content)
+        self._send(response.content, response.status_code)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    def __init__(self, path: str, latency: float = 0.0, call_latency: float = 0.0, host: str = HOST, port: int = PORT):
+        super().__init__((host, port), _ReplayHandler)
+        self.latency = latency
+        self.call_latency = call_latency
+        self.lock = threading.Lock()
+        # Exact method and params -> (HTTP status, response, raw body), the last recording of a call wins
+        self.fixtures = {}
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    status = entry["status"]
+                    if "body" in entry:
+                        fixture = (status, None, entry["body"])
+                    else:
+                        fixture = (status, {"result": entry["result"], "error": entry["error"]}, None)
+                    self.fixtures[fixture_key(entry["method"], entry["params"])] = fixture
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.calls = {}
+            self.misses = {}
+
+    def answer(self, request):
+        # (HTTP status, response, raw body) for one call
+        method = request.get("method")
+        params = request.get("params", [])
+        fixture = self.fixtures.get(fixture_key(method, params))
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if fixture is None:
+                self.misses[method] = self.misses.get(method, 0) + 1
+                first_miss = self.misses[method] == 1
+        if fixture is None:
+            if first_miss:
+                print(f"No recording of {method} with params {json.dumps(params)[:200]}", file=sys.stderr)
+            fixture = (500, {"result": None, "error": {"code": RPC_NO_RECORDING,
+                                                       "message": f"No recording of {method} with these params"}}, None)
+        status, response, raw = fixture
+        return status, None if response is None else dict(response, id=request.get("id")), raw
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "calls": dict(self.calls), "misses": dict(self.misses)}
+
+
+class _ReplayHandler(_JsonHandler):
+    def do_POST(self):
+        body = self._read_json()
+        answers = [self.server.answer(request) for request in _requests_of(body)]
+        with self.server.lock:
+            self.server.requests += 1
+        delay = self.server.latency + self.server.call_latency * len(answers)
+        if delay:
+            time.sleep(delay)
+        # A recording without a JSON-RPC response failed the whole HTTP request, a batch of calls is 200 otherwise
+        raw = next((answer for answer in answers if answer[2] is not None), None)
+        if raw is not None:
+            self._send(raw[2].encode(), raw[0])
+        elif isinstance(body, list):
+            self._send(json.dumps([response for _, response, _ in answers]).encode())
+        else:
+            self._send(json.dumps(answers[0][1]).encode(), answers[0][0])
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            stats = self.server.stats()
+            if "reset" in self.path:
+                self.server.reset()
+            self._send(json.dumps(stats).encode())
+        else:
+            self._send(b'{"error": "Not found"}', 404)
+
+
+def serve_in_background(server):
+    # Runs the server on a daemon thread, stop it with server.shutdown() and server.server_close()
+    thread = threading.Thread(target=server.serve_forever, name="rpc-replay", daemon=True)
+    thread.start()
+    return f"http://{server.server_address[0]}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record JSON-RPC traffic to fixtures or replay it")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="Proxy to the node and append every call to the fixture file")
+    record.add_argument("path")
+    record.add_argument("--node", default=URL)
+    record.add_argument("--port", type=int, default=PORT)
+    replay = subparsers.add_parser("replay", help="Answer from a fixture file")
+    replay.add_argument("path")
+    replay.add_argument("--port", type=int, default=PORT)
+    replay.add_argument("--latency", type=float, default=0.0, help="Seconds added to every HTTP request")
+    replay.add_argument("--call-latency", type=float, default=0.0, help="Seconds added per call in a request")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        server = RecordingProxy(args.path, args.node, port=args.port)
+        print(f"Recording {args.node} to {args.path} on http://{HOST}:{args.port}")
+    else:
+        server = ReplayServer(args.path, args.latency, args.call_latency, port=args.port)
+        print(f"Replaying {len(server.fixtures)} recorded calls on http://{HOST}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.command == "record":
+            print(f"Recorded {server.recorded} calls")
+
+
+if __name__ == '__main__':
+    main()
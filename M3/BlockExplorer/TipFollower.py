@@ -0,0 +1,228 @@
+"""
+Linus Eriksson
+Inlämning m3-uppgift-P1-explorer-python
+BBT200
+
+Follows the chain tip in the background and brings the explorer caches and
+the address index up to date one block at a time. New blocks are announced
+by a notifier, the node's waitfornewblock long poll by default or a ZMQ
+hashblock subscription. When the new tip does not build on the followed one
+the index and caches are rolled back to the fork point before the blocks of
+the new branch are processed. The followed tip is kept in memory.
+"""
+
+import queue
+import threading
+import time
+
+from RpcClient import get_client
+
+
+LONG_POLL_TIMEOUT = 10
+POLL_INTERVAL = 5
+RETRY_INTERVAL = 5
+FORK_WINDOW = 16
+FOLLOW_WORKERS = 4
+RPC_METHOD_NOT_FOUND = -32601
+
+
+class RpcNotifier:
+    # Long polls waitfornewblock, nodes that refuse it are polled with getbestblockhash
+
+    def __init__(self, client=None, timeout: float = LONG_POLL_TIMEOUT, poll_interval: float = POLL_INTERVAL):
+        self.client = client
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.long_poll = True
+
+    def wait(self, current_hash: str):
+        client = self.client or get_client()
+        if self.long_poll:
+            response = client.call("waitfornewblock", int(self.timeout * 1000))
+            error = response["error"]
+            if not error:
+                # The current tip is returned on a timeout as well, a block found just before the call shows up here
+                return response["result"]["hash"]
+            if error["code"] != RPC_METHOD_NOT_FOUND:
+                raise ValueError(f"Error waiting for a new block! Code: {error['code']} with message {error['message']}")
+            self.long_poll = False
+        time.sleep(self.poll_interval)
+        return client.call("getbestblockhash")["result"]
+
+
+class ZmqNotifier:
+    # Subscribes to the hashblock topic of the node (-zmqpubhashblock), needs pyzmq
+
+    def __init__(self, url: str, timeout: float = LONG_POLL_TIMEOUT):
+        try:
+            import zmq
+        except ImportError:
+            raise ValueError("ZMQ block notifications need pyzmq installed!")
+        self.socket = zmq.Context.instance().socket(zmq.SUB)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"hashblock")
+        self.socket.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
+        self.socket.connect(url)
+        self._again = zmq.Again
+
+    def wait(self, current_hash: str):
+        try:
+            _, body, _ = self.socket.recv_multipart()
+        except self._again:
+            return None
+        return body.hex()
+
+
+class LocalNotifier:
+    # Stand-in for the node notifications, blocks are announced with notify
+
+    def __init__(self, timeout: float = LONG_POLL_TIMEOUT):
+        self.timeout = timeout
+        self.hashes = queue.Queue()
+
+    def notify(self, blockhash: str):
+        self.hashes.put(blockhash)
+
+    def wait(self, current_hash: str):
+        try:
+            return self.hashes.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+
+
+class TipFollower:
+    def __init__(self, load_blocks, cache, address_index=None, notifier=None, client=None,
+                 workers: int = FOLLOW_WORKERS, on_block=None, on_reorg=None):
+        # load_blocks(start, end, workers) yields the loaded blocks of the active chain in order, like iter_blocks
+        self.load_blocks = load_blocks
+        self.cache = cache
+        self.address_index = address_index
+        self.notifier = notifier or RpcNotifier(client)
+        self.client = client
+        self.workers = workers
+        self.on_block = on_block
+        self.on_reorg = on_reorg
+        self.lock = threading.Lock()
+        self.blocks_processed = 0
+        self.reorgs = 0
+        self._thread = None
+        self._stop = threading.Event()
+        if address_index is not None:
+            self._height = address_index.indexed_height()
+            self._hash = address_index.get_blockhash(self._height) if self._height >= 0 else None
+        else:
+            self._height = -1 if cache.tip_height is None else cache.tip_height
+            self._hash = cache.tip_hash
+
+    @property
+    def tip(self):
+        # (height, hash) of the last processed block, -1 and None before the first one
+        return self._height, self._hash
+
+    def _client(self):
+        return self.client or get_client()
+
+    def _known_hash(self, height: int):
+        if self.address_index is not None:
+            return self.address_index.get_blockhash(height)
+        return self.cache.get_blockhash(height)
+
+    def _known_heights(self, height: int):
+        if self.address_index is not None:
+            return range(height, -1, -1)
+        return sorted((cached_height for cached_height, _ in self.cache.heights.items() if cached_height <= height),
+                      reverse=True)
+
+    def _fork_height(self, height: int):
+        # Highest processed height the node still agrees with, compared a window of heights per batch request
+        heights = iter(self._known_heights(height))
+        while True:
+            window = [known_height for _, known_height in zip(range(FORK_WINDOW), heights)]
+            if not window:
+                return -1
+            responses = self._client().batch([("getblockhash", [known_height]) for known_height in window])
+            for known_height, response in zip(window, responses):
+                if response["result"] is not None and response["result"] == self._known_hash(known_height):
+                    return known_height
+
+    def _rollback(self, height: int):
+        if self.address_index is not None:
+            self.address_index.rollback(height)
+        self.cache.invalidate_above(height)
+        self._height = height
+        self._hash = self._known_hash(height) if height >= 0 else None
+        self.reorgs += 1
+        if self.on_reorg is not None:
+            self.on_reorg(height)
+
+    def _new_blocks(self, start: int, end: int):
+        # Stops at a block that does not build on the followed tip, the chain changed while loading
+        for block in self.load_blocks(start, end, self.workers):
+            # Genesis is only checked by height, raw blocks give it an all zero parent and getblock none at all
+            if self._hash is not None and block.previousblockhash != self._hash:
+                return
+            yield block
+            self._height = block.blocknumber
+            self._hash = block.blockhash
+            self.cache.set_tip(self._height, self._hash)
+            self.blocks_processed += 1
+            if self.on_block is not None:
+                self.on_block(block)
+
+    def sync(self, best_hash: str = None, progress=None):
+        # Processes the blocks up to best_hash (the node's best block when left out), returns the number of them
+        with self.lock:
+            client = self._client()
+            if best_hash is None:
+                best_hash = client.call("getbestblockhash")["result"]
+            if best_hash == self._hash:
+                return 0
+            header = client.call("getblockheader", best_hash)["result"]
+            if header is None or header["confirmations"] < 0:
+                # Announced and already replaced, follow the current best block instead
+                best_hash = client.call("getbestblockhash")["result"]
+                header = client.call("getblockheader", best_hash)["result"]
+                if header is None:
+                    raise ValueError(f"Best block {best_hash} has no header!")
+            height = header["height"]
+            if header.get("previousblockhash") != self._hash or height != self._height + 1:
+                fork_height = self._fork_height(min(self._height, height))
+                if fork_height < self._height:
+                    self._rollback(fork_height)
+            processed = self.blocks_processed
+            blocks = self._new_blocks(self._height + 1, height)
+            if self.address_index is not None:
+                self.address_index.add_blocks(blocks, progress)
+            else:
+                for _ in blocks:
+                    if progress is not None:
+                        progress.next()
+            return self.blocks_processed - processed
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                while not self._stop.is_set():
+                    best_hash = self.notifier.wait(self._hash)
+                    if best_hash is not None and best_hash != self._hash:
+                        self.sync(best_hash)
+            except Exception as error:
+                # Whatever went wrong, the follower thread keeps going from the last processed block
+                print(f"Tip follower stopped on error: {error!r}, retrying in {RETRY_INTERVAL} s")
+                self._stop.wait(RETRY_INTERVAL)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="tip-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # A waiting long poll is not interrupted, the thread ends when it returns
+        self._stop.set()
+        self._thread = None
+
+    def __str__(self):
+        return f"Followed tip: {self._height} {self._hash}\n" \
+               f"Blocks processed: {self.blocks_processed}, reorganizations: {self.reorgs}"
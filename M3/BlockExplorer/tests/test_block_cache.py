@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from BlockCache import ExplorerCache, block_bytes, transaction_bytes
+from BlockExplorer import Block
+from test_block_explorer import _block, _transaction
+
+
+def _loaded_block(blockhash: str, height: int, confirmations: int):
+    transaction = _transaction(blockhash[:62] + "01", blockhash, "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH")
+    result = dict(_block(blockhash, height, [transaction]), confirmations=confirmations,
+                  previousblockhash="00" * 32)
+    result["tx"] = [transaction]
+    return Block(result, compact=True)
+
+
+class ExplorerCacheTest(unittest.TestCase):
+    def test_stale_block_does_not_map_its_height(self):
+        cache = ExplorerCache()
+        active = _loaded_block("11" * 32, 5, 1)
+        stale = _loaded_block("22" * 32, 5, -1)
+        cache.put_block(active)
+        cache.put_block(stale)
+        self.assertEqual(cache.get_blockhash(5), active.blockhash)
+        self.assertIs(cache.get_block(stale.blockhash), stale)
+        self.assertEqual(cache.get_block(stale.blockhash).confirmations, -1)
+
+    def test_confirmations_follow_the_tip(self):
+        cache = ExplorerCache()
+        block = _loaded_block("11" * 32, 5, 1)
+        cache.set_tip(5, block.blockhash)
+        cache.put_block(block)
+        transaction = block.transactions[0]
+        cache.put_transaction(transaction, block.blocknumber)
+        cache.set_tip(9, "33" * 32)
+        self.assertEqual(cache.get_block(block.blockhash).confirmations, 5)
+        self.assertEqual(cache.get_transaction(transaction.id).confirmations, 5)
+
+    def test_loading_a_cached_block_grows_its_size(self):
+        cache = ExplorerCache()
+        block = _loaded_block("11" * 32, 5, 1)
+        cache.put_block(block)
+        unloaded = cache.blocks.size
+        block.load_transactions()
+        cache.block_loaded(block)
+        self.assertEqual(cache.blocks.size, block_bytes(block))
+        self.assertEqual(cache.blocks.size - unloaded, transaction_bytes(block.transactions[0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import BlockExplorer
+import RpcClient
+from AddressIndex import AddressIndex
+
+
+def _transaction(txid: str, blockhash: str, address: str):
+    return {"txid": txid, "hash": txid, "version": 2, "size": 100, "vsize": 100, "weight": 400, "locktime": 0,
+            "hex": "00", "blockhash": blockhash, "confirmations": 1, "time": 0, "blocktime": 0,
+            "vin": [{"coinbase": "00", "sequence": 0}],
+            "vout": [{"value": 50.0, "n": 0, "scriptPubKey": {"asm": "", "hex": "00", "type": "pubkeyhash",
+                                                               "reqSigs": 1, "addresses": [address]}}]}
+
+
+def _block(blockhash: str, height: int, transactions: list):
+    return {"hash": blockhash, "height": height, "confirmations": 1, "strippedsize": 200, "size": 200,
+            "weight": 800, "version": 1, "versionHex": "00000001", "merkleroot": "00", "time": 0,
+            "mediantime": 0, "nonce": 0, "bits": "1d00ffff", "difficulty": 1, "chainwork": "00",
+            "nTx": len(transactions), "tx": [transaction["txid"] for transaction in transactions]}
+
+
+class FakeClient:
+    # Answers getblockhash, getblock and getrawtransaction from memory, refusing the transactions in refused
+    def __init__(self, blocks, transactions, refused=()):
+        self.blocks = blocks
+        self.transactions = transactions
+        self.refused = set(refused)
+        self.calls = []
+
+    def call(self, method: str, *params):
+        self.calls.append((method, list(params)))
+        if method == "getblockhash":
+            for block in self.blocks.values():
+                if block["height"] == params[0]:
+                    return {"result": block["hash"], "error": None, "id": 0}
+            return {"result": None, "error": {"code": -8, "message": "Block height out of range"}, "id": 0}
+        if method == "getblock":
+            block = self.blocks.get(params[0])
+            if block is None:
+                return {"result": None, "error": {"code": -5, "message": "Block not found"}, "id": 0}
+            result = dict(block)
+            if len(params) > 1 and params[1] == 2:
+                result["tx"] = [dict(self.transactions[txid]) for txid in block["tx"]]
+            return {"result": result, "error": None, "id": 0}
+        if method == "getrawtransaction":
+            if params[0] in self.refused or params[0] not in self.transactions:
+                return {"result": None, "error": {"code": -5, "message": "No such mempool or blockchain transaction"},
+                        "id": 0}
+            return {"result": dict(self.transactions[params[0]]), "error": None, "id": 0}
+        return {"result": None, "error": {"code": -32601, "message": "Method not found"}, "id": 0}
+
+    def batch(self, calls, chunk_size: int = RpcClient.BATCH_SIZE):
+        return [self.call(method, *params) for method, params in calls]
+
+
+class ExplorerTestCase(unittest.TestCase):
+    def setUp(self):
+        # The genesis block, its coinbase is refused by getrawtransaction like bitcoind does
+        self.coinbase = _transaction("aa" * 32, "00" * 32, "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa")
+        self.other = _transaction("bb" * 32, "00" * 32, "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH")
+        transactions = {self.coinbase["txid"]: self.coinbase, self.other["txid"]: self.other}
+        self.block = _block("00" * 32, 0, [self.coinbase, self.other])
+        self.client = FakeClient({self.block["hash"]: self.block}, transactions, refused=[self.coinbase["txid"]])
+        RpcClient.set_client(self.client)
+        BlockExplorer._explorer_cache.blocks.clear()
+        BlockExplorer._explorer_cache.transactions.clear()
+        BlockExplorer._explorer_cache.heights.clear()
+
+    def tearDown(self):
+        RpcClient.set_client(None)
+
+
+class BatchedTransactionsTest(ExplorerTestCase):
+    def test_failed_item_raises_with_its_txid(self):
+        with self.assertRaises(ValueError) as raised:
+            BlockExplorer._get_transactions([self.other["txid"], self.coinbase["txid"]])
+        self.assertIn(self.coinbase["txid"], str(raised.exception))
+
+    def test_block_falls_back_to_getblock_with_transactions(self):
+        block = BlockExplorer.Block(self.client.call("getblock", self.block["hash"])["result"])
+        block.load_transactions()
+        self.assertEqual([transaction.id for transaction in block.transactions], self.block["tx"])
+        self.assertTrue(block.has_address("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa"))
+        self.assertIn(("getblock", [self.block["hash"], 2]), self.client.calls)
+
+
+class GenesisTest(ExplorerTestCase):
+    def test_loaded_block_comes_from_one_getblock(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            block = BlockExplorer._get_loaded_blockobject_by_hash(self.block["hash"], 0)
+        self.assertEqual(output.getvalue(), "")
+        self.assertIsNone(block.previousblockhash)
+        self.assertEqual(len(block.transactions), 2)
+        self.assertEqual([method for method, _ in self.client.calls], ["getblock"])
+
+    def test_index_from_height_zero(self):
+        with tempfile.TemporaryDirectory() as directory:
+            address_index = AddressIndex(os.path.join(directory, "index.db"))
+            address_index.add_blocks(BlockExplorer.iter_blocks(0, 0, 1))
+            self.assertEqual(address_index.indexed_height(), 0)
+            self.assertEqual(address_index.lookup("1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa"),
+                             [(0, self.coinbase["txid"], 0, 5000000000)])
+            address_index.close()
+
+    def test_index_answers_lookups_while_blocks_are_fetched(self):
+        with tempfile.TemporaryDirectory() as directory:
+            address_index = AddressIndex(os.path.join(directory, "index.db"))
+            answered = []
+
+            def blocks():
+                # A lookup from another thread while the sync waits for the node
+                reader = threading.Thread(target=lambda: answered.append(address_index.indexed_height()))
+                reader.start()
+                reader.join(5)
+                yield from BlockExplorer.iter_blocks(0, 0, 1)
+
+            address_index.add_blocks(blocks())
+            self.assertEqual(answered, [-1])
+            self.assertEqual(address_index.indexed_height(), 0)
+            address_index.close()
+
+
+class IterBlocksTest(ExplorerTestCase):
+    def test_heights_above_the_tip_are_skipped(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            blocks = list(BlockExplorer.iter_blocks(2, 0, 2))
+        self.assertEqual([block.blocknumber for block in blocks], [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
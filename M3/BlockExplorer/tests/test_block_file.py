@@ -0,0 +1,103 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from BlockFile import MAGIC, BlockFileReader
+from RawBlock import NETWORKS, classify_script, double_sha256
+
+
+REGTEST_BITS = 0x207fffff
+XOR_KEY = bytes.fromhex("0123456789abcdef")
+
+
+def _p2pkh(number: int):
+    return b"\x76\xa9\x14" + bytes([number]) * 20 + b"\x88\xac"
+
+
+def _coinbase(height: int, script_pub_key: bytes, tag: int = 0):
+    # One input spending nothing with the height pushed like BIP34, one output
+    script = bytes([0x51 + height - 1]) if 1 <= height <= 16 else b"\x01" + bytes([height])
+    script += bytes([tag])
+    return struct.pack("<i", 2) + b"\x01" + b"\x00" * 32 + b"\xff" * 4 + bytes([len(script)]) + script + \
+        b"\xff" * 4 + b"\x01" + struct.pack("<q", 5000000000) + bytes([len(script_pub_key)]) + script_pub_key + \
+        b"\x00" * 4
+
+
+def _block(previous: bytes, height: int, script_pub_key: bytes, tag: int = 0):
+    # Returns (raw block, internal byte order hash)
+    transaction = _coinbase(height, script_pub_key, tag)
+    header = struct.pack("<i", 0x20000000) + previous + double_sha256(transaction) + \
+        struct.pack("<III", 1600000000 + height * 600, REGTEST_BITS, height)
+    return header + b"\x01" + transaction, double_sha256(header)
+
+
+def _write_file(path: str, blocks, xor_key: bytes = None):
+    data = b"".join(MAGIC["regtest"] + struct.pack("<I", len(block)) + block for block in blocks)
+    # Files are preallocated, the unused tail is zero
+    data += b"\x00" * 64
+    if xor_key is not None:
+        data = bytes(byte ^ xor_key[offset % len(xor_key)] for offset, byte in enumerate(data))
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+class BlockFileReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        previous = b"\x00" * 32
+        self.chain = []
+        for height in range(5):
+            raw, blockhash = _block(previous, height, _p2pkh(1))
+            self.chain.append((raw, blockhash))
+            previous = blockhash
+        # A stale block at height 2, one block of work less than the active branch
+        self.stale, self.stale_hash = _block(self.chain[1][1], 2, _p2pkh(2), tag=1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, xor_key: bytes = None):
+        raw = [block for block, _ in self.chain]
+        # Stored out of chain order and split over two files like a node downloading in parallel
+        _write_file(os.path.join(self.directory.name, "blk00000.dat"), [raw[3], self.stale, raw[0]], xor_key)
+        _write_file(os.path.join(self.directory.name, "blk00001.dat"), [raw[4], raw[1], raw[2]], xor_key)
+        if xor_key is not None:
+            with open(os.path.join(self.directory.name, "xor.dat"), "wb") as file:
+                file.write(xor_key)
+
+    def _check_reader(self):
+        reader = BlockFileReader(self.directory.name, "regtest")
+        try:
+            self.assertEqual(reader.scan(), 6)
+            self.assertEqual(reader.best_chain(), [blockhash[::-1].hex() for _, blockhash in self.chain])
+            blocks = list(reader.iter_blocks())
+            self.assertEqual([block.blocknumber for block in blocks], [0, 1, 2, 3, 4])
+            self.assertEqual([block.confirmations for block in blocks], [5, 4, 3, 2, 1])
+            self.assertEqual(blocks[1].nextblockhash, blocks[2].blockhash)
+            _, active_address = classify_script(_p2pkh(1), "regtest")
+            _, stale_address = classify_script(_p2pkh(2), "regtest")
+            self.assertTrue(all(block.has_address(active_address) for block in blocks))
+            self.assertFalse(any(block.has_address(stale_address) for block in blocks))
+        finally:
+            reader.close()
+
+    def test_out_of_order_files_with_a_stale_block(self):
+        self._write()
+        self._check_reader()
+
+    def test_every_chain_has_address_prefixes(self):
+        self.assertLessEqual(set(MAGIC), set(NETWORKS))
+
+    def test_xor_obfuscated_files(self):
+        self._write(XOR_KEY)
+        with open(os.path.join(self.directory.name, "blk00000.dat"), "rb") as file:
+            self.assertNotEqual(file.read(4), MAGIC["regtest"])
+        self._check_reader()
+
+
+if __name__ == '__main__':
+    unittest.main()
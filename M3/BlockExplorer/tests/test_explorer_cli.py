@@ -0,0 +1,61 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import BlockExplorer
+import ExplorerCli
+import RpcClient
+from test_block_explorer import ExplorerTestCase, FakeClient
+
+
+class FailingClient(FakeClient):
+    # Loses the connection on getblockhash
+    def call(self, method: str, *params):
+        if method == "getblockhash":
+            raise ConnectionError("Node is down")
+        return super().call(method, *params)
+
+
+class BatchTest(ExplorerTestCase):
+    def setUp(self):
+        super().setUp()
+        BlockExplorer._explorer_cache.set_tip(0, self.block["hash"])
+        self.parser = ExplorerCli._build_parser()
+
+    def tearDown(self):
+        BlockExplorer._explorer_cache.set_tip(None, None)
+        super().tearDown()
+
+    def _run(self, lines):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ExplorerCli._run_batch(self.parser, 1, lines, output)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_genesis_block(self):
+        records = self._run(["block --height 0"])
+        self.assertEqual(records[0]["height"], 0)
+        self.assertIsNone(records[0]["previousblockhash"])
+
+    def test_invalid_ranges_become_error_records(self):
+        address = "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa"
+        records = self._run([f"address {address} --from 9 --to 4", f"address {address} --from 0 --to 4",
+                             f"address {address} --from 0"])
+        self.assertIn("error", records[0])
+        self.assertIn("error", records[1])
+        self.assertEqual([record["txid"] for record in records[2:]], [self.coinbase["txid"]])
+
+    def test_node_failure_ends_only_its_query(self):
+        RpcClient.set_client(FailingClient(self.client.blocks, self.client.transactions))
+        records = self._run(["block --height 0", f"tx --id {self.other['txid']}"])
+        self.assertIn("Node is down", records[0]["error"])
+        self.assertEqual(records[1]["txid"], self.other["txid"])
+
+
+if __name__ == '__main__':
+    unittest.main()
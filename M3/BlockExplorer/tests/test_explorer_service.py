@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import BlockExplorer
+from ExplorerService import ExplorerService, HttpError
+from test_block_explorer import ExplorerTestCase
+
+
+class RouteTest(ExplorerTestCase):
+    def setUp(self):
+        super().setUp()
+        BlockExplorer._explorer_cache.set_tip(0, self.block["hash"])
+        self.service = ExplorerService(rpc_workers=1)
+
+    def tearDown(self):
+        self.service.executor.shutdown()
+        BlockExplorer._explorer_cache.set_tip(None, None)
+        super().tearDown()
+
+    def _status(self, target: str):
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(self.service.route(target))
+        except HttpError as error:
+            return error.status
+        return 200
+
+    def test_unknown_objects_are_not_found(self):
+        self.assertEqual(self._status("/block/0"), 200)
+        self.assertEqual(self._status("/block/1"), 404)
+        self.assertEqual(self._status("/block/" + "11" * 32), 404)
+        self.assertEqual(self._status("/tx/" + "11" * 32), 404)
+
+    def test_bad_address_ranges(self):
+        address = "/address/1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa"
+        self.assertEqual(self._status(address + "?from=4&to=0"), 400)
+        self.assertEqual(self._status(address + "?from=0&to=4"), 400)
+        self.assertEqual(self._status(address + "?from=x"), 400)
+
+    def test_address_scan_stays_on_the_worker_thread(self):
+        threads = set()
+        call = self.client.call
+
+        def recording_call(method: str, *params):
+            threads.add(threading.get_ident())
+            return call(method, *params)
+
+        self.client.call = recording_call
+        body = asyncio.run(self.service.route("/address/1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa?from=0"))
+        self.assertEqual([output["txid"] for output in json.loads(body)["outputs"]], [self.coinbase["txid"]])
+        self.assertEqual(len(threads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from MempoolTracker import MempoolTracker
+
+# The signed P2SH-P2WPKH example of BIP143, both outputs pay to P2PKH addresses
+RAW_HEX = "01000000000101db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a547701000000171600" \
+          "1479091972186c449eb1ded22b78e40d009bdf0089feffffff02b8b4eb0b000000001976a914a457b684d7f0d539" \
+          "a46a45bbc043f35b59d0d96388ac0008af2f000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c" \
+          "88ac02473044022047ac8e878352d3ebbde1c94ce3a10d057c24175747116f8288e5d794d12d482f0220217f36a4" \
+          "85cae903c713331d877c1f64677e3622ad4010726870540656fe9dcb012103ad1d8e89212f0b92c74d23bb710c00" \
+          "662ad1470198ac48c43f7d6f93a2a2687392040000"
+ADDRESS = "1Fyxts6r24DpEieygQiNnWxUdb18ANa5p7"
+NOT_FOUND = {"code": -5, "message": "Transaction not in mempool"}
+
+
+class MempoolClient:
+    # A mempool of txid -> (fee in sats, vsize, parents). Txids in vanished are listed but their entries refused
+    def __init__(self):
+        self.mempool = {}
+        self.vanished = set()
+        self.fetched = []
+
+    def add(self, txid: str, fee: int, vsize: int, *parents):
+        self.mempool[txid] = (fee, vsize, list(parents))
+
+    def call(self, method: str, *params):
+        if method == "getrawmempool":
+            return {"result": list(self.mempool), "error": None, "id": 0}
+        txid = params[0]
+        if txid not in self.mempool or txid in self.vanished:
+            return {"result": None, "error": NOT_FOUND, "id": 0}
+        if method == "getmempoolentry":
+            self.fetched.append(txid)
+            fee, vsize, parents = self.mempool[txid]
+            return {"result": {"vsize": vsize, "fees": {"base": fee / 100000000}, "time": 0, "depends": parents},
+                    "error": None, "id": 0}
+        return {"result": RAW_HEX, "error": None, "id": 0}
+
+    def batch(self, calls, chunk_size: int = 100):
+        return [self.call(method, *params) for method, params in calls]
+
+
+class MempoolTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.client = MempoolClient()
+        self.tracker = MempoolTracker(self.client)
+
+    def test_sync_fetches_only_the_difference(self):
+        self.client.add("a", 1000, 100)
+        self.client.add("b", 2000, 100)
+        diff = self.tracker.sync()
+        self.assertEqual(sorted(diff.added), ["a", "b"])
+        self.assertEqual(diff.removed, [])
+        del self.client.mempool["a"]
+        self.client.add("c", 3000, 200)
+        self.client.fetched.clear()
+        diff = self.tracker.sync()
+        self.assertEqual((diff.added, diff.removed), (["c"], ["a"]))
+        self.assertEqual(self.client.fetched, ["c"])
+        self.assertEqual(sorted(self.tracker.entries), ["b", "c"])
+        self.assertEqual((self.tracker.total_fee, self.tracker.total_vsize), (5000, 300))
+        self.assertEqual(self.tracker.histogram(), [(20, 1, 100), (15, 1, 200)])
+
+    def test_vanished_entries_are_skipped(self):
+        self.client.add("a", 1000, 100)
+        self.client.add("b", 1000, 100)
+        self.client.vanished.add("b")
+        self.assertEqual(self.tracker.sync().added, ["a"])
+        self.assertEqual(list(self.tracker.entries), ["a"])
+
+    def test_ancestor_packages(self):
+        # The child is listed before its parents
+        self.client.add("c", 6000, 100, "b")
+        self.client.add("b", 1000, 100, "a")
+        self.client.add("a", 2000, 200)
+        self.tracker.sync()
+        child = self.tracker.get("c")
+        self.assertEqual(child.ancestors, {"a", "b"})
+        self.assertEqual((child.ancestor_fee, child.ancestor_vsize), (9000, 400))
+        self.assertEqual(sorted(entry.txid for entry in self.tracker.package("c")), ["a", "b", "c"])
+        self.assertEqual(self.tracker.descendants("a"), {"b", "c"})
+        # Mining the first parent shrinks the packages of its descendants
+        del self.client.mempool["a"]
+        self.tracker.sync()
+        self.assertEqual(child.ancestors, {"b"})
+        self.assertEqual(child.package_fee_rate, 35)
+        self.assertEqual(self.tracker.get("b").ancestors, frozenset())
+
+    def test_watched_addresses(self):
+        self.client.add("a", 1000, 100)
+        self.assertEqual(self.tracker.watch(ADDRESS), [])
+        diff = self.tracker.sync()
+        self.assertEqual(diff.watched, {ADDRESS: ["a"]})
+        self.assertEqual([entry.txid for entry in self.tracker.transactions_for(ADDRESS)], ["a"])
+        del self.client.mempool["a"]
+        self.tracker.sync()
+        self.assertEqual(self.tracker.transactions_for(ADDRESS), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
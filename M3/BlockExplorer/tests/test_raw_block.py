@@ -0,0 +1,32 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from RawBlock import _coinbase_height
+
+
+GENESIS_COINBASE = "04ffff001d0104455468652054696d65732030332f4a616e2f32303039204368616e63656c6c6f72206f6e206272696e" \
+                   "6b206f66207365636f6e64206261696c6f757420666f722062616e6b73"
+
+
+class CoinbaseHeightTest(unittest.TestCase):
+    def test_bip34_heights(self):
+        self.assertEqual(_coinbase_height("03a0bb0d" + "0100", 0x20000000), 900000)
+        self.assertEqual(_coinbase_height("028000", 2), 128)
+        self.assertEqual(_coinbase_height("51", 2), 1)
+
+    def test_pre_bip34_blocks_have_no_height(self):
+        self.assertIsNone(_coinbase_height(GENESIS_COINBASE, 1))
+
+    def test_pushes_that_are_not_heights(self):
+        # Non-minimal, negative and oversized pushes
+        self.assertIsNone(_coinbase_height("03050000", 2))
+        self.assertIsNone(_coinbase_height("0180", 2))
+        self.assertIsNone(_coinbase_height("0900000000000000000001", 2))
+        self.assertIsNone(_coinbase_height("", 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
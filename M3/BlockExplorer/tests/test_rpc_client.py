@@ -0,0 +1,35 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from RpcClient import RpcClient
+
+
+class AnsweringClient(RpcClient):
+    # Answers every request with the given object instead of asking a node
+    def __init__(self, answer):
+        super().__init__()
+        self.answer = answer
+
+    def _post(self, payload):
+        if self.answer is None:
+            return [{"result": call["params"][0], "error": None, "id": call["id"]} for call in reversed(payload)]
+        return self.answer
+
+
+class BatchTest(unittest.TestCase):
+    def test_responses_follow_the_call_order(self):
+        responses = AnsweringClient(None).batch([("echo", [1]), ("echo", [2]), ("echo", [3])], chunk_size=2)
+        self.assertEqual([response["result"] for response in responses], [1, 2, 3])
+
+    def test_error_object_for_the_whole_batch_raises(self):
+        error = {"code": -32700, "message": "Parse error"}
+        with self.assertRaises(ValueError) as raised:
+            AnsweringClient({"result": None, "error": error, "id": None}).batch([("echo", [1])])
+        self.assertIn("Parse error", str(raised.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
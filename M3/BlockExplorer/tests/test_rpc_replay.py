@@ -0,0 +1,88 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+
+from RpcReplay import RecordingProxy, ReplayServer, _JsonHandler, serve_in_background
+
+
+class _NodeHandler(_JsonHandler):
+    # Like bitcoind: a failed single call is a 500 with a JSON error, a wrong password a 401 without a body
+    def do_POST(self):
+        body = self._read_json()
+        if self.headers.get("Authorization") != "Basic good":
+            self._send(b"", 401)
+        elif isinstance(body, list):
+            self._send(json.dumps([{"result": request["params"][0], "error": None, "id": request["id"]}
+                                   for request in body]).encode())
+        elif body["method"] == "fail":
+            self._send(json.dumps({"result": None, "error": {"code": -1, "message": "failed"},
+                                   "id": body["id"]}).encode(), 500)
+        else:
+            self._send(json.dumps({"result": body["params"][0], "error": None, "id": body["id"]}).encode())
+
+
+def _post(url: str, payload, password: str = "good"):
+    return requests.post(url, json=payload, headers={"Authorization": f"Basic {password}"})
+
+
+class RecordReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "fixtures.jsonl")
+        self.node = ThreadingHTTPServer(("127.0.0.1", 0), _NodeHandler)
+        node_url = serve_in_background(self.node)
+        self.proxy = RecordingProxy(self.path, node_url, port=0)
+        self.proxy_url = serve_in_background(self.proxy)
+
+    def tearDown(self):
+        for server in (self.node, self.proxy):
+            server.shutdown()
+            server.server_close()
+        self.directory.cleanup()
+
+    def _replay(self):
+        self.proxy.shutdown()
+        replay = ReplayServer(self.path, port=0)
+        self.addCleanup(replay.server_close)
+        self.addCleanup(replay.shutdown)
+        return replay, serve_in_background(replay)
+
+    def test_every_status_is_recorded_and_replayed(self):
+        payloads = [({"method": "echo", "params": [1], "id": 1}, "good"),
+                    ({"method": "fail", "params": [], "id": 2}, "good"),
+                    ({"method": "echo", "params": [2], "id": 3}, "bad"),
+                    ([{"method": "echo", "params": [3], "id": 4}, {"method": "echo", "params": [4], "id": 5}], "good")]
+        recorded = [_post(self.proxy_url, payload, password) for payload, password in payloads]
+        self.assertEqual([response.status_code for response in recorded], [200, 500, 401, 200])
+        self.assertEqual(self.proxy.recorded, 5)
+        replay, url = self._replay()
+        replayed = [_post(url, payload) for payload, _ in payloads]
+        self.assertEqual([response.status_code for response in replayed], [200, 500, 401, 200])
+        self.assertEqual([response.content for response in replayed], [response.content for response in recorded])
+        self.assertEqual(replay.stats()["misses"], {})
+
+    def test_calls_without_a_recording_fail(self):
+        _post(self.proxy_url, {"method": "echo", "params": [1], "id": 1})
+        replay, url = self._replay()
+        with contextlib.redirect_stderr(io.StringIO()):
+            single = _post(url, {"method": "echo", "params": [2], "id": 2})
+            batch = _post(url, [{"method": "echo", "params": [1], "id": 3}, {"method": "echo", "params": [3], "id": 4}])
+        self.assertEqual(single.status_code, 500)
+        self.assertIsNone(single.json()["result"])
+        self.assertIsNotNone(single.json()["error"])
+        self.assertEqual([response["result"] for response in batch.json()], [1, None])
+        self.assertIsNotNone(batch.json()[1]["error"])
+        self.assertEqual(replay.stats()["misses"], {"echo": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
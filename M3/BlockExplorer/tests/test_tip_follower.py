@@ -0,0 +1,129 @@
+import os
+import sys
+import contextlib
+import io
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import BlockExplorer
+import RpcClient
+import TipFollower as TipFollowerModule
+from AddressIndex import AddressIndex
+from TipFollower import LocalNotifier, TipFollower
+from test_block_explorer import FakeClient, _block, _transaction
+
+
+class ChainClient(FakeClient):
+    # Knows blocks of several branches, active lists the hashes of the current best chain by height
+    def __init__(self):
+        super().__init__({}, {})
+        self.active = []
+        # Raised by the next getbestblockhash calls
+        self.failures = []
+
+    def add_block(self, blockhash: str, previous: str, height: int, address: str):
+        transaction = _transaction(blockhash[:62] + "01", blockhash, address)
+        self.transactions[transaction["txid"]] = transaction
+        self.blocks[blockhash] = dict(_block(blockhash, height, [transaction]), previousblockhash=previous)
+
+    def call(self, method: str, *params):
+        if method == "getblockhash":
+            self.calls.append((method, list(params)))
+            if 0 <= params[0] < len(self.active):
+                return {"result": self.active[params[0]], "error": None, "id": 0}
+            return {"result": None, "error": {"code": -8, "message": "Block height out of range"}, "id": 0}
+        if method == "getbestblockhash":
+            if self.failures:
+                raise self.failures.pop(0)
+            return {"result": self.active[-1], "error": None, "id": 0}
+        if method == "getblockheader":
+            if params[0] not in self.blocks:
+                return {"result": None, "error": {"code": -5, "message": "Block not found"}, "id": 0}
+            block = self.blocks[params[0]]
+            active = block["height"] < len(self.active) and self.active[block["height"]] == params[0]
+            header = {key: value for key, value in block.items() if key != "tx"}
+            header["confirmations"] = len(self.active) - block["height"] if active else -1
+            return {"result": header, "error": None, "id": 0}
+        return super().call(method, *params)
+
+
+class ReorgTest(unittest.TestCase):
+    def setUp(self):
+        self.client = ChainClient()
+        self.client.add_block("00" * 32, None, 0, "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa")
+        self.client.add_block("a1" * 32, "00" * 32, 1, "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH")
+        self.client.add_block("a2" * 32, "a1" * 32, 2, "1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH")
+        self.client.active = ["00" * 32, "a1" * 32, "a2" * 32]
+        RpcClient.set_client(self.client)
+        BlockExplorer._explorer_cache.blocks.clear()
+        BlockExplorer._explorer_cache.transactions.clear()
+        BlockExplorer._explorer_cache.heights.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = AddressIndex(os.path.join(self.directory.name, "index.db"))
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+        BlockExplorer._explorer_cache.set_tip(None, None)
+        RpcClient.set_client(None)
+
+    def _wait_for(self, follower: TipFollower, blockhash: str):
+        deadline = time.monotonic() + 5
+        while follower.tip[1] != blockhash and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(follower.tip[1], blockhash)
+
+    def test_reorg_rolls_back_the_index(self):
+        notifier = LocalNotifier(timeout=0.05)
+        follower = TipFollower(BlockExplorer.iter_blocks, BlockExplorer._explorer_cache, self.index, notifier, workers=1)
+        follower.start()
+        thread = follower._thread
+        try:
+            self._wait_for(follower, "a2" * 32)
+            # A longer branch from block 1 replaces block 2
+            self.client.add_block("b2" * 32, "a1" * 32, 2, "1CounterpartyXXXXXXXXXXXXXXXUWLpVr")
+            self.client.add_block("b3" * 32, "b2" * 32, 3, "1CounterpartyXXXXXXXXXXXXXXXUWLpVr")
+            self.client.active = ["00" * 32, "a1" * 32, "b2" * 32, "b3" * 32]
+            notifier.notify("b3" * 32)
+            self._wait_for(follower, "b3" * 32)
+        finally:
+            follower.stop()
+            thread.join()
+        self.assertEqual(follower.reorgs, 1)
+        self.assertEqual(self.index.indexed_height(), 3)
+        self.assertEqual([self.index.get_blockhash(height) for height in range(4)], self.client.active)
+        self.assertEqual([height for height, _, _, _ in self.index.lookup("1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH")], [1])
+        self.assertEqual([height for height, _, _, _ in self.index.lookup("1CounterpartyXXXXXXXXXXXXXXXUWLpVr")],
+                         [3, 2])
+        self.assertEqual(BlockExplorer._explorer_cache.get_blockhash(2), "b2" * 32)
+
+    def test_unexpected_errors_do_not_end_the_thread(self):
+        self.client.failures = [KeyError("result"), TypeError("'NoneType' object is not subscriptable")]
+        follower = TipFollower(BlockExplorer.iter_blocks, BlockExplorer._explorer_cache, self.index,
+                               LocalNotifier(timeout=0.05), workers=1)
+        with mock.patch.object(TipFollowerModule, "RETRY_INTERVAL", 0.01), \
+                contextlib.redirect_stdout(io.StringIO()) as output:
+            follower.start()
+            thread = follower._thread
+            try:
+                self._wait_for(follower, "a2" * 32)
+            finally:
+                follower.stop()
+                thread.join()
+        self.assertEqual(output.getvalue().count("Tip follower stopped on error"), 2)
+        self.assertEqual(self.index.indexed_height(), 2)
+
+    def test_unknown_best_block(self):
+        follower = TipFollower(BlockExplorer.iter_blocks, BlockExplorer._explorer_cache, self.index,
+                               LocalNotifier(), workers=1)
+        self.client.active = ["00" * 32, "a1" * 32, "c2" * 32]
+        with self.assertRaises(ValueError):
+            follower.sync("c2" * 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Bulk key generation, derives all address forms for many private keys on a process pool
+and streams them to a CSV or JSONL file.
+
+    python BatchKeys.py --count 10000 --output keys.jsonl
+    python BatchKeys.py --keys-file private_keys.txt --key-format hex --output keys.csv --format csv
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import secrets
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pycoin.ecdsa.secp256k1 import _r
+from pycoin.contrib import segwit_addr
+
+from PrivateKey import CoinKey, ElipsisPoint
+from Secp256k1 import multiply_generator_batch
+
+CHUNK_SIZE = 512
+FIELDS = ["private_key", "public_key", "uncompressed_public_key", "p2pkh_compressed", "p2pkh_uncompressed",
+          "p2sh_p2wpkh", "p2wpkh", "wif_compressed", "wif_uncompressed"]
+
+
+def derive_key_record(private_key: int, public_key_point=None):
+    point = ElipsisPoint(*(public_key_point or multiply_generator_batch([private_key])[0]))
+    compressed = point.get_compressed_bytes()
+    uncompressed = point.get_uncompressed_bytes()
+    com_hash160 = CoinKey._hash160(compressed)
+    uncom_hash160 = CoinKey._hash160(uncompressed)
+    private_bytes = private_key.to_bytes(32, "big")
+    return {
+        "private_key": private_bytes.hex(),
+        "public_key": compressed.hex(),
+        "uncompressed_public_key": uncompressed.hex(),
+        "p2pkh_compressed": CoinKey._create_base58_with_checksum(b"\x00" + com_hash160),
+        "p2pkh_uncompressed": CoinKey._create_base58_with_checksum(b"\x00" + uncom_hash160),
+        "p2sh_p2wpkh": CoinKey._create_base58_with_checksum(b"\x05" + CoinKey._hash160(b"\x00\x14" + com_hash160)),
+        "p2wpkh": segwit_addr.encode("bc", 0, com_hash160),
+        "wif_compressed": CoinKey._create_base58_with_checksum(b"\x80" + private_bytes + b"\x01"),
+        "wif_uncompressed": CoinKey._create_base58_with_checksum(b"\x80" + private_bytes)
+    }
+
+
+def _derive_chunk(private_keys):
+    points = multiply_generator_batch(private_keys)
+    return [derive_key_record(private_key, point) for private_key, point in zip(private_keys, points)]
+
+
+def generate_private_keys(count: int):
+    cryptsafe_gen = secrets.SystemRandom()
+    for _ in range(count):
+        yield cryptsafe_gen.randrange(1, _r)
+
+
+def derive_keys(private_keys, workers: int = None, chunk_size: int = CHUNK_SIZE):
+    # Yields one record per private key in input order, with at most 2 * workers chunks in flight
+    private_keys = iter(private_keys)
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        def submit_next():
+            chunk = list(itertools.islice(private_keys, chunk_size))
+            for private_key in chunk:
+                if not 0 < private_key < _r:
+                    raise ValueError(f"Private key {private_key} outside of range [1, {_r})!")
+            if chunk:
+                pending.append(executor.submit(_derive_chunk, chunk))
+
+        for _ in range(2 * workers):
+            submit_next()
+        while pending:
+            records = pending.popleft().result()
+            submit_next()
+            yield from records
+
+
+def write_records(records, file, output_format: str = "jsonl"):
+    count = 0
+    if output_format == "csv":
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+KEY_FORMATS = {"hex": 16, "int": 10}
+
+
+def read_private_keys(path: str, key_format: str):
+    # One key per line in the given format, hex keys may start with 0x. A key can be valid in both formats,
+    # so the format is never guessed from the digits.
+    base = KEY_FORMATS[key_format]
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield int(line, base)
+            except ValueError:
+                raise ValueError(f"Line {number} of {path} is not a {key_format} private key!")
+
+
+def create_keys(path: str, count: int = None, private_keys=None, output_format: str = "jsonl",
+                workers: int = None):
+    if private_keys is None:
+        private_keys = generate_private_keys(count)
+    with open(path, "w", newline="") as file:
+        return write_records(derive_keys(private_keys, workers), file, output_format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate keys and addresses in bulk")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--count", type=int, help="Number of new random keys")
+    source.add_argument("--keys-file", help="File with one private key per line")
+    parser.add_argument("--key-format", choices=sorted(KEY_FORMATS), help="Format of the keys in --keys-file")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if args.keys_file and args.key_format is None:
+        parser.error("--keys-file needs --key-format hex or int")
+
+    private_keys = read_private_keys(args.keys_file, args.key_format) if args.keys_file else None
+    try:
+        written = create_keys(args.output, args.count, private_keys, args.format, args.workers)
+    except ValueError as error:
+        print(error)
+        return
+    print(f"Wrote {written} keys to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Batch payouts, pays every address,amount row of a CSV file with as few
+transactions and RPC round trips as possible. Payouts are packed into
+multi-input, multi-output transactions up to a size limit. With private keys
+the transactions are signed locally and only one sendrawtransaction batch goes
+to the node, otherwise create, sign and send are one batch request each.
+
+    python BatchPayout.py payouts.csv --change <address> [--keys keys.txt] [--dry-run]
+    python BatchPayout.py payouts.csv --change <address> --utxos utxos.csv --keys keys.txt
+"""
+
+import argparse
+import csv
+
+# Instrumentation and the RPC client are shared with the block explorer
+import ExplorerPath
+
+from CoinSelection import DUST_LIMIT, TRANSACTION_OVERHEAD_VSIZE, Utxo, fetch_utxos, format_amount, \
+    get_fee_estimator, output_vsize, to_sats
+from Instrumentation import timed
+from LocalTransaction import LocalTransaction, TxInput, TxOutput, sign_transactions
+from RpcClient import get_client
+
+# Largest standard transaction is 400000 weight units
+MAX_VSIZE = 100000
+
+
+class PlannedTransaction:
+    def __init__(self):
+        self.inputs = []
+        self.outputs = {}
+        self.change = 0
+        self.fee = 0
+        self.vsize = TRANSACTION_OVERHEAD_VSIZE
+
+    @property
+    def input_sats(self):
+        return sum(utxo.sats for utxo in self.inputs)
+
+    @property
+    def output_sats(self):
+        return sum(self.outputs.values())
+
+    def __str__(self):
+        return f"{len(self.inputs)} inputs, {len(self.outputs)} payouts, " \
+               f"paying {format_amount(self.output_sats)} BTE, change {format_amount(self.change)} BTE, " \
+               f"fee {self.fee} sats, {self.vsize} vbytes"
+
+
+def read_payouts(path: str):
+    # Rows of address,amount, a header row is skipped
+    payouts = []
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            if not row or not row[0].strip() or row[0].strip().lower() == "address":
+                continue
+            sats = to_sats(row[1].strip())
+            if sats < DUST_LIMIT:
+                raise ValueError(f"Payout of {row[1].strip()} to {row[0].strip()} is below the dust limit!")
+            payouts.append((row[0].strip(), sats))
+    return payouts
+
+
+def read_utxos(path: str):
+    # Rows of txid,vout,amount,scriptPubKey, a header row is skipped
+    utxos = []
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            if not row or row[0].strip().lower() == "txid":
+                continue
+            utxos.append(Utxo(row[0].strip(), int(row[1]), to_sats(row[2].strip()), row[3].strip()))
+    return utxos
+
+
+def read_keys(path: str):
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def _response_result(response, action: str):
+    error = response["error"]
+    if error:
+        print(f"Error {action}! Code: {error['code']} with message {error['message']}")
+        return None
+    return response["result"]
+
+
+def _missing_sats(transaction: PlannedTransaction, fee_rate: int, change_vsize: int):
+    return transaction.output_sats + (transaction.vsize + change_vsize) * fee_rate - transaction.input_sats
+
+
+def _add_payout(transaction: PlannedTransaction, address: str, sats: int, pool, fee_rate: int,
+                change_vsize: int, max_vsize: int):
+    # Adds the payout and the inputs it needs, leaves the transaction untouched and returns False if it does not fit
+    added_inputs = []
+    added_vsize = 0 if address in transaction.outputs else output_vsize(address)
+    transaction.outputs[address] = transaction.outputs.get(address, 0) + sats
+    transaction.vsize += added_vsize
+    while _missing_sats(transaction, fee_rate, change_vsize) > 0 and pool:
+        utxo = pool.pop()
+        transaction.inputs.append(utxo)
+        transaction.vsize += utxo.vsize
+        added_inputs.append(utxo)
+    if transaction.vsize + change_vsize <= max_vsize and _missing_sats(transaction, fee_rate, change_vsize) <= 0:
+        return True
+    for utxo in reversed(added_inputs):
+        transaction.inputs.pop()
+        transaction.vsize -= utxo.vsize
+        pool.append(utxo)
+    transaction.outputs[address] -= sats
+    if transaction.outputs[address] == 0:
+        del transaction.outputs[address]
+    transaction.vsize -= added_vsize
+    return False
+
+
+@timed("plan payouts")
+def plan_transactions(payouts, utxos, fee_rate: int, change_address: str, max_vsize: int = MAX_VSIZE):
+    # Packs payouts in order into transactions, spending the largest outputs first
+    if any(address == change_address for address, _ in payouts):
+        raise ValueError("Change address can not also receive a payout!")
+    pool = sorted(utxos, key=lambda utxo: utxo.sats)
+    change_vsize = output_vsize(change_address)
+    planned = []
+    current = PlannedTransaction()
+    for address, sats in payouts:
+        if _add_payout(current, address, sats, pool, fee_rate, change_vsize, max_vsize):
+            continue
+        if current.outputs:
+            planned.append(current)
+            current = PlannedTransaction()
+            if _add_payout(current, address, sats, pool, fee_rate, change_vsize, max_vsize):
+                continue
+        if sum(utxo.sats for utxo in pool) <= sats:
+            raise ValueError("Not enough funds for the payouts!")
+        raise ValueError(f"Payout to {address} does not fit in a transaction of {max_vsize} vbytes!")
+    if current.outputs:
+        planned.append(current)
+
+    for transaction in planned:
+        change = -_missing_sats(transaction, fee_rate, change_vsize)
+        if change >= DUST_LIMIT:
+            transaction.vsize += change_vsize
+            transaction.change = change
+        # Change below the dust limit is left to the fee
+        transaction.fee = transaction.input_sats - transaction.output_sats - transaction.change
+    return planned
+
+
+def _outputs_for(transaction: PlannedTransaction, change_address: str):
+    # (address, sats) pairs, change last
+    outputs = list(transaction.outputs.items())
+    if transaction.change:
+        outputs.append((change_address, transaction.change))
+    return outputs
+
+
+def _sign_locally(planned, change_address: str, private_keys, workers: int = None):
+    # Signed hex for every planned transaction, the keys are never sent to the node
+    transactions = [LocalTransaction(
+        [TxInput(utxo.txid, utxo.vout, utxo.sats, bytes.fromhex(utxo.script_pub_key)) for utxo in transaction.inputs],
+        [TxOutput.to_address(address, sats) for address, sats in _outputs_for(transaction, change_address)]
+    ) for transaction in planned]
+    return dict(enumerate(sign_transactions(transactions, private_keys, workers)))
+
+
+def _sign_with_wallet(planned, change_address: str):
+    client = get_client()
+    created = client.batch([("createrawtransaction", [
+        [{"txid": utxo.txid, "vout": utxo.vout} for utxo in transaction.inputs],
+        [{address: format_amount(sats)} for address, sats in _outputs_for(transaction, change_address)]
+    ]) for transaction in planned])
+    raw_transactions = [_response_result(response, "creating transaction") for response in created]
+
+    to_sign = [(number, raw) for number, raw in enumerate(raw_transactions) if raw]
+    signed = {}
+    responses = client.batch([("signrawtransactionwithwallet", [raw]) for _, raw in to_sign])
+    for (number, _), response in zip(to_sign, responses):
+        result = _response_result(response, "signing transaction")
+        if result and not result.get("complete"):
+            print(f"Transaction {number} is not completely signed, missing keys?")
+        elif result:
+            signed[number] = result["hex"]
+    return signed
+
+
+@timed("sign and send payouts")
+def send_transactions(planned, change_address: str, private_keys=None, workers: int = None):
+    # With private keys the transactions are signed locally and sent in one batch request,
+    # otherwise create, sign and send are one batch each. Returns the txids, None for failures
+    if private_keys:
+        signed = _sign_locally(planned, change_address, private_keys, workers)
+    else:
+        signed = _sign_with_wallet(planned, change_address)
+    sent = get_client().batch([("sendrawtransaction", [signed_hex]) for signed_hex in signed.values()])
+    txids = [None] * len(planned)
+    for number, response in zip(signed, sent):
+        txids[number] = _response_result(response, "sending transaction")
+    return txids
+
+
+def pay_out(payouts_path: str, change_address: str, utxos_path: str = None, keys_path: str = None,
+            fee_rate: int = None, max_vsize: int = MAX_VSIZE, dry_run: bool = False, confirm=None):
+    # confirm is called after the plan is printed, nothing is sent unless it returns True
+    payouts = read_payouts(payouts_path)
+    if utxos_path:
+        utxos = read_utxos(utxos_path)
+        if fee_rate is None:
+            fee_rate = get_fee_estimator().fee_rate()
+    else:
+        utxos, estimated_fee_rate = fetch_utxos()
+        fee_rate = fee_rate or estimated_fee_rate
+    private_keys = read_keys(keys_path) if keys_path else None
+
+    planned = plan_transactions(payouts, utxos, fee_rate, change_address, max_vsize)
+    print(f"{len(payouts)} payouts in {len(planned)} transactions at {fee_rate} sat/vbyte")
+    for number, transaction in enumerate(planned):
+        print(f"{number}: {transaction}")
+    if dry_run or (confirm is not None and not confirm()):
+        return []
+    txids = send_transactions(planned, change_address, private_keys)
+    for number, txid in enumerate(txids):
+        print(f"{number}: {txid if txid else 'failed'}")
+    return txids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pay many addresses from a CSV of address,amount")
+    parser.add_argument("payouts")
+    parser.add_argument("--change", required=True, help="Address for the change outputs")
+    parser.add_argument("--utxos", help="CSV of txid,vout,amount,scriptPubKey instead of listunspent")
+    parser.add_argument("--keys", help="File with one WIF private key per line, signs with the wallet if left out")
+    parser.add_argument("--fee-rate", type=int, default=None, help="sat/vbyte, estimatesmartfee if left out")
+    parser.add_argument("--max-vsize", type=int, default=MAX_VSIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the planned transactions")
+    args = parser.parse_args()
+    try:
+        pay_out(args.payouts, args.change, args.utxos, args.keys, args.fee_rate, args.max_vsize, args.dry_run)
+    except ValueError as error:
+        print(error)
+
+
+if __name__ == '__main__':
+    main()
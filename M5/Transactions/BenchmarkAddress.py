@@ -0,0 +1,87 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Per address derivation cost once the public key point is known, the earlier
+hex string path against the bytes path CoinKey uses now.
+
+    python BenchmarkAddress.py [--keys 2000] [--repeat 5]
+"""
+
+import argparse
+import binascii
+import hashlib
+import secrets
+import timeit
+
+from pycoin.ecdsa.secp256k1 import _r
+from pycoin.encoding import b58
+from pycoin.contrib import segwit_addr
+
+from PrivateKey import CoinKey, ElipsisPoint
+from Secp256k1 import multiply_generator_batch
+
+
+# The hex string helpers CoinKey used before it switched to bytes
+def _double_sha256_hex(value):
+    return hashlib.sha256(hashlib.sha256(binascii.unhexlify(value)).digest()).hexdigest()
+
+
+def _hash160_hex(value):
+    return hashlib.new('ripemd160', hashlib.sha256(binascii.unhexlify(value)).digest()).hexdigest()
+
+
+def _base58_with_checksum_hex(data):
+    checksum = _double_sha256_hex(data)[:8]
+    return b58.b2a_base58(binascii.unhexlify(data + checksum))
+
+
+def _addresses_hex(private_key, x, y):
+    uncompressed = "04" + "%064x" % x + "%064x" % y
+    compressed = ("02" if y % 2 == 0 else "03") + "%064x" % x
+    com_hash160 = _hash160_hex(compressed)
+    hex_key = "%064x" % private_key
+    return (
+        _base58_with_checksum_hex("00" + _hash160_hex(uncompressed)),
+        _base58_with_checksum_hex("00" + com_hash160),
+        _base58_with_checksum_hex("80" + hex_key + "01"),
+        _base58_with_checksum_hex("80" + hex_key),
+        _base58_with_checksum_hex("05" + _hash160_hex("0014" + com_hash160)),
+        segwit_addr.encode("bc", 0, binascii.unhexlify(com_hash160)),
+    )
+
+
+def _addresses_bytes(private_key, x, y):
+    key = CoinKey()
+    key.set_private(private_key)
+    key.public_key_point = ElipsisPoint(x, y)
+    return (
+        key.get_uncompressed_bitcoin_address(b"\x00"),
+        key.get_compressed_bitcoin_address(b"\x00"),
+        key.get_compressed_wif_format(),
+        key.get_uncompressed_wif_format(),
+        key.get_p2sh_segwit(),
+        key.get_p2wpkh_segwit(0),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per address derivation cost, hex path against bytes path")
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cryptsafe_gen = secrets.SystemRandom()
+    private_keys = [cryptsafe_gen.randrange(1, _r) for _ in range(args.keys)]
+    keys = [(private_key, x, y) for private_key, (x, y) in zip(private_keys, multiply_generator_batch(private_keys))]
+    assert all(_addresses_hex(*key) == _addresses_bytes(*key) for key in keys[:100]), "Paths disagree!"
+
+    print(f"{'Path':<12}{'us/key':>10}")
+    for name, function in (("hex", _addresses_hex), ("bytes", _addresses_bytes)):
+        best = min(timeit.repeat(lambda: [function(*key) for key in keys], number=1, repeat=args.repeat))
+        print(f"{name:<12}{best / len(keys) * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Selection latency and fee waste of select_coins over synthetic UTXO sets,
+with plain largest first selection as the baseline. Waste is the fee paid
+above the long term fee rate for the inputs plus the change cost or the
+excess given to the miner, lower is better.
+
+    python BenchmarkCoinSelection.py [--payments 50] [--fee-rate 20] [--seed 1]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from CoinSelection import Utxo, build_selection, select_coins
+
+CHANGE_ADDRESS = "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4"
+SCRIPTS = ["0014" + "11" * 20, "76a914" + "22" * 20 + "88ac", "a914" + "33" * 20 + "87"]
+
+
+def _utxos(amounts, rng: random.Random):
+    return [Utxo(f"{rng.getrandbits(256):064x}", 0, max(1000, int(amount)), rng.choice(SCRIPTS)) for amount in amounts]
+
+
+def distributions(rng: random.Random):
+    # name -> (UTXO set, payment amounts are drawn from this range in sats)
+    return {
+        "uniform 1k": (_utxos((rng.uniform(10000, 10000000) for _ in range(1000)), rng), (50000, 5000000)),
+        "lognormal 5k": (_utxos((rng.lognormvariate(13, 1.5) for _ in range(5000)), rng), (10000, 20000000)),
+        "dust heavy 10k": (_utxos((rng.uniform(1000, 20000) if rng.random() < 0.9 else rng.uniform(1e6, 1e8)
+                                   for _ in range(10000)), rng), (10000, 50000000)),
+        "few large 50": (_utxos((rng.uniform(1e7, 5e8) for _ in range(50)), rng), (100000, 200000000)),
+        "exchange 100k": (_utxos((rng.lognormvariate(12, 2) for _ in range(100000)), rng), (10000, 100000000)),
+    }
+
+
+def _largest_first(utxos, outputs, fee_rate: int):
+    selected = []
+    for utxo in sorted(utxos, key=lambda utxo: utxo.sats, reverse=True):
+        selected.append(utxo)
+        try:
+            return build_selection(selected, outputs, fee_rate, CHANGE_ADDRESS, algorithm="largest first")
+        except ValueError:
+            continue
+    raise ValueError("Not enough funds for the payment!")
+
+
+def _run(select, utxos, payments, fee_rate: int):
+    latencies = []
+    wastes = []
+    inputs = []
+    algorithms = {}
+    failures = 0
+    for amount in payments:
+        outputs = [("1BgGZ9tcN4rm9KBzDn7KprQz87SZ26SAMH", amount)]
+        started = time.perf_counter()
+        try:
+            selection = select(utxos, outputs, fee_rate)
+        except ValueError:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        wastes.append(selection.waste)
+        inputs.append(len(selection.inputs))
+        algorithms[selection.algorithm] = algorithms.get(selection.algorithm, 0) + 1
+    return latencies, wastes, inputs, algorithms, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coin selection latency and waste on synthetic UTXO sets")
+    parser.add_argument("--payments", type=int, default=50)
+    parser.add_argument("--fee-rate", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    selection_rng = random.Random(args.seed)
+    engines = (
+        ("select_coins", lambda utxos, outputs, fee_rate: select_coins(utxos, outputs, fee_rate, CHANGE_ADDRESS,
+                                                                       rng=selection_rng)),
+        ("largest first", _largest_first),
+    )
+    print(f"{'Distribution':<16}{'Engine':<15}{'p50 ms':>8}{'p95 ms':>8}{'max ms':>8}{'waste':>10}"
+          f"{'inputs':>8}{'failed':>8}  Algorithms")
+    for name, (utxos, (low, high)) in distributions(rng).items():
+        payments = [rng.randint(low, high) for _ in range(args.payments)]
+        for engine, select in engines:
+            latencies, wastes, inputs, algorithms, failures = _run(select, utxos, payments, args.fee_rate)
+            if not latencies:
+                print(f"{name:<16}{engine:<15}{'all payments failed':>50}")
+                continue
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f"{name:<16}{engine:<15}{statistics.median(latencies) * 1000:>8.1f}{p95 * 1000:>8.1f}"
+                  f"{latencies[-1] * 1000:>8.1f}{statistics.mean(wastes):>10.0f}{statistics.mean(inputs):>8.1f}"
+                  f"{failures:>8}  {', '.join(f'{key} {value}' for key, value in sorted(algorithms.items()))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Public key derivation speed, pycoin's generic multiplication against the
+precomputed generator table. Results are checked against pycoin first.
+
+    python BenchmarkKeys.py [--keys 2000]
+"""
+
+import argparse
+import secrets
+import time
+
+from pycoin.ecdsa.secp256k1 import secp256k1_generator as secpGen
+from pycoin.ecdsa.secp256k1 import _r
+
+import Secp256k1
+from PrivateKey import CoinKey, ElipsisPoint
+
+
+def _check(private_keys):
+    expected = [tuple(private_key * secpGen) for private_key in private_keys]
+    assert [Secp256k1.multiply_generator(private_key) for private_key in private_keys] == expected, \
+        "Single multiplication does not match pycoin!"
+    assert Secp256k1.multiply_generator_batch(private_keys) == expected, \
+        "Batch multiplication does not match pycoin!"
+
+
+def _rate(function, private_keys):
+    start = time.perf_counter()
+    function(private_keys)
+    elapsed = time.perf_counter() - start
+    return len(private_keys) / elapsed
+
+
+def _generate_public_keys(private_keys):
+    for private_key in private_keys:
+        key = CoinKey()
+        key.set_private(private_key)
+        key.generate_public_key()
+        key.get_compressed_hash160_address()
+        key.get_uncompressed_hash160_address()
+
+
+def _hash160_range(private_keys):
+    for _ in CoinKey.iter_hash160_range(private_keys[0], len(private_keys)):
+        pass
+
+
+def _check_range(start: int, count: int):
+    for private_key, compressed, uncompressed in CoinKey.iter_hash160_range(start, count, 64):
+        point = ElipsisPoint(*(private_key * secpGen))
+        assert compressed == CoinKey._hash160(point.get_compressed_bytes()) and \
+            uncompressed == CoinKey._hash160(point.get_uncompressed_bytes()), \
+            f"Range mismatch at key {private_key}!"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keys per second for public key derivation")
+    parser.add_argument("--keys", type=int, default=2000)
+    args = parser.parse_args()
+
+    cryptsafe_gen = secrets.SystemRandom()
+    private_keys = [cryptsafe_gen.randrange(1, _r) for _ in range(args.keys)]
+    edge_keys = [1, 2, 3, 255, 256, 257, 2 ** 128, _r - 2, _r - 1]
+
+    start = time.perf_counter()
+    Secp256k1.get_table()
+    print(f"Table ready in {time.perf_counter() - start:.3f} s")
+    _check(edge_keys + private_keys[:200])
+    _check_range(1, 150)
+    _check_range(private_keys[0], 150)
+    print("Results match pycoin")
+
+    print(f"{'Method':<32}{'Keys/s':>12}")
+    results = [
+        ("pycoin k * G", _rate(lambda keys: [key * secpGen for key in keys], private_keys)),
+        ("table, one key at a time", _rate(lambda keys: [Secp256k1.multiply_generator(key) for key in keys],
+                                           private_keys)),
+        ("table, batched normalization", _rate(Secp256k1.multiply_generator_batch, private_keys)),
+        ("generate_public_key + hash160s", _rate(_generate_public_keys, private_keys)),
+        ("sequential range + hash160s", _rate(_hash160_range, private_keys * 10)),
+    ]
+    for name, rate in results:
+        print(f"{name:<32}{rate:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
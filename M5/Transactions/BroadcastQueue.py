@@ -0,0 +1,399 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Asynchronous broadcast of signed transactions. Submitting only queues the
+transaction and persists it, workers send it with bounded concurrency and
+rate, transient node errors are retried with backoff. Confirmations are
+tracked by scanning new blocks for the sent txids and checking the mempool
+for the rest, both as batch requests, so the cost does not grow with one
+request per transaction.
+
+    python BroadcastQueue.py submit signed.txt [--no-wait]
+    python BroadcastQueue.py run
+    python BroadcastQueue.py status
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import requests
+
+# The RPC client and transaction decoding are shared with the block explorer
+import ExplorerPath
+
+from RawBlock import parse_raw_transaction
+from RpcClient import RpcTransientError, get_client
+
+STATE_PATH = "broadcast_state.json"
+CONCURRENCY = 4
+# Broadcasts per second and how many may go at once after an idle period
+RATE = 10.0
+BURST = 10
+MAX_ATTEMPTS = 6
+RETRY_BACKOFF = 1.0
+POLL_INTERVAL = 10.0
+# Confirmed entries are checked against the active chain until they are this deep
+FINAL_CONFIRMATIONS = 6
+FLUSH_INTERVAL = 0.5
+
+PENDING = "pending"
+SENT = "sent"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+RPC_IN_WARMUP = -28
+RPC_VERIFY_ERROR = -25
+RPC_VERIFY_ALREADY_IN_CHAIN = -27
+RPC_INVALID_ADDRESS_OR_KEY = -5
+TRANSIENT_RPC_ERRORS = {RPC_IN_WARMUP}
+# Verification failures (-25) that are usually a parent that has not reached the node yet, the rest are final
+TRANSIENT_REJECT_REASONS = ("missing-inputs", "bad-txns-inputs-missingorspent")
+UNKNOWN_HEIGHT = "Confirmed deeper than the recent blocks, the height needs -txindex"
+
+
+class RateLimiter:
+    # Token bucket, acquire waits until a token is free
+
+    def __init__(self, rate: float = RATE, burst: int = BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class BroadcastQueue:
+    def __init__(self, client=None, state_path: str = STATE_PATH, concurrency: int = CONCURRENCY,
+                 rate: float = RATE, burst: int = BURST, max_attempts: int = MAX_ATTEMPTS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.client = client or get_client()
+        self.state_path = state_path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.limiter = RateLimiter(rate, burst)
+        # txid -> {"hex", "status", "attempts", "error", "height", "blockhash", "submitted_height"}
+        self.entries = {}
+        # Last block scanned for confirmations
+        self.scanned_height = None
+        self._queue = None
+        self._tasks = []
+        self._waiters = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path) as file:
+            state = json.load(file)
+        self.entries = state.get("entries", {})
+        self.scanned_height = state.get("scanned_height")
+
+    def flush(self):
+        if not self.state_path or not self._dirty:
+            return
+        # Written next to the old state and swapped in, a crash leaves one of them whole
+        temporary = self.state_path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"entries": self.entries, "scanned_height": self.scanned_height}, file)
+        os.replace(temporary, self.state_path)
+        self._dirty = False
+
+    def _set(self, txid: str, **fields):
+        self.entries[txid].update(fields)
+        self._dirty = True
+        entry = self.entries[txid]
+        if entry["status"] in (CONFIRMED, FAILED):
+            for future in self._waiters.pop(txid, []):
+                if not future.done():
+                    future.set_result(entry)
+
+    async def _call(self, method: str, *params):
+        return await asyncio.to_thread(self.client.call, method, *params)
+
+    async def _batch(self, calls):
+        return await asyncio.to_thread(self.client.batch, calls)
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        for txid, entry in self.entries.items():
+            if entry["status"] == PENDING:
+                self._queue.put_nowait(txid)
+        self._tasks = [asyncio.create_task(self._broadcast_worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._poll_loop()))
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.flush()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def submit(self, raw_hex: str):
+        return self.submit_many([raw_hex])[0]
+
+    def submit_many(self, raw_hexes):
+        # Queues the transactions and persists them before anything is sent, returns the txids
+        txids = []
+        for raw_hex in raw_hexes:
+            txid = parse_raw_transaction(bytes.fromhex(raw_hex), include_hex=False)["txid"]
+            txids.append(txid)
+            if txid in self.entries and self.entries[txid]["status"] != FAILED:
+                continue
+            self.entries[txid] = {"hex": raw_hex, "status": PENDING, "attempts": 0, "error": None,
+                                  "height": None, "blockhash": None, "submitted_height": None}
+            self._dirty = True
+            if self._queue is not None:
+                self._queue.put_nowait(txid)
+        self.flush()
+        return txids
+
+    async def drain(self):
+        # Until everything submitted has been broadcast or has failed, retries wait outside the queue
+        while True:
+            await self._queue.join()
+            if not any(entry["status"] == PENDING for entry in self.entries.values()):
+                return
+            await asyncio.sleep(RETRY_BACKOFF)
+
+    async def wait(self, txid: str):
+        # Resolves with the entry once it is confirmed or failed
+        entry = self.entries[txid]
+        if entry["status"] in (CONFIRMED, FAILED):
+            return entry
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(txid, []).append(future)
+        return await future
+
+    async def _broadcast_worker(self):
+        while True:
+            txid = await self._queue.get()
+            try:
+                await self._broadcast(txid)
+            finally:
+                self._queue.task_done()
+
+    async def _broadcast(self, txid: str):
+        entry = self.entries[txid]
+        await self.limiter.acquire()
+        attempts = entry["attempts"] + 1
+        try:
+            response = await self._call("sendrawtransaction", entry["hex"])
+        except (requests.ConnectionError, requests.Timeout, RpcTransientError) as error:
+            await self._retry(txid, attempts, str(error))
+            return
+        error = response["error"]
+        if not error:
+            self._set(txid, status=SENT, attempts=attempts, error=None, submitted_height=self.scanned_height)
+        elif error["code"] == RPC_VERIFY_ALREADY_IN_CHAIN:
+            # The block is looked up by the next poll
+            self._set(txid, status=CONFIRMED, attempts=attempts, error=None, height=None, blockhash=None)
+        elif error["code"] in TRANSIENT_RPC_ERRORS or (error["code"] == RPC_VERIFY_ERROR and any(
+                reason in error["message"] for reason in TRANSIENT_REJECT_REASONS)):
+            await self._retry(txid, attempts, error["message"])
+        else:
+            self._set(txid, status=FAILED, attempts=attempts, error=f"{error['code']}: {error['message']}")
+
+    async def _retry(self, txid: str, attempts: int, message: str):
+        if attempts >= self.max_attempts:
+            self._set(txid, status=FAILED, attempts=attempts, error=message)
+            return
+        self._set(txid, attempts=attempts, error=message)
+
+        async def requeue():
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempts - 1))
+            self._queue.put_nowait(txid)
+
+        self._tasks.append(asyncio.create_task(requeue()))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.poll()
+            except (requests.ConnectionError, requests.Timeout, RpcTransientError) as error:
+                print(f"Confirmation poll failed: {error}")
+            except Exception as error:
+                # Anything else must not end the polling either, wait() would never resolve
+                print(f"Confirmation poll failed! Error: {error!r}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll(self):
+        # One round of confirmation tracking, every step is a single batch request
+        tip = (await self._call("getblockcount"))["result"]
+        if tip is None:
+            return
+        if self.scanned_height is None:
+            self.scanned_height = tip
+            self._dirty = True
+        await self._locate_confirmed(tip)
+        await self._check_confirmed(tip)
+        sent = {txid for txid, entry in self.entries.items() if entry["status"] == SENT}
+        if sent and tip > self.scanned_height:
+            await self._scan_blocks(self.scanned_height + 1, tip, sent)
+        self.scanned_height = tip
+        self._dirty = True
+        await self._check_mempool(tip)
+
+    async def _scan_blocks(self, start: int, end: int, sent):
+        heights = list(range(start, end + 1))
+        hashes = [response["result"] for response in
+                  await self._batch([("getblockhash", [height]) for height in heights])]
+        blocks = await self._batch([("getblock", [blockhash, 1]) for blockhash in hashes if blockhash])
+        for response in blocks:
+            block = response["result"]
+            if not block:
+                continue
+            for txid in sent.intersection(block["tx"]):
+                self._set(txid, status=CONFIRMED, height=block["height"], blockhash=block["hash"])
+
+    async def _locate_confirmed(self, tip: int):
+        # Entries the node reported as already in the chain have no block yet. getrawtransaction names it
+        # with -txindex, otherwise the blocks the reorg check covers are searched.
+        unlocated = [txid for txid, entry in self.entries.items()
+                     if entry["status"] == CONFIRMED and entry["height"] is None and entry["error"] is None]
+        if not unlocated:
+            return
+        transactions = await self._batch([("getrawtransaction", [txid, True]) for txid in unlocated])
+        blockhashes = {txid: (response["result"] or {}).get("blockhash")
+                       for txid, response in zip(unlocated, transactions)}
+        located = [txid for txid in unlocated if blockhashes[txid]]
+        headers = await self._batch([("getblockheader", [blockhashes[txid]]) for txid in located])
+        for txid, response in zip(located, headers):
+            header = response["result"]
+            if header and header["confirmations"] > 0:
+                self._set(txid, height=header["height"], blockhash=header["hash"])
+        missing = {txid for txid in unlocated if self.entries[txid]["height"] is None}
+        if missing:
+            await self._scan_blocks(max(0, tip - FINAL_CONFIRMATIONS + 1), tip, missing)
+        for txid in missing:
+            if self.entries[txid]["height"] is None:
+                self._set(txid, error=UNKNOWN_HEIGHT)
+
+    async def _check_confirmed(self, tip: int):
+        # A reorg can take a confirmed transaction out of the chain, it is then tracked as sent again
+        recent = [(txid, entry) for txid, entry in self.entries.items()
+                  if entry["status"] == CONFIRMED and entry["height"] is not None
+                  and tip - entry["height"] + 1 < FINAL_CONFIRMATIONS]
+        if not recent:
+            return
+        responses = await self._batch([("getblockhash", [entry["height"]]) for _, entry in recent])
+        for (txid, entry), response in zip(recent, responses):
+            if response["result"] != entry["blockhash"]:
+                self.scanned_height = min(self.scanned_height, entry["height"] - 1)
+                self._set(txid, status=SENT, height=None, blockhash=None, submitted_height=tip)
+
+    async def _check_mempool(self, tip: int):
+        # Sent transactions that are neither in a block nor in the mempool were dropped and go out again,
+        # the node gets one block after the broadcast before that is checked
+        sent = []
+        for txid, entry in self.entries.items():
+            if entry["status"] != SENT:
+                continue
+            if entry["submitted_height"] is None:
+                self._set(txid, submitted_height=tip)
+            elif entry["submitted_height"] < tip:
+                sent.append(txid)
+        if not sent:
+            return
+        responses = await self._batch([("getmempoolentry", [txid]) for txid in sent])
+        for txid, response in zip(sent, responses):
+            error = response["error"]
+            if error and error["code"] == RPC_INVALID_ADDRESS_OR_KEY:
+                self._set(txid, status=PENDING)
+                self._queue.put_nowait(txid)
+
+    def confirmations(self, txid: str):
+        entry = self.entries[txid]
+        if entry["status"] != CONFIRMED or entry["height"] is None or self.scanned_height is None:
+            return 0
+        return self.scanned_height - entry["height"] + 1
+
+    def summary(self):
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
+
+
+async def _run(queue: BroadcastQueue, txids, wait: bool):
+    async with queue:
+        if not wait:
+            await queue.drain()
+        else:
+            waiting = [txid for txid in txids if queue.entries[txid]["status"] not in (CONFIRMED, FAILED)]
+            for entry_txid, entry in zip(waiting, await asyncio.gather(*(queue.wait(txid) for txid in waiting))):
+                print(f"{entry_txid}: {entry['status']}{' ' + entry['error'] if entry['error'] else ''}")
+
+
+def _print_status(queue: BroadcastQueue):
+    for txid, entry in queue.entries.items():
+        detail = f"height {entry['height']}" if entry["height"] is not None else entry["error"] or ""
+        print(f"{txid} {entry['status']:<10} {entry['attempts']} attempts {detail}")
+    print(", ".join(f"{status} {count}" for status, count in sorted(queue.summary().items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast signed transactions and track their confirmations")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE, help="Broadcasts per second")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    submit = subparsers.add_parser("submit", help="Queue the signed transactions of a file, one hex per line")
+    submit.add_argument("path")
+    submit.add_argument("--no-wait", action="store_true", help="Exit once everything is broadcast")
+    subparsers.add_parser("run", help="Resume the persisted queue until everything is confirmed or failed")
+    subparsers.add_parser("status", help="Show the persisted queue")
+    args = parser.parse_args()
+
+    queue = BroadcastQueue(state_path=args.state, concurrency=args.concurrency, rate=args.rate, burst=max(1, int(args.rate)),
+                           poll_interval=args.poll_interval)
+    if args.command == "status":
+        _print_status(queue)
+        return
+    if args.command == "submit":
+        with open(args.path) as file:
+            txids = queue.submit_many(line.strip() for line in file if line.strip())
+        wait = not args.no_wait
+    else:
+        txids = list(queue.entries)
+        wait = True
+    try:
+        asyncio.run(_run(queue, txids, wait))
+    except KeyboardInterrupt:
+        print("Stopped, the queue is saved and continues with run")
+    print(", ".join(f"{status} {count}" for status, count in sorted(queue.summary().items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Fee rate aware coin selection. Inputs are valued by their effective value
+(amount minus the fee to spend them). Branch and bound looks for a change-free
+input set, a randomized knapsack and largest first give sets with change, and
+the one with the lowest waste is used. All are bounded in tries and time, so
+large UTXO sets stay responsive. Fee rates come from estimatesmartfee, with the
+last good estimate cached for when the node has none.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from decimal import Decimal, InvalidOperation
+
+# The RPC client and script decoding are shared with the block explorer
+import ExplorerPath
+
+from RawBlock import classify_script
+from RpcClient import get_client
+
+SATOSHIS_PER_COIN = 100000000
+DUST_LIMIT = 546
+
+CONFIRMATION_TARGET = 6
+# sat/vbyte when the node has no estimate and nothing is cached
+FALLBACK_FEE_RATE = 2
+# Fee rate expected when change outputs are spent later, decides if spending more inputs now is wasteful
+LONG_TERM_FEE_RATE = 10
+FEE_CACHE_PATH = "fee_estimates.json"
+# Estimates are reused for this many seconds before the node is asked again
+FEE_CACHE_TTL = 60
+# Older cached estimates are not used as fallback
+FEE_CACHE_MAX_AGE = 24 * 60 * 60
+
+BNB_TRIES = 100000
+KNAPSACK_ITERATIONS = 1000
+# Element visits per knapsack run, fewer iterations for large UTXO sets
+KNAPSACK_BUDGET = 500000
+# Only the largest outputs below the target take part in the knapsack
+KNAPSACK_CANDIDATES = 1000
+MIN_CHANGE = 50000
+SELECTION_TIME_LIMIT = 1.0
+# Largest standard transaction is 400000 weight units
+MAX_VSIZE = 100000
+
+# Virtual sizes in vbytes, rounded up
+TRANSACTION_OVERHEAD_VSIZE = 11
+INPUT_VSIZE = {
+    "pubkeyhash": 148,
+    "scripthash": 91,
+    "witness_v0_keyhash": 68,
+    "witness_v0_scripthash": 105,
+    "witness_v1_taproot": 58,
+}
+OUTPUT_VSIZE = {
+    "pubkeyhash": 34,
+    "scripthash": 32,
+    "witness_v0_keyhash": 31,
+    "witness_v0_scripthash": 43,
+    "witness_v1_taproot": 43,
+}
+DEFAULT_INPUT_VSIZE = 148
+SEGWIT_HRPS = ("bc1", "tb1", "bcrt1")
+
+
+def to_sats(amount):
+    try:
+        return int((Decimal(str(amount)) * SATOSHIS_PER_COIN).to_integral_value())
+    except InvalidOperation:
+        raise ValueError(f"{amount} is not a valid amount!")
+
+
+def format_amount(sats: int):
+    return f"{sats // SATOSHIS_PER_COIN}.{sats % SATOSHIS_PER_COIN:08d}"
+
+
+def address_type(address: str):
+    # Script type of an address by its format, with the type names of bitcoind
+    lowered = address.lower()
+    for hrp in SEGWIT_HRPS:
+        if lowered.startswith(hrp):
+            if lowered[len(hrp)] == "p":
+                return "witness_v1_taproot"
+            # 20 byte programs are 39 characters after the hrp, 32 byte ones are longer
+            return "witness_v0_keyhash" if len(address) - len(hrp) == 39 else "witness_v0_scripthash"
+    return "scripthash" if address[0] in "32" else "pubkeyhash"
+
+
+def output_vsize(address: str):
+    return OUTPUT_VSIZE[address_type(address)]
+
+
+def fee_for(vsize: int, fee_rate: int):
+    return vsize * fee_rate
+
+
+class Utxo:
+    __slots__ = ("txid", "vout", "sats", "script_pub_key", "vsize")
+
+    def __init__(self, txid: str, vout: int, sats: int, script_pub_key: str):
+        self.txid = txid
+        self.vout = vout
+        self.sats = sats
+        self.script_pub_key = script_pub_key
+        script_type, _ = classify_script(bytes.fromhex(script_pub_key))
+        self.vsize = INPUT_VSIZE.get(script_type, DEFAULT_INPUT_VSIZE)
+
+    def effective_value(self, fee_rate: int):
+        return self.sats - fee_for(self.vsize, fee_rate)
+
+
+class FeeEstimator:
+    def __init__(self, cache_path: str = FEE_CACHE_PATH, ttl: float = FEE_CACHE_TTL):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        # confirmation target -> (sat/vbyte, unix time of the estimate)
+        self.estimates = self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path) as file:
+                return {int(target): tuple(entry) for target, entry in json.load(file).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "w") as file:
+                json.dump(self.estimates, file)
+        except OSError as error:
+            print(f"Could not save fee estimates: {error}")
+
+    def from_response(self, response, target: int = CONFIRMATION_TARGET):
+        # sat/vbyte from an estimatesmartfee response, the cached estimate or the fallback when it has none
+        result = response.get("result") if not response.get("error") else None
+        if result and "feerate" in result:
+            fee_rate = max(1, math.ceil(to_sats(result["feerate"]) / 1000))
+            self.estimates[target] = (fee_rate, time.time())
+            self._save()
+            return fee_rate
+        cached = self.estimates.get(target)
+        if cached is not None and time.time() - cached[1] < FEE_CACHE_MAX_AGE:
+            return cached[0]
+        return FALLBACK_FEE_RATE
+
+    def fee_rate(self, target: int = CONFIRMATION_TARGET):
+        cached = self.estimates.get(target)
+        if cached is not None and time.time() - cached[1] < self.ttl:
+            return cached[0]
+        return self.from_response(get_client().call("estimatesmartfee", target), target)
+
+
+_default_estimator = None
+
+
+def get_fee_estimator():
+    global _default_estimator
+    if _default_estimator is None:
+        _default_estimator = FeeEstimator()
+    return _default_estimator
+
+
+def fetch_utxos(addresses=None, minimum_confirmations: int = 1, target: int = CONFIRMATION_TARGET):
+    # Spendable wallet outputs and the fee rate in one round trip
+    params = [minimum_confirmations, 9999999, list(addresses)] if addresses else [minimum_confirmations]
+    unspent, estimate = get_client().batch([
+        ("listunspent", params),
+        ("estimatesmartfee", [target])
+    ])
+    if unspent["error"]:
+        error = unspent["error"]
+        print(f"Error listing unspent outputs! Code: {error['code']} with message {error['message']}")
+    utxos = [Utxo(entry["txid"], entry["vout"], to_sats(entry["amount"]), entry["scriptPubKey"])
+             for entry in unspent["result"] or [] if entry.get("spendable", True) or entry.get("solvable", False)]
+    return utxos, get_fee_estimator().from_response(estimate, target)
+
+
+class Selection:
+    def __init__(self, inputs, payment: int, fee: int, change: int, vsize: int, waste: int, algorithm: str):
+        self.inputs = inputs
+        self.payment = payment
+        self.fee = fee
+        self.change = change
+        self.vsize = vsize
+        self.waste = waste
+        self.algorithm = algorithm
+
+    def __str__(self):
+        return f"{len(self.inputs)} inputs ({self.algorithm}), paying {format_amount(self.payment)} BTE, " \
+               f"change {format_amount(self.change)} BTE, fee {self.fee} sats, {self.vsize} vbytes"
+
+
+def _select_bnb(pool, target: int, cost_of_change: int, fee_rate: int, long_term_fee_rate: int,
+                max_tries: int, deadline: float):
+    # Depth first search for an input set worth target to target + cost_of_change, the lowest waste wins.
+    # pool is (effective value, utxo) sorted by effective value, largest first
+    available = sum(value for value, _ in pool)
+    if available < target:
+        return None
+    high_fee_rate = fee_rate > long_term_fee_rate
+    value = 0
+    waste = 0
+    included = []
+    best = None
+    best_waste = None
+    for tries in range(max_tries):
+        if tries & 1023 == 0 and time.monotonic() > deadline:
+            break
+        backtrack = False
+        if value + available < target or value > target + cost_of_change or \
+                (high_fee_rate and best_waste is not None and waste > best_waste):
+            backtrack = True
+        elif value >= target:
+            if best_waste is None or waste + value - target <= best_waste:
+                best = [pool[index][1] for index, selected in enumerate(included) if selected]
+                best_waste = waste + value - target
+            backtrack = True
+
+        if backtrack:
+            # Undo the omissions at the end, then try leaving out the last included output
+            while included and not included[-1]:
+                included.pop()
+                available += pool[len(included)][0]
+            if not included:
+                break
+            included[-1] = False
+            effective_value, utxo = pool[len(included) - 1]
+            value -= effective_value
+            waste -= utxo.vsize * (fee_rate - long_term_fee_rate)
+        else:
+            effective_value, utxo = pool[len(included)]
+            available -= effective_value
+            previous = len(included) - 1
+            if included and not included[-1] and effective_value == pool[previous][0] \
+                    and utxo.vsize == pool[previous][1].vsize:
+                # Same as the output just left out, including it gives a combination already tried
+                included.append(False)
+            else:
+                included.append(True)
+                value += effective_value
+                waste += utxo.vsize * (fee_rate - long_term_fee_rate)
+    return best
+
+
+def _approximate_best_subset(values, total: int, target: int, iterations: int, rng: random.Random,
+                             deadline: float):
+    best = [True] * len(values)
+    best_value = total
+    for _ in range(iterations):
+        if best_value == target or time.monotonic() > deadline:
+            break
+        selected = [False] * len(values)
+        value = 0
+        reached = False
+        for first_pass in (True, False):
+            if reached:
+                break
+            coin_flips = rng.randbytes(len(values)) if first_pass else None
+            for index, amount in enumerate(values):
+                if selected[index] or (first_pass and coin_flips[index] < 128):
+                    continue
+                value += amount
+                selected[index] = True
+                if value >= target:
+                    reached = True
+                    if value < best_value:
+                        best_value = value
+                        best = selected[:]
+                    value -= amount
+                    selected[index] = False
+    return best, best_value
+
+
+def _select_knapsack(pool, target: int, rng: random.Random, deadline: float):
+    # Randomized subset sum over the largest outputs smaller than target + MIN_CHANGE, or the smallest larger output.
+    # pool is sorted by effective value, largest first
+    lowest_larger = None
+    applicable = []
+    for effective_value, utxo in pool:
+        if effective_value == target:
+            return [utxo]
+        if effective_value >= target + MIN_CHANGE:
+            lowest_larger = (effective_value, utxo)
+        elif len(applicable) < KNAPSACK_CANDIDATES:
+            applicable.append((effective_value, utxo))
+        else:
+            break
+    total_lower = sum(value for value, _ in applicable)
+
+    if total_lower == target:
+        return [utxo for _, utxo in applicable]
+    if total_lower < target:
+        return [lowest_larger[1]] if lowest_larger else None
+
+    values = [value for value, _ in applicable]
+    iterations = max(1, min(KNAPSACK_ITERATIONS, KNAPSACK_BUDGET // len(values)))
+    best, best_value = _approximate_best_subset(values, total_lower, target, iterations, rng, deadline)
+    if best_value != target and total_lower >= target + MIN_CHANGE:
+        best, best_value = _approximate_best_subset(values, total_lower, target + MIN_CHANGE, iterations, rng,
+                                                    deadline)
+    if lowest_larger and ((best_value != target and best_value < target + MIN_CHANGE)
+                          or lowest_larger[0] <= best_value):
+        return [lowest_larger[1]]
+    return [utxo for (_, utxo), selected in zip(applicable, best) if selected]
+
+
+def _select_largest_first(pool, target: int):
+    selected = []
+    value = 0
+    for effective_value, utxo in pool:
+        if value >= target:
+            break
+        selected.append(utxo)
+        value += effective_value
+    return selected if value >= target else None
+
+
+def select_coins(utxos, outputs, fee_rate: int, change_address: str, long_term_fee_rate: int = LONG_TERM_FEE_RATE,
+                 max_tries: int = BNB_TRIES, time_limit: float = SELECTION_TIME_LIMIT, rng: random.Random = None,
+                 max_vsize: int = MAX_VSIZE):
+    # outputs are (address, sats) pairs. Raises ValueError when the outputs can not be funded
+    rng = rng or random.Random()
+    payment = sum(sats for _, sats in outputs)
+    fixed_vsize = TRANSACTION_OVERHEAD_VSIZE + sum(output_vsize(address) for address, _ in outputs)
+    change_vsize = output_vsize(change_address)
+    change_spend_vsize = INPUT_VSIZE.get(address_type(change_address), DEFAULT_INPUT_VSIZE)
+    target = payment + fee_for(fixed_vsize, fee_rate)
+    cost_of_change = fee_for(change_vsize, fee_rate) + fee_for(change_spend_vsize, long_term_fee_rate)
+
+    pool = [(utxo.effective_value(fee_rate), utxo) for utxo in utxos]
+    pool = [entry for entry in pool if entry[0] > 0]
+    pool.sort(key=lambda entry: entry[0], reverse=True)
+    deadline = time.monotonic() + time_limit / 2
+
+    # Outputs worth more than the upper bound can not be part of a change free set
+    upper_bound = target + cost_of_change
+    bnb_pool = pool[next((index for index, entry in enumerate(pool) if entry[0] <= upper_bound), len(pool)):]
+    knapsack = _select_knapsack(pool, target + cost_of_change, rng, deadline + time_limit / 2)
+    if knapsack is None:
+        # Not enough for a change output, a change free transaction may still be fundable
+        knapsack = _select_knapsack(pool, target, rng, deadline + time_limit / 2)
+    candidates = (
+        ("bnb", _select_bnb(bnb_pool, target, cost_of_change, fee_rate, long_term_fee_rate, max_tries, deadline)),
+        ("knapsack", knapsack),
+        # Fewest inputs possible, also covers payments that need a large part of the wallet
+        ("largest first", _select_largest_first(pool, target)),
+    )
+    # Like bitcoind, every algorithm gets a say and the lowest waste wins
+    best = None
+    for algorithm, selected in candidates:
+        if selected is None or fixed_vsize + sum(utxo.vsize for utxo in selected) + change_vsize > max_vsize:
+            continue
+        selection = build_selection(selected, outputs, fee_rate, change_address, long_term_fee_rate, algorithm)
+        if best is None or selection.waste < best.waste:
+            best = selection
+    if best is None:
+        if candidates[2][1] is None:
+            raise ValueError("Not enough funds for the payment!")
+        raise ValueError(f"Payment needs more inputs than fit in {max_vsize} vbytes!")
+    return best
+
+
+def build_selection(selected, outputs, fee_rate: int, change_address: str,
+                    long_term_fee_rate: int = LONG_TERM_FEE_RATE, algorithm: str = "manual"):
+    # Fee, change and waste for spending the selected outputs
+    payment = sum(sats for _, sats in outputs)
+    fixed_vsize = TRANSACTION_OVERHEAD_VSIZE + sum(output_vsize(address) for address, _ in outputs)
+    change_vsize = output_vsize(change_address)
+    cost_of_change = fee_for(change_vsize, fee_rate) + \
+        fee_for(INPUT_VSIZE.get(address_type(change_address), DEFAULT_INPUT_VSIZE), long_term_fee_rate)
+    total = sum(utxo.sats for utxo in selected)
+    vsize = fixed_vsize + sum(utxo.vsize for utxo in selected)
+    change = total - payment - fee_for(vsize + change_vsize, fee_rate)
+    input_waste = sum(utxo.vsize for utxo in selected) * (fee_rate - long_term_fee_rate)
+    if change >= DUST_LIMIT:
+        vsize += change_vsize
+        waste = input_waste + cost_of_change
+    else:
+        # Change below the dust limit is left to the fee
+        change = 0
+        waste = input_waste + total - payment - fee_for(vsize, fee_rate)
+    fee = total - payment - change
+    if fee < fee_for(vsize, fee_rate):
+        raise ValueError("Not enough funds for the payment!")
+    return Selection(selected, payment, fee, change, vsize, waste, algorithm)
@@ -0,0 +1,17 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Puts the block explorer on the import path. The RPC client, script and
+transaction decoding and the instrumentation are shared with it, import this
+module before any of them.
+"""
+
+import os
+import sys
+
+EXPLORER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "M3", "BlockExplorer")
+
+if EXPLORER_PATH not in sys.path:
+    sys.path.append(EXPLORER_PATH)
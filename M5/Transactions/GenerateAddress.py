@@ -4,12 +4,16 @@ m5-uppgift-P2-wallet-tx-python
 BBT200
 """
 
+from BatchKeys import create_keys
 from PrivateKey import CoinKey
+from VanitySearch import VanityPattern, describe, search
 
 ACTION_CHOICES = {
     1: "Create key safe",
     2: "Create key by seed",
     3: "Set key by value",
+    4: "Create keys in bulk",
+    5: "Search vanity address",
     0: "Exit program"
 }
 
@@ -66,11 +70,51 @@ def set_key_by_value():
     return True
 
 
+def create_keys_in_bulk():
+    count = None
+    while count is None:
+        print("Enter number of keys:")
+        try:
+            count = int(input())
+        except ValueError:
+            print("Enter a valid integer count!")
+    print("Enter output file (.jsonl or .csv):")
+    path = input()
+    output_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+    written = create_keys(path, count, output_format=output_format)
+    print(f"Wrote {written} keys to {path}")
+    return True
+
+
+def search_vanity_address():
+    pattern = None
+    while pattern is None:
+        print("Enter address prefix (1..., 3... or bc1q...):")
+        prefix = input()
+        print("Ignore case? (y/n):")
+        ignore_case = input().strip().lower() == "y"
+        try:
+            pattern = VanityPattern(prefix, ignore_case)
+        except ValueError as error:
+            print(error)
+    print(describe(pattern))
+    try:
+        key = search(pattern)
+    except KeyboardInterrupt:
+        print("\nSearch stopped")
+        return True
+    print(f"Found {pattern.get_address(key)}")
+    _print_key_info(key)
+    return True
+
+
 def _system_loop():
     actions = {
         1: create_safe_key,
         2: create_key_by_seed,
         3: set_key_by_value,
+        4: create_keys_in_bulk,
+        5: search_vanity_address,
         0: end_program
     }
     print("*" * 64)
@@ -0,0 +1,276 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Local building and signing of legacy and segwit v0 transactions, so private
+keys never leave this machine and only sendrawtransaction goes to the node.
+Legacy inputs use the original sighash, P2WPKH and P2SH-P2WPKH inputs the
+BIP143 one. Signatures are deterministic (RFC6979) with low S.
+"""
+
+import hashlib
+import itertools
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from pycoin.contrib import segwit_addr
+from pycoin.ecdsa.rfc6979 import deterministic_generate_k
+
+from PrivateKey import CoinKey
+from Secp256k1 import N, multiply_generator
+
+SIGHASH_ALL = 1
+DEFAULT_SEQUENCE = 0xfffffffd
+SIGN_CHUNK_SIZE = 64
+
+P2PKH_VERSIONS = {0x00, 0x6f}
+P2SH_VERSIONS = {0x05, 0xc4}
+SEGWIT_HRPS = ("bc", "tb", "bcrt")
+
+OP_DUP = b"\x76"
+OP_HASH160 = b"\xa9"
+OP_EQUAL = b"\x87"
+OP_EQUALVERIFY = b"\x88"
+OP_CHECKSIG = b"\xac"
+
+
+def _double_sha256(data: bytes):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def _varint(value: int):
+    if value < 0xfd:
+        return bytes([value])
+    if value <= 0xffff:
+        return b"\xfd" + struct.pack("<H", value)
+    if value <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", value)
+    return b"\xff" + struct.pack("<Q", value)
+
+
+def _push(data: bytes):
+    # Only short pushes are needed for signatures, keys and hashes
+    if len(data) >= 0x4c:
+        raise ValueError("Push too long for a single byte length!")
+    return bytes([len(data)]) + data
+
+
+def p2pkh_script(hash160: bytes):
+    return OP_DUP + OP_HASH160 + _push(hash160) + OP_EQUALVERIFY + OP_CHECKSIG
+
+
+def p2sh_script(hash160: bytes):
+    return OP_HASH160 + _push(hash160) + OP_EQUAL
+
+
+def p2wpkh_script(hash160: bytes):
+    return b"\x00" + _push(hash160)
+
+
+def address_to_script(address: str):
+    for hrp in SEGWIT_HRPS:
+        if address.lower().startswith(hrp + "1"):
+            version, program = segwit_addr.decode(hrp, address)
+            if version is None:
+                break
+            return bytes([0x50 + version if version else 0]) + _push(bytes(program))
+    data = CoinKey._read_base58_with_checksum(address)
+    if len(data) == 21 and data[0] in P2PKH_VERSIONS:
+        return p2pkh_script(data[1:])
+    if len(data) == 21 and data[0] in P2SH_VERSIONS:
+        return p2sh_script(data[1:])
+    raise ValueError(f"Unknown address format {address}!")
+
+
+def _der_integer(value: int):
+    data = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    if data[0] & 0x80:
+        data = b"\x00" + data
+    return b"\x02" + bytes([len(data)]) + data
+
+
+def sign_digest(private_key: int, digest: bytes):
+    # DER encoded ECDSA signature with a low S value
+    value = int.from_bytes(digest, "big")
+    k = deterministic_generate_k(N, private_key, value)
+    r = multiply_generator(k)[0] % N
+    s = pow(k, -1, N) * (value + r * private_key) % N
+    if r == 0 or s == 0:
+        raise ValueError("Invalid signature nonce!")
+    if s > N // 2:
+        s = N - s
+    body = _der_integer(r) + _der_integer(s)
+    return b"\x30" + bytes([len(body)]) + body
+
+
+class KeyRing:
+    # Finds the key and the kind of spend for a scriptPubKey
+
+    def __init__(self, keys=()):
+        self.scripts = {}
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: CoinKey):
+        key.generate_public_key()
+        compressed = key.get_compressed_bytes()
+        uncompressed = key.get_uncompressed_bytes()
+        com_hash160 = key.get_compressed_hash160()
+        self.scripts[p2pkh_script(com_hash160)] = (key, "p2pkh", compressed)
+        self.scripts[p2pkh_script(key.get_uncompressed_hash160())] = (key, "p2pkh", uncompressed)
+        self.scripts[_push(compressed) + OP_CHECKSIG] = (key, "p2pk", compressed)
+        self.scripts[_push(uncompressed) + OP_CHECKSIG] = (key, "p2pk", uncompressed)
+        self.scripts[p2wpkh_script(com_hash160)] = (key, "p2wpkh", compressed)
+        self.scripts[p2sh_script(CoinKey._hash160(p2wpkh_script(com_hash160)))] = (key, "p2sh-p2wpkh", compressed)
+
+    @classmethod
+    def from_wifs(cls, wifs):
+        keys = []
+        for wif in wifs:
+            key = CoinKey()
+            key.set_private_from_wif(wif)
+            keys.append(key)
+        return cls(keys)
+
+    def find(self, script_pub_key: bytes):
+        return self.scripts.get(script_pub_key)
+
+
+class TxInput:
+    __slots__ = ("txid", "vout", "sats", "script_pub_key", "sequence", "script_sig", "witness")
+
+    def __init__(self, txid: str, vout: int, sats: int, script_pub_key: bytes, sequence: int = DEFAULT_SEQUENCE):
+        self.txid = txid
+        self.vout = vout
+        self.sats = sats
+        self.script_pub_key = script_pub_key
+        self.sequence = sequence
+        self.script_sig = b""
+        self.witness = []
+
+    def outpoint(self):
+        return bytes.fromhex(self.txid)[::-1] + struct.pack("<I", self.vout)
+
+
+class TxOutput:
+    __slots__ = ("sats", "script_pub_key")
+
+    def __init__(self, sats: int, script_pub_key: bytes):
+        self.sats = sats
+        self.script_pub_key = script_pub_key
+
+    @classmethod
+    def to_address(cls, address: str, sats: int):
+        return cls(sats, address_to_script(address))
+
+    def serialize(self):
+        return struct.pack("<q", self.sats) + _varint(len(self.script_pub_key)) + self.script_pub_key
+
+
+class LocalTransaction:
+    def __init__(self, inputs=None, outputs=None, version: int = 2, locktime: int = 0):
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.version = version
+        self.locktime = locktime
+
+    def has_witness(self):
+        return any(tx_input.witness for tx_input in self.inputs)
+
+    def serialize(self, include_witness: bool = True):
+        segwit = include_witness and self.has_witness()
+        parts = [struct.pack("<i", self.version)]
+        if segwit:
+            parts.append(b"\x00\x01")
+        parts.append(_varint(len(self.inputs)))
+        for tx_input in self.inputs:
+            parts += [tx_input.outpoint(), _varint(len(tx_input.script_sig)), tx_input.script_sig,
+                      struct.pack("<I", tx_input.sequence)]
+        parts.append(_varint(len(self.outputs)))
+        parts += [tx_output.serialize() for tx_output in self.outputs]
+        if segwit:
+            for tx_input in self.inputs:
+                parts.append(_varint(len(tx_input.witness)))
+                parts += [_varint(len(item)) + item for item in tx_input.witness]
+        parts.append(struct.pack("<I", self.locktime))
+        return b"".join(parts)
+
+    def hex(self):
+        return self.serialize().hex()
+
+    def txid(self):
+        return _double_sha256(self.serialize(False))[::-1].hex()
+
+    def legacy_sighash(self, index: int, script_code: bytes, hashtype: int = SIGHASH_ALL):
+        parts = [struct.pack("<i", self.version), _varint(len(self.inputs))]
+        for number, tx_input in enumerate(self.inputs):
+            script = script_code if number == index else b""
+            parts += [tx_input.outpoint(), _varint(len(script)), script, struct.pack("<I", tx_input.sequence)]
+        parts.append(_varint(len(self.outputs)))
+        parts += [tx_output.serialize() for tx_output in self.outputs]
+        parts.append(struct.pack("<II", self.locktime, hashtype))
+        return _double_sha256(b"".join(parts))
+
+    def segwit_hashes(self):
+        # hashPrevouts, hashSequence and hashOutputs are the same for every input with SIGHASH_ALL
+        return (_double_sha256(b"".join(tx_input.outpoint() for tx_input in self.inputs)),
+                _double_sha256(b"".join(struct.pack("<I", tx_input.sequence) for tx_input in self.inputs)),
+                _double_sha256(b"".join(tx_output.serialize() for tx_output in self.outputs)))
+
+    def segwit_sighash(self, index: int, script_code: bytes, sats: int, hashtype: int = SIGHASH_ALL,
+                       hashes=None):
+        # BIP143
+        hash_prevouts, hash_sequence, hash_outputs = hashes or self.segwit_hashes()
+        tx_input = self.inputs[index]
+        return _double_sha256(b"".join([
+            struct.pack("<i", self.version), hash_prevouts, hash_sequence, tx_input.outpoint(),
+            _varint(len(script_code)), script_code, struct.pack("<qI", sats, tx_input.sequence),
+            hash_outputs, struct.pack("<II", self.locktime, hashtype)
+        ]))
+
+    def sign(self, key_ring: KeyRing):
+        hashes = None
+        for index, tx_input in enumerate(self.inputs):
+            found = key_ring.find(tx_input.script_pub_key)
+            if found is None:
+                raise ValueError(f"No key for input {index} spending {tx_input.txid}:{tx_input.vout}!")
+            key, kind, public_key = found
+            if kind in ("p2pkh", "p2pk"):
+                digest = self.legacy_sighash(index, tx_input.script_pub_key)
+                signature = sign_digest(key.private_key, digest) + bytes([SIGHASH_ALL])
+                tx_input.script_sig = _push(signature) + (_push(public_key) if kind == "p2pkh" else b"")
+                continue
+            hashes = hashes or self.segwit_hashes()
+            # The P2WPKH script code is the matching P2PKH script
+            script_code = p2pkh_script(CoinKey._hash160(public_key))
+            digest = self.segwit_sighash(index, script_code, tx_input.sats, SIGHASH_ALL, hashes)
+            tx_input.witness = [sign_digest(key.private_key, digest) + bytes([SIGHASH_ALL]), public_key]
+            if kind == "p2sh-p2wpkh":
+                tx_input.script_sig = _push(p2wpkh_script(CoinKey._hash160(public_key)))
+        return self
+
+
+_worker_key_ring = None
+
+
+def _init_sign_worker(wifs):
+    global _worker_key_ring
+    _worker_key_ring = KeyRing.from_wifs(wifs)
+
+
+def _sign_chunk(transactions):
+    return [transaction.sign(_worker_key_ring).hex() for transaction in transactions]
+
+
+def sign_transactions(transactions, wifs, workers: int = None, chunk_size: int = SIGN_CHUNK_SIZE):
+    # Signed hex for every transaction in input order, small jobs are signed in this process
+    transactions = list(transactions)
+    if len(transactions) <= chunk_size:
+        key_ring = KeyRing.from_wifs(wifs)
+        return [transaction.sign(key_ring).hex() for transaction in transactions]
+    chunks = [transactions[start:start + chunk_size] for start in range(0, len(transactions), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_sign_worker,
+                             initargs=(list(wifs),)) as executor:
+        return list(itertools.chain.from_iterable(executor.map(_sign_chunk, chunks)))
@@ -4,18 +4,22 @@ m5-uppgift-P2-wallet-tx-python
 BBT200
 """
 
-import binascii
 import hashlib
 import secrets
 import random
 
 from pycoin.ecdsa.secp256k1 import secp256k1_generator as secpGen
 from pycoin.ecdsa.secp256k1 import _r
-from pycoin.encoding import b58
 from pycoin.contrib import segwit_addr
 
+from Secp256k1 import iter_generator_range, multiply_generator
+
 GENERATOR = secpGen
 
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+# Two base58 digits per division step
+BASE58_PAIRS = [first + second for first in BASE58_ALPHABET for second in BASE58_ALPHABET]
+
 
 class ElipsisPoint:
     x: int
@@ -26,30 +30,30 @@ class ElipsisPoint:
         self.y = y
 
     def _get_sec(self, value):
-        return "%064x" % value
+        return value.to_bytes(32, "big")
 
     def get_sec_x(self):
-        return self._get_sec(self.x)
+        return self._get_sec(self.x).hex()
 
     def get_sec_y(self):
-        return self._get_sec(self.y)
+        return self._get_sec(self.y).hex()
 
     def get_uncompressed(self):
-        x = self.get_sec_x()
-        y = self.get_sec_y()
-        uncompressed = "04" + x + y
-        return uncompressed
+        return self.get_uncompressed_bytes().hex()
 
     def get_compressed(self):
-        if self.y % 2 == 0:
-            prefix = "02"
-        else:
-            prefix = "03"
-        compressed = prefix + self.get_sec_x()
-        return compressed
+        return self.get_compressed_bytes().hex()
+
+    def get_uncompressed_bytes(self):
+        return b"\x04" + self._get_sec(self.x) + self._get_sec(self.y)
+
+    def get_compressed_bytes(self):
+        prefix = b"\x03" if self.y & 1 else b"\x02"
+        return prefix + self._get_sec(self.x)
 
 
 class CoinKey:
+    # Keys, hashes and address payloads are kept as bytes, hex is only produced for display
 
     def __init__(self):
         self.private_key = None
@@ -68,20 +72,62 @@ class CoinKey:
 
     # Double sha256 function, taken from https://colab.research.google.com/drive/1Eb4bNE8HU9sULhEqEXCWwuQ9UkG-xsm4
     @classmethod
-    def _double_sha256(cls, value):
-        return hashlib.sha256(hashlib.sha256(binascii.unhexlify(value)).digest()).hexdigest()
+    def _double_sha256(cls, value: bytes):
+        return hashlib.sha256(hashlib.sha256(value).digest()).digest()
 
     # Hash160 function, taken from https://colab.research.google.com/drive/1Eb4bNE8HU9sULhEqEXCWwuQ9UkG-xsm4
     @classmethod
-    def _hash160(cls, value):
-        return hashlib.new('ripemd160', hashlib.sha256(binascii.unhexlify(value)).digest()).hexdigest()
+    def _hash160(cls, value: bytes):
+        return hashlib.new('ripemd160', hashlib.sha256(value).digest()).digest()
+
+    @classmethod
+    def _base58_encode(cls, data: bytes):
+        value = int.from_bytes(data, "big")
+        digits = []
+        while value:
+            value, remainder = divmod(value, 58 * 58)
+            digits.append(BASE58_PAIRS[remainder])
+        encoded = "".join(reversed(digits)).lstrip("1")
+        leading_zeros = len(data) - len(data.lstrip(b"\x00"))
+        return "1" * leading_zeros + encoded
+
+    @classmethod
+    def _create_base58_with_checksum(cls, data: bytes):
+        checksum = CoinKey._double_sha256(data)[:4]
+        return CoinKey._base58_encode(data + checksum)
+
+    @classmethod
+    def _base58_decode(cls, encoded: str):
+        value = 0
+        for char in encoded:
+            digit = BASE58_ALPHABET.find(char)
+            if digit < 0:
+                raise ValueError(f"Character {char} is not valid base58!")
+            value = value * 58 + digit
+        leading_zeros = len(encoded) - len(encoded.lstrip("1"))
+        return b"\x00" * leading_zeros + value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+    @classmethod
+    def _read_base58_with_checksum(cls, encoded: str):
+        data = CoinKey._base58_decode(encoded)
+        if len(data) < 5 or CoinKey._double_sha256(data[:-4])[:4] != data[-4:]:
+            raise ValueError(f"Invalid checksum in {encoded}!")
+        return data[:-4]
+
+    @classmethod
+    def _prefix_bytes(cls, prefix):
+        # Address prefixes are accepted as hex strings ("00") or bytes
+        return bytes.fromhex(prefix) if isinstance(prefix, str) else prefix
 
     @classmethod
-    def _create_base58_with_checksum(cls, data):
-        checksum = CoinKey._double_sha256(data)[:8]
-        return_data = data + checksum
-        return_data = b58.b2a_base58(binascii.unhexlify(return_data))
-        return return_data
+    def iter_hash160_range(cls, start: int, count: int, batch_size: int = 1024):
+        # Walks the private keys start .. start + count - 1 with one point addition per key,
+        # yields (private key, compressed hash160, uncompressed hash160) as bytes
+        for private_key, (x, y) in iter_generator_range(start, count, batch_size):
+            point = ElipsisPoint(x, y)
+            yield private_key, \
+                CoinKey._hash160(point.get_compressed_bytes()), \
+                CoinKey._hash160(point.get_uncompressed_bytes())
 
     def generate_private_safe(self):
         cryptsafe_gen = secrets.SystemRandom()
@@ -93,11 +139,24 @@ class CoinKey:
         else:
             raise ValueError(f"Private key {value} larger than max {_r}!")
 
+    def set_private_from_wif(self, wif: str):
+        # Returns True if the WIF is for the compressed public key
+        data = CoinKey._read_base58_with_checksum(wif)
+        if data[0] not in (0x80, 0xef) or len(data) not in (33, 34) or (len(data) == 34 and data[33] != 1):
+            raise ValueError(f"{wif} is not a WIF private key!")
+        self.set_private(int.from_bytes(data[1:33], "big"))
+        return len(data) == 34
+
     def get_private_hex(self):
         if self.private_hex is None:
             self.private_hex = hex(self.private_key)
         return self.private_hex
 
+    def get_private_bytes(self):
+        if self.private_key is None:
+            raise ValueError("No private key set!")
+        return self.private_key.to_bytes(32, "big")
+
     def generate_private_with_seed(self, seed):
         random.seed(seed)
         self.private_key = random.randrange(0, _r)
@@ -106,42 +165,57 @@ class CoinKey:
         if self.public_key_point is None or regenerate:
             if self.private_key is None:
                 raise ValueError("Can not generate public key without private key!")
-            (x, y) = self.private_key * generator
+            if generator is GENERATOR:
+                (x, y) = multiply_generator(self.private_key)
+            else:
+                (x, y) = self.private_key * generator
             self.public_key_point = ElipsisPoint(x, y)
 
-    def get_uncompressed(self):
+    def get_uncompressed_bytes(self):
         if self.uncompressed is None:
             if self.public_key_point is None:
                 raise ValueError("Public key not generated!")
-            self.uncompressed = self.public_key_point.get_uncompressed()
+            self.uncompressed = self.public_key_point.get_uncompressed_bytes()
         return self.uncompressed
 
-    def get_compressed(self):
+    def get_compressed_bytes(self):
         if self.compressed is None:
             if self.public_key_point is None:
                 raise ValueError("Public key not generated!")
-            self.compressed = self.public_key_point.get_compressed()
+            self.compressed = self.public_key_point.get_compressed_bytes()
         return self.compressed
 
-    def get_uncompressed_hash160_address(self):
+    def get_uncompressed(self):
+        return self.get_uncompressed_bytes().hex()
+
+    def get_compressed(self):
+        return self.get_compressed_bytes().hex()
+
+    def get_uncompressed_hash160(self):
         if self.uncom_hash160 is None:
-            self.uncom_hash160 = CoinKey._hash160(self.get_uncompressed())
+            self.uncom_hash160 = CoinKey._hash160(self.get_uncompressed_bytes())
         return self.uncom_hash160
 
-    def get_compressed_hash160_address(self):
+    def get_compressed_hash160(self):
         if self.com_hash160 is None:
-            self.com_hash160 = CoinKey._hash160(self.get_compressed())
+            self.com_hash160 = CoinKey._hash160(self.get_compressed_bytes())
         return self.com_hash160
 
-    def get_uncompressed_bitcoin_address(self, prefix: str):
+    def get_uncompressed_hash160_address(self):
+        return self.get_uncompressed_hash160().hex()
+
+    def get_compressed_hash160_address(self):
+        return self.get_compressed_hash160().hex()
+
+    def get_uncompressed_bitcoin_address(self, prefix):
         if self.uncom_bitcoin is None:
-            data = prefix + self.get_uncompressed_hash160_address()
+            data = CoinKey._prefix_bytes(prefix) + self.get_uncompressed_hash160()
             self.uncom_bitcoin = CoinKey._create_base58_with_checksum(data)
         return self.uncom_bitcoin
 
-    def get_compressed_bitcoin_address(self, prefix: str):
+    def get_compressed_bitcoin_address(self, prefix):
         if self.com_bitcoin is None:
-            data = prefix + self.get_compressed_hash160_address()
+            data = CoinKey._prefix_bytes(prefix) + self.get_compressed_hash160()
             self.com_bitcoin = CoinKey._create_base58_with_checksum(data)
         return self.com_bitcoin
 
@@ -149,9 +223,7 @@ class CoinKey:
         if self.private_key is None:
             raise ValueError("Can not get WIF format without private key!")
         if self.com_wif is None:
-            hex_key = "%064x" % self.private_key
-            suffix = "01"
-            data = "80" + hex_key + suffix
+            data = b"\x80" + self.get_private_bytes() + b"\x01"
             self.com_wif = CoinKey._create_base58_with_checksum(data)
         return self.com_wif
 
@@ -159,25 +231,21 @@ class CoinKey:
         if self.private_key is None:
             raise ValueError("Can not get WIF format without private key!")
         if self.uncom_wif is None:
-            hex_key = "%064x" % self.private_key
-            data = "80" + hex_key
+            data = b"\x80" + self.get_private_bytes()
             self.uncom_wif = CoinKey._create_base58_with_checksum(data)
         return self.uncom_wif
 
     def get_p2sh_segwit(self):
         if self.segwit_p2sh is None:
-            compressed = self.get_compressed_hash160_address()
-            with_signature = "0014" + compressed
-            hashed_signature = CoinKey._hash160(with_signature)
-            data = "05" + hashed_signature
+            with_signature = b"\x00\x14" + self.get_compressed_hash160()
+            data = b"\x05" + CoinKey._hash160(with_signature)
             self.segwit_p2sh = CoinKey._create_base58_with_checksum(data)
         return self.segwit_p2sh
 
     def get_p2wpkh_segwit(self, witness_version: int):
         if self.segwit_p2wpkh is None:
-            compressed = self.get_compressed_hash160_address()
             prefix = "bc"
-            self.segwit_p2wpkh = segwit_addr.encode(prefix, witness_version, binascii.unhexlify(compressed))
+            self.segwit_p2wpkh = segwit_addr.encode(prefix, witness_version, self.get_compressed_hash160())
         return self.segwit_p2wpkh
 
     def __str__(self):
@@ -0,0 +1,229 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Fast multiplication by the secp256k1 generator G. Uses a table with every
+multiple d * 2^(8i) * G (d = 1..255) so k * G is at most 32 mixed additions in
+Jacobian coordinates and no doublings. Affine normalization of many points
+shares a single field inversion (Montgomery's trick).
+"""
+
+import os
+
+P = 0xfffffffffffffffffffffffffffffffffffffffffffffffffffffffefffffc2f
+N = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
+GX = 0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798
+GY = 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
+
+WINDOW_BITS = 8
+WINDOWS = 256 // WINDOW_BITS
+WINDOW_SIZE = (1 << WINDOW_BITS) - 1
+WINDOW_MASK = WINDOW_SIZE
+
+# Set to a file path to store the table after the first build and load it on later runs
+TABLE_CACHE = os.environ.get("SECP256K1_TABLE_CACHE")
+
+INFINITY = (0, 1, 0)
+
+_table = None
+
+
+def jacobian_double(point):
+    x, y, z = point
+    if z == 0 or y == 0:
+        return INFINITY
+    a = x * x % P
+    b = y * y % P
+    c = b * b % P
+    d = 2 * ((x + b) * (x + b) - a - c) % P
+    e = 3 * a % P
+    f = e * e % P
+    x3 = (f - 2 * d) % P
+    y3 = (e * (d - x3) - 8 * c) % P
+    z3 = 2 * y * z % P
+    return x3, y3, z3
+
+
+def jacobian_add_affine(point, affine):
+    x1, y1, z1 = point
+    x2, y2 = affine
+    if z1 == 0:
+        return x2, y2, 1
+    z1z1 = z1 * z1 % P
+    u2 = x2 * z1z1 % P
+    s2 = y2 * z1 * z1z1 % P
+    h = (u2 - x1) % P
+    r = (s2 - y1) % P
+    if h == 0:
+        if r == 0:
+            return jacobian_double(point)
+        return INFINITY
+    hh = h * h % P
+    hhh = h * hh % P
+    v = x1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - y1 * hhh) % P
+    z3 = z1 * h % P
+    return x3, y3, z3
+
+
+def batch_inverse(values):
+    # Inverts every value mod P with one modular inversion
+    prefix = []
+    accumulator = 1
+    for value in values:
+        prefix.append(accumulator)
+        accumulator = accumulator * value % P
+    inverse = pow(accumulator, -1, P)
+    inverses = [0] * len(values)
+    for index in range(len(values) - 1, -1, -1):
+        inverses[index] = inverse * prefix[index] % P
+        inverse = inverse * values[index] % P
+    return inverses
+
+
+def to_affine_batch(points):
+    # None for the point at infinity
+    finite = [index for index, point in enumerate(points) if point[2] != 0]
+    inverses = batch_inverse([points[index][2] for index in finite])
+    affine = [None] * len(points)
+    for index, z_inverse in zip(finite, inverses):
+        x, y, _ = points[index]
+        z_inverse2 = z_inverse * z_inverse % P
+        affine[index] = (x * z_inverse2 % P, y * z_inverse2 * z_inverse % P)
+    return affine
+
+
+def to_affine(point):
+    return to_affine_batch([point])[0]
+
+
+def _build_table():
+    table = []
+    base = (GX, GY)
+    for _ in range(WINDOWS):
+        multiples = []
+        accumulator = INFINITY
+        for _ in range(WINDOW_SIZE + 1):
+            accumulator = jacobian_add_affine(accumulator, base)
+            multiples.append(accumulator)
+        affine = to_affine_batch(multiples)
+        table.append(affine[:WINDOW_SIZE])
+        # 256 * base starts the next window
+        base = affine[WINDOW_SIZE]
+    return table
+
+
+def _save_table(table, path: str):
+    with open(path, "wb") as file:
+        for window in table:
+            for x, y in window:
+                file.write(x.to_bytes(32, "big") + y.to_bytes(32, "big"))
+
+
+def _load_table(path: str):
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) != WINDOWS * WINDOW_SIZE * 64:
+        return None
+    table = []
+    for window in range(WINDOWS):
+        points = []
+        for number in range(WINDOW_SIZE):
+            offset = (window * WINDOW_SIZE + number) * 64
+            points.append((int.from_bytes(data[offset:offset + 32], "big"),
+                           int.from_bytes(data[offset + 32:offset + 64], "big")))
+        table.append(points)
+    # Cheap sanity check that the file holds this table
+    if table[0][0] != (GX, GY) or table[0][1] != to_affine(jacobian_double((GX, GY, 1))):
+        return None
+    return table
+
+
+def get_table():
+    global _table
+    if _table is None:
+        table = None
+        if TABLE_CACHE and os.path.exists(TABLE_CACHE):
+            table = _load_table(TABLE_CACHE)
+        if table is None:
+            table = _build_table()
+            if TABLE_CACHE:
+                _save_table(table, TABLE_CACHE)
+        _table = table
+    return _table
+
+
+def multiply_generator_jacobian(scalar: int):
+    table = get_table()
+    scalar %= N
+    accumulator = INFINITY
+    window = 0
+    while scalar:
+        digit = scalar & WINDOW_MASK
+        if digit:
+            accumulator = jacobian_add_affine(accumulator, table[window][digit - 1])
+        scalar >>= WINDOW_BITS
+        window += 1
+    return accumulator
+
+
+def multiply_generator(scalar: int):
+    point = to_affine(multiply_generator_jacobian(scalar))
+    if point is None:
+        raise ValueError("Scalar is a multiple of the group order!")
+    return point
+
+
+def multiply_generator_batch(scalars):
+    return to_affine_batch([multiply_generator_jacobian(scalar) for scalar in scalars])
+
+
+_range_offsets = {}
+
+
+def _get_range_offsets(batch_size: int):
+    # Affine j * G for j = 1..batch_size
+    if batch_size not in _range_offsets:
+        multiples = []
+        accumulator = INFINITY
+        for _ in range(batch_size):
+            accumulator = jacobian_add_affine(accumulator, (GX, GY))
+            multiples.append(accumulator)
+        _range_offsets[batch_size] = to_affine_batch(multiples)
+    return _range_offsets[batch_size]
+
+
+def iter_generator_range(start: int, count: int, batch_size: int = 1024):
+    # Yields (k, (x, y)) for k = start .. start + count - 1. Every point after the first one
+    # costs a single affine addition, the field inversions of a batch are shared.
+    if count <= 0:
+        return
+    if not 0 < start or start + count - 1 >= N:
+        raise ValueError(f"Range [{start}, {start + count}) must stay inside [1, N)!")
+    offsets = _get_range_offsets(batch_size)
+    base_x, base_y = multiply_generator(start)
+    yield start, (base_x, base_y)
+    key = start
+    remaining = count - 1
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        denominators = [(offsets[number][0] - base_x) % P for number in range(size)]
+        # Only possible when the range starts right next to the group order or zero
+        special = [number for number, denominator in enumerate(denominators) if denominator == 0]
+        for number in special:
+            denominators[number] = 1
+        inverses = batch_inverse(denominators)
+        for number in range(size):
+            if special and number in special:
+                x3, y3 = multiply_generator(key + number + 1)
+            else:
+                offset_x, offset_y = offsets[number]
+                slope = (offset_y - base_y) * inverses[number] % P
+                x3 = (slope * slope - base_x - offset_x) % P
+                y3 = (slope * (base_x - x3) - base_y) % P
+            yield key + number + 1, (x3, y3)
+        base_x, base_y = x3, y3
+        key += size
+        remaining -= size
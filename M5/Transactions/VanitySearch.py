@@ -0,0 +1,296 @@
+"""
+Linus Eriksson
+m5-uppgift-P2-wallet-tx-python
+BBT200
+
+Vanity address search over all cores. A prefix is turned into the hash160
+ranges whose addresses start with it, so the workers only compare integers
+and Base58 is done for the rare candidates. Every worker walks a random key
+range with one point addition per key.
+
+    python VanitySearch.py 1Love
+    python VanitySearch.py 1love --ignore-case --workers 4
+    python VanitySearch.py 3Fun
+    python VanitySearch.py bc1qcat
+"""
+
+import argparse
+import bisect
+import hashlib
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import secrets
+import time
+
+from PrivateKey import BASE58_ALPHABET, CoinKey
+from Secp256k1 import N, get_table, iter_generator_range
+
+BECH32_ALPHABET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+P2WPKH_PREFIX = "bc1q"
+# Keys walked from one random start before a worker picks a new one
+SEGMENT_SIZE = 1 << 20
+REPORT_INTERVAL = 4096
+MAX_CASE_VARIANTS = 1 << 16
+
+PAYLOAD_SPACE = 1 << 192
+HASH160_SPACE = 1 << 160
+
+
+def _base58_value(digits: str):
+    value = 0
+    for char in digits:
+        value = value * 58 + BASE58_ALPHABET.index(char)
+    return value
+
+
+def _case_variants(prefix: str):
+    options = []
+    for char in prefix:
+        choices = sorted({variant for variant in (char.lower(), char.upper()) if variant in BASE58_ALPHABET})
+        if not choices:
+            raise ValueError(f"Character {char} can not appear in a Base58 address!")
+        options.append(choices)
+    if math.prod(len(choices) for choices in options) > MAX_CASE_VARIANTS:
+        raise ValueError("Too many case variants, use a shorter prefix!")
+    return ["".join(variant) for variant in itertools.product(*options)]
+
+
+def _base58_payload_ranges(prefix: str, version: int):
+    # Inclusive ranges of the 24 byte hash160 + checksum number that encode to the prefix
+    if version == 0:
+        ones = len(prefix) - len(prefix.lstrip("1"))
+        rest = prefix[ones:]
+        if ones == 0:
+            return []
+        # Every leading zero byte, the version byte included, becomes a "1"
+        upper = 256 ** (25 - ones) - 1
+        if not rest:
+            return [(0, upper)]
+        bounds = (256 ** (24 - ones), upper)
+        offset = 0
+    else:
+        rest = prefix
+        offset = version * PAYLOAD_SPACE
+        bounds = (offset, offset + PAYLOAD_SPACE - 1)
+    if rest[0] == "1":
+        return []
+    value = _base58_value(rest)
+    ranges = []
+    length = len(rest)
+    while 58 ** (length - 1) <= bounds[1]:
+        scale = 58 ** (length - len(rest))
+        low = max(value * scale, bounds[0])
+        high = min((value + 1) * scale - 1, bounds[1])
+        if low <= high:
+            ranges.append((low - offset, high - offset))
+        length += 1
+    return ranges
+
+
+def _merge(ranges):
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+class VanityPattern:
+    def __init__(self, prefix: str, ignore_case: bool = False, compressed: bool = True):
+        self.prefix = prefix
+        self.ignore_case = ignore_case
+        self.compressed = compressed
+        if prefix.lower().startswith(P2WPKH_PREFIX):
+            self.kind = "p2wpkh"
+            self.prefix = prefix.lower()
+            hash_ranges, probability = self._bech32_ranges(self.prefix[len(P2WPKH_PREFIX):])
+        elif prefix.startswith("1"):
+            self.kind = "p2pkh"
+            hash_ranges, probability = self._base58_ranges(0)
+        elif prefix.startswith("3"):
+            self.kind = "p2sh"
+            hash_ranges, probability = self._base58_ranges(5)
+        else:
+            raise ValueError(f"Prefix {prefix} must start with 1, 3 or {P2WPKH_PREFIX}!")
+        if self.kind != "p2pkh" and not compressed:
+            raise ValueError("Segwit addresses need a compressed public key!")
+        if not hash_ranges:
+            raise ValueError(f"No address can start with {prefix}!")
+        self.lows = [low for low, _ in hash_ranges]
+        self.highs = [high for _, high in hash_ranges]
+        self.difficulty = 1 / probability
+
+    def _base58_ranges(self, version: int):
+        variants = _case_variants(self.prefix) if self.ignore_case else [self.prefix]
+        payload_ranges = []
+        for variant in variants:
+            for char in variant:
+                if char not in BASE58_ALPHABET:
+                    raise ValueError(f"Character {char} can not appear in a Base58 address!")
+            payload_ranges += _base58_payload_ranges(variant, version)
+        payload_ranges = _merge(payload_ranges)
+        probability = sum(high - low + 1 for low, high in payload_ranges) / PAYLOAD_SPACE
+        # The checksum is unknown until the address is encoded, candidates at the edges are checked in full
+        return _merge((low >> 32, high >> 32) for low, high in payload_ranges), probability
+
+    @staticmethod
+    def _bech32_ranges(data: str):
+        # The 20 byte program is exactly 32 characters, each one fixes five bits of the hash160
+        if len(data) > 32:
+            raise ValueError("P2WPKH prefix longer than the witness program!")
+        value = 0
+        for char in data:
+            if char not in BECH32_ALPHABET:
+                raise ValueError(f"Character {char} can not appear in a bech32 address!")
+            value = value << 5 | BECH32_ALPHABET.index(char)
+        shift = 160 - 5 * len(data)
+        return [(value << shift, ((value + 1) << shift) - 1)], 1 / 32 ** len(data)
+
+    def get_key(self, private_key: int):
+        key = CoinKey()
+        key.set_private(private_key)
+        key.generate_public_key()
+        return key
+
+    def get_address(self, key: CoinKey):
+        if self.kind == "p2wpkh":
+            return key.get_p2wpkh_segwit(0)
+        if self.kind == "p2sh":
+            return key.get_p2sh_segwit()
+        if self.compressed:
+            return key.get_compressed_bitcoin_address(b"\x00")
+        return key.get_uncompressed_bitcoin_address(b"\x00")
+
+    def matches(self, address: str):
+        if self.ignore_case:
+            return address.lower().startswith(self.prefix.lower())
+        return address.startswith(self.prefix)
+
+    def expected_keys(self, probability: float = 0.5):
+        # Keys needed to find a match with the given probability, every key matches a prefix without free characters
+        if self.difficulty <= 1:
+            return 1
+        return math.log(1 - probability) / math.log(1 - 1 / self.difficulty)
+
+
+def _search_worker(pattern: VanityPattern, stop, results):
+    lows = pattern.lows
+    highs = pattern.highs
+    compressed = pattern.compressed
+    p2sh = pattern.kind == "p2sh"
+    sha256 = hashlib.sha256
+    new_hash = hashlib.new
+    bisect_right = bisect.bisect_right
+    cryptsafe_gen = secrets.SystemRandom()
+    while not stop.is_set():
+        start = cryptsafe_gen.randrange(1, N - SEGMENT_SIZE)
+        checked = 0
+        for private_key, (x, y) in iter_generator_range(start, SEGMENT_SIZE):
+            # Same bytes as ElipsisPoint.get_compressed_bytes and CoinKey._hash160, inlined for the hot loop
+            if compressed:
+                public_key = (b"\x03" if y & 1 else b"\x02") + x.to_bytes(32, "big")
+            else:
+                public_key = b"\x04" + x.to_bytes(32, "big") + y.to_bytes(32, "big")
+            hash160 = new_hash("ripemd160", sha256(public_key).digest()).digest()
+            if p2sh:
+                hash160 = new_hash("ripemd160", sha256(b"\x00\x14" + hash160).digest()).digest()
+            value = int.from_bytes(hash160, "big")
+            index = bisect_right(lows, value) - 1
+            if index >= 0 and value <= highs[index]:
+                if pattern.matches(pattern.get_address(pattern.get_key(private_key))):
+                    results.put(("found", private_key))
+            checked += 1
+            if checked == REPORT_INTERVAL:
+                results.put(("checked", checked))
+                checked = 0
+                if stop.is_set():
+                    return
+
+
+def search(pattern: VanityPattern, workers: int = None, timeout: float = None, report=print):
+    # Returns the matching CoinKey, None on timeout
+    workers = workers or os.cpu_count()
+    # Built before the workers fork so they share it
+    get_table()
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_search_worker, args=(pattern, stop, results), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    started = time.monotonic()
+    last_report = started
+    checked = 0
+    found = None
+    try:
+        while found is None:
+            now = time.monotonic()
+            if timeout is not None and now - started > timeout:
+                break
+            try:
+                message, value = results.get(timeout=0.25)
+            except queue.Empty:
+                message, value = None, None
+            if message == "checked":
+                checked += value
+            elif message == "found":
+                found = pattern.get_key(value)
+            if report is not None and now - last_report >= 1:
+                elapsed = now - started
+                rate = checked / elapsed if elapsed else 0
+                report(f"\r{checked} keys, {rate:.0f} keys/s, "
+                       f"{min(checked / pattern.expected_keys(), 9.99):.0%} of the 50% mark", end="", flush=True)
+                last_report = now
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        results.close()
+    if report is not None:
+        report()
+    return found
+
+
+def describe(pattern: VanityPattern):
+    return f"Prefix {pattern.prefix} ({pattern.kind}{', case insensitive' if pattern.ignore_case else ''})\n" \
+           f"Difficulty: {pattern.difficulty:,.0f}\n" \
+           f"Keys for a 50% chance: {pattern.expected_keys():,.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search for an address starting with a prefix")
+    parser.add_argument("prefix", help="Base58 (1..., 3...) or bech32 (bc1q...) prefix")
+    parser.add_argument("--ignore-case", action="store_true")
+    parser.add_argument("--uncompressed", action="store_true", help="Match P2PKH of the uncompressed key")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=None, help="Give up after this many seconds")
+    args = parser.parse_args()
+
+    try:
+        pattern = VanityPattern(args.prefix, args.ignore_case, not args.uncompressed)
+    except ValueError as error:
+        print(error)
+        return
+    print(describe(pattern))
+    try:
+        key = search(pattern, args.workers, args.timeout)
+    except KeyboardInterrupt:
+        print("\nSearch stopped")
+        return
+    if key is None:
+        print("No match found before the timeout!")
+        return
+    print(f"Found {pattern.get_address(key)}")
+    print(str(key))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from BatchKeys import read_private_keys
+
+
+class ReadPrivateKeysTest(unittest.TestCase):
+    def _read(self, lines, key_format: str):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keys.txt")
+            with open(path, "w") as file:
+                file.write("\n".join(lines) + "\n")
+            return list(read_private_keys(path, key_format))
+
+    def test_keys_are_read_in_the_given_format(self):
+        decimal = "1" * 64
+        self.assertEqual(self._read([decimal, "", "12"], "int"), [int(decimal), 12])
+        self.assertEqual(self._read([decimal, "12", "0x12"], "hex"), [int(decimal, 16), 0x12, 0x12])
+
+    def test_line_in_another_format_is_rejected(self):
+        with self.assertRaises(ValueError) as raised:
+            self._read(["12", "ab"], "int")
+        self.assertIn("Line 2", str(raised.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from BatchPayout import plan_transactions
+from CoinSelection import Utxo
+
+P2WPKH_SCRIPT = "0014" + "11" * 20
+CHANGE = "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4"
+
+
+class PlanTransactionsTest(unittest.TestCase):
+    def setUp(self):
+        self.utxos = [Utxo("%064x" % number, 0, 100000, P2WPKH_SCRIPT) for number in range(1, 4)]
+
+    def test_payouts_are_planned_with_change(self):
+        payouts = [("1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2", 50000), ("3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy", 60000)]
+        planned = plan_transactions(payouts, self.utxos, 2, CHANGE)
+        self.assertEqual(len(planned), 1)
+        transaction = planned[0]
+        self.assertEqual(transaction.output_sats, 110000)
+        self.assertEqual(transaction.input_sats, transaction.output_sats + transaction.change + transaction.fee)
+        self.assertGreater(transaction.change, 0)
+
+    def test_change_address_receiving_a_payout_is_rejected_before_planning(self):
+        with self.assertRaises(ValueError):
+            plan_transactions([("1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2", 50000), (CHANGE, 1000)], self.utxos, 2, CHANGE)
+
+    def test_not_enough_funds(self):
+        with self.assertRaises(ValueError):
+            plan_transactions([("1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2", 500000)], self.utxos, 2, CHANGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import BroadcastQueue
+from BroadcastQueue import CONFIRMED, FAILED, SENT
+from RawBlock import parse_raw_transaction
+
+# The signed P2SH-P2WPKH example of BIP143
+RAW_HEX = "01000000000101db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a547701000000171600" \
+          "1479091972186c449eb1ded22b78e40d009bdf0089feffffff02b8b4eb0b000000001976a914a457b684d7f0d539" \
+          "a46a45bbc043f35b59d0d96388ac0008af2f000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c" \
+          "88ac02473044022047ac8e878352d3ebbde1c94ce3a10d057c24175747116f8288e5d794d12d482f0220217f36a4" \
+          "85cae903c713331d877c1f64677e3622ad4010726870540656fe9dcb012103ad1d8e89212f0b92c74d23bb710c00" \
+          "662ad1470198ac48c43f7d6f93a2a2687392040000"
+
+
+def _response(result=None, code: int = None, message: str = ""):
+    return {"result": result, "error": {"code": code, "message": message} if code else None, "id": 0}
+
+
+class FakeNode:
+    # A chain of blocks and a mempool, send_errors are answered to the next broadcasts
+    def __init__(self):
+        self.chain = []
+        self.blocks = {}
+        self.mempool = set()
+        self.send_errors = []
+        self.failing_polls = 0
+        self.mine("00")
+
+    def mine(self, prefix: str):
+        block = {"hash": prefix * 32, "height": len(self.chain), "tx": sorted(self.mempool)}
+        self.blocks[block["hash"]] = block
+        self.chain.append(block["hash"])
+        self.mempool.clear()
+
+    def call(self, method: str, *params):
+        if method == "sendrawtransaction":
+            if self.send_errors:
+                return _response(None, *self.send_errors.pop(0))
+            txid = parse_raw_transaction(bytes.fromhex(params[0]), include_hex=False)["txid"]
+            self.mempool.add(txid)
+            return _response(txid)
+        if method == "getblockcount":
+            if self.failing_polls:
+                self.failing_polls -= 1
+                raise KeyError("result")
+            return _response(len(self.chain) - 1)
+        if method == "getblockhash":
+            if 0 <= params[0] < len(self.chain):
+                return _response(self.chain[params[0]])
+            return _response(None, -8, "Block height out of range")
+        if method == "getblock":
+            return _response(self.blocks[params[0]])
+        if method == "getmempoolentry":
+            if params[0] in self.mempool:
+                return _response({})
+            return _response(None, -5, "Transaction not in mempool")
+        raise ValueError(f"Unexpected call {method}!")
+
+    def batch(self, calls):
+        return [self.call(method, *params) for method, params in calls]
+
+
+class BroadcastQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.node = FakeNode()
+        self.queue = BroadcastQueue.BroadcastQueue(self.node, state_path=None, rate=1000, burst=1000,
+                                                   poll_interval=0.01)
+        self.txid = self.queue.submit(RAW_HEX)
+
+    def _run(self, coroutine):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+    async def _broadcast_and_mine(self, failing_polls: int = 0):
+        # The first poll sets the height the scan starts from before anything is sent
+        await self.queue.poll()
+        self.node.failing_polls = failing_polls
+        async with self.queue:
+            await self.queue.drain()
+            status = self.queue.entries[self.txid]["status"]
+            self.node.mine("a1")
+            return status, await self.queue.wait(self.txid)
+
+    def test_sent_transaction_confirms(self):
+        status, entry = self._run(self._broadcast_and_mine())
+        self.assertEqual(status, SENT)
+        self.assertEqual(entry["status"], CONFIRMED)
+        self.assertEqual((entry["height"], entry["blockhash"]), (1, "a1" * 32))
+        self.assertEqual(self.queue.confirmations(self.txid), 1)
+
+    def test_rejected_transaction_fails(self):
+        self.node.send_errors = [(-26, "bad-txns-inputs-duplicate")]
+
+        async def broadcast():
+            async with self.queue:
+                return await self.queue.wait(self.txid)
+
+        entry = self._run(broadcast())
+        self.assertEqual(entry["status"], FAILED)
+        self.assertEqual(entry["error"], "-26: bad-txns-inputs-duplicate")
+
+    def test_transient_errors_are_retried(self):
+        self.node.send_errors = [(-28, "Loading block index"), (-25, "missing-inputs")]
+        with mock.patch.object(BroadcastQueue, "RETRY_BACKOFF", 0.01):
+            status, entry = self._run(self._broadcast_and_mine())
+        self.assertEqual(status, SENT)
+        self.assertEqual(entry["status"], CONFIRMED)
+        self.assertEqual(entry["attempts"], 3)
+
+    def test_failed_polls_do_not_stop_polling(self):
+        _, entry = self._run(self._broadcast_and_mine(failing_polls=2))
+        self.assertEqual(entry["status"], CONFIRMED)
+
+    def test_reorg_returns_a_confirmed_transaction_to_sent(self):
+        self.node.mine("a1")
+        self.queue.entries[self.txid].update(status=CONFIRMED, height=1, blockhash="b1" * 32)
+        self._run(self.queue.poll())
+        entry = self.queue.entries[self.txid]
+        self.assertEqual((entry["status"], entry["height"], entry["submitted_height"]), (SENT, None, 1))
+        self.assertEqual(self.queue.scanned_height, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from CoinSelection import Utxo, select_coins
+
+P2WPKH_SCRIPT = "0014" + "11" * 20
+PAYEE = "bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq"
+CHANGE = "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4"
+
+
+def _utxos(*amounts):
+    return [Utxo("%064x" % number, 0, sats, P2WPKH_SCRIPT) for number, sats in enumerate(amounts, 1)]
+
+
+class SelectCoinsTest(unittest.TestCase):
+    # P2WPKH inputs are 68 vbytes, overhead and one P2WPKH output 42, so at 1 sat/vbyte the target is payment + 42
+    def test_branch_and_bound_finds_an_exact_match(self):
+        utxos = _utxos(500000, 60068, 40110, 7000)
+        selection = select_coins(utxos, [(PAYEE, 100000)], 1, CHANGE, rng=random.Random(1))
+        self.assertEqual(selection.algorithm, "bnb")
+        self.assertEqual(sorted(utxo.sats for utxo in selection.inputs), [40110, 60068])
+        self.assertEqual(selection.change, 0)
+        self.assertEqual(selection.fee, selection.vsize)
+
+    def test_knapsack_when_no_exact_match_exists(self):
+        utxos = _utxos(*[30000] * 10)
+        selection = select_coins(utxos, [(PAYEE, 100000)], 1, CHANGE, rng=random.Random(1))
+        self.assertEqual(selection.algorithm, "knapsack")
+        self.assertEqual(len(selection.inputs), 6)
+        self.assertEqual(selection.change, 6 * 30000 - 100000 - selection.fee)
+        self.assertEqual(selection.fee, selection.vsize)
+
+    def test_insufficient_funds(self):
+        with self.assertRaises(ValueError):
+            select_coins(_utxos(30000, 30000), [(PAYEE, 100000)], 1, CHANGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from LocalTransaction import KeyRing, LocalTransaction, TxInput, TxOutput
+from PrivateKey import CoinKey
+
+
+def _transaction(inputs, outputs, version: int, locktime: int):
+    transaction = LocalTransaction(version=version, locktime=locktime)
+    for txid, vout, sats, script, sequence in inputs:
+        transaction.inputs.append(TxInput(txid, vout, sats, bytes.fromhex(script), sequence))
+    for sats, script in outputs:
+        transaction.outputs.append(TxOutput(sats, bytes.fromhex(script)))
+    return transaction
+
+
+def _key_ring(private_keys):
+    keys = []
+    for private_key in private_keys:
+        key = CoinKey()
+        key.set_private(int(private_key, 16))
+        keys.append(key)
+    return KeyRing(keys)
+
+
+class Bip143Test(unittest.TestCase):
+    # The native P2WPKH and P2SH-P2WPKH examples of BIP143, the first one also has a legacy P2PK input
+    def _check(self, transaction, private_keys, index: int, script_code: str, sighash: str, signed: str):
+        digest = transaction.segwit_sighash(index, bytes.fromhex(script_code), transaction.inputs[index].sats)
+        self.assertEqual(digest.hex(), sighash)
+        self.assertEqual(transaction.sign(_key_ring(private_keys)).hex(), signed)
+
+    def test_native_p2wpkh(self):
+        transaction = _transaction(
+            [("9f96ade4b41d5433f4eda31e1738ec2b36f6e7d1420d94a6af99801a88f7f7ff", 0, 625000000,
+              "2103c9f4836b9a4f77fc0d81f7bcb01b7f1b35916864b9476c241ce9fc198bd25432ac", 0xffffffee),
+             ("8ac60eb9575db5b2d987e29f301b5b819ea83a5c6579d282d189cc04b8e151ef", 1, 600000000,
+              "00141d0f172a0ecb48aee1be1f2687d2963ae33f71a1", 0xffffffff)],
+            [(112340000, "76a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac"),
+             (223450000, "76a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac")],
+            1, 17)
+        signed = "01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830" \
+                 "450221008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f928" \
+                 "1a99f2b1c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e81" \
+                 "5b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f6" \
+                 "6f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988" \
+                 "ac000247304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c" \
+                 "4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7aca" \
+                 "fcdb3566bb0ad253f62fc70f07aeee635711000000"
+        self._check(transaction,
+                    ["bbc27228ddcb9209d7fd6f36b02f7dfa6252af40bb2f1cbc7a557da8027ff866",
+                     "619c335025c7f4012e556c2a58b2506e30b8511b53ade95ea316fd8c3286feb9"],
+                    1, "76a9141d0f172a0ecb48aee1be1f2687d2963ae33f71a188ac",
+                    "c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670", signed)
+
+    def test_p2sh_p2wpkh(self):
+        transaction = _transaction(
+            [("77541aeb3c4dac9260b68f74f44c973081a9d4cb2ebe8038b2d70faa201b6bdb", 1, 1000000000,
+              "a9144733f37cf4db86fbc2efed2500b4f4e49f31202387", 0xfffffffe)],
+            [(199996600, "76a914a457b684d7f0d539a46a45bbc043f35b59d0d96388ac"),
+             (800000000, "76a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c88ac")],
+            1, 1170)
+        signed = "01000000000101db6b1b20aa0fd7b23880be2ecbd4a98130974cf4748fb66092ac4d3ceb1a547701000000171600" \
+                 "1479091972186c449eb1ded22b78e40d009bdf0089feffffff02b8b4eb0b000000001976a914a457b684d7f0d539" \
+                 "a46a45bbc043f35b59d0d96388ac0008af2f000000001976a914fd270b1ee6abcaea97fea7ad0402e8bd8ad6d77c" \
+                 "88ac02473044022047ac8e878352d3ebbde1c94ce3a10d057c24175747116f8288e5d794d12d482f0220217f36a4" \
+                 "85cae903c713331d877c1f64677e3622ad4010726870540656fe9dcb012103ad1d8e89212f0b92c74d23bb710c00" \
+                 "662ad1470198ac48c43f7d6f93a2a2687392040000"
+        self._check(transaction, ["eb696a065ef48a2192da5b28b694f87544b30fae8327c4510137a922f32c6dcf"],
+                    0, "76a91479091972186c449eb1ded22b78e40d009bdf008988ac",
+                    "64f3b0f4dd2bb3aa1ce8566d220cc74dda9df97d8490cc81d89d735c92e59fb6", signed)
+
+
+if __name__ == '__main__':
+    unittest.main()
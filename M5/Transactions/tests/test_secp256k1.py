@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pycoin.ecdsa.secp256k1 import secp256k1_generator as secpGen
+
+from Secp256k1 import N, iter_generator_range, multiply_generator, multiply_generator_batch
+
+
+def _pycoin_point(scalar: int):
+    point = secpGen * scalar
+    return point[0], point[1]
+
+
+class MultiplyGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(12)
+        # Window edges, the top of the range and random scalars
+        self.scalars = [1, 2, 3, 255, 256, 257, 1 << 128, N - 2, N - 1] + \
+            [generator.randrange(1, N) for _ in range(20)]
+
+    def test_matches_pycoin(self):
+        for scalar in self.scalars:
+            self.assertEqual(multiply_generator(scalar), _pycoin_point(scalar), scalar)
+
+    def test_batch_matches_pycoin(self):
+        self.assertEqual(multiply_generator_batch(self.scalars), [_pycoin_point(scalar) for scalar in self.scalars])
+
+    def test_group_order_is_rejected(self):
+        with self.assertRaises(ValueError):
+            multiply_generator(N)
+
+
+class GeneratorRangeTest(unittest.TestCase):
+    def _check(self, start: int, count: int, batch_size: int):
+        points = list(iter_generator_range(start, count, batch_size))
+        self.assertEqual([key for key, _ in points], list(range(start, start + count)))
+        for key, point in points:
+            self.assertEqual(point, _pycoin_point(key), key)
+
+    def test_ranges_match_pycoin(self):
+        # Starting at 1 makes the first offset equal to the base point, the doubling special case
+        self._check(1, 10, 4)
+        self._check(0xdeadbeef, 9, 4)
+        self._check(N - 6, 5, 2)
+
+    def test_ranges_outside_the_group_are_rejected(self):
+        for start, count in ((0, 2), (N - 2, 3)):
+            with self.assertRaises(ValueError):
+                list(iter_generator_range(start, count))
+
+
+if __name__ == '__main__':
+    unittest.main()
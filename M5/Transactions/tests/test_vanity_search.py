@@ -0,0 +1,25 @@
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from VanitySearch import VanityPattern, describe
+
+
+class VanityPatternTest(unittest.TestCase):
+    def test_prefixes_without_free_characters(self):
+        for prefix in ("1", "3", "bc1q"):
+            pattern = VanityPattern(prefix)
+            self.assertEqual(pattern.expected_keys(), 1)
+            self.assertIn("Keys for a 50% chance: 1", describe(pattern))
+
+    def test_expected_keys_grow_with_the_difficulty(self):
+        pattern = VanityPattern("bc1qq")
+        self.assertEqual(pattern.difficulty, 32)
+        self.assertAlmostEqual(pattern.expected_keys(), math.log(0.5) / math.log(1 - 1 / 32))
+
+
+if __name__ == '__main__':
+    unittest.main()